@@ -28,7 +28,11 @@ try:
         raise FileNotFoundError(f"Static directory not found: {static_path}")
 
     # Import the Flask app
-    from app import app
+    from app import app, warm_up
+
+    # Connect, seed and load caches while the function instance starts rather
+    # than on its first request (one connection per instance is enough here)
+    warm_up(prefill_pool=False)
 
     # Vercel expects a module-level variable named 'app'
     # This is the WSGI application that Vercel will use to handle requests
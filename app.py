@@ -1,23 +1,41 @@
-from flask import Flask, render_template, request, redirect, url_for, send_file, jsonify, flash, abort
+from flask import Flask, render_template, request, redirect, url_for, send_file, jsonify, flash, abort, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, UpdateOne, UpdateMany
 from bson.objectid import ObjectId
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 from datetime import datetime
 from dotenv import load_dotenv
 import os
 import bleach
 import time
 from functools import lru_cache
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import json
+import hmac
+import threading
 from config import Config
-from gemini_service import gemini_service
+from gemini_service import gemini_service, iter_recipe_sections, RecipeStreamInterrupted
+from ingredient_index import build_rule_index
+from rules_cache import IngredientRulesCache, mark_rules_changed
+from single_flight import SingleFlight, MongoLease
+from memory_cache import LRUCache
+from write_behind import WriteBehindBuffer
+from recipe_blobs import RecipeBlobStore
+from report_builder import build_report, REPORT_ENTRY_PROJECTION
+from report_cache import ReportCache
+from report_store import GridFSReportStore, LocalReportStore
+from report_jobs import ReportJobQueue, ReportQueueFull
+from sqlite_store import SQLiteDatabase
+from autocomplete import build_prefix_index
+from profile_stats import get_profile_stats, RECENT_ENTRIES_LIMIT
+import entry_pages
+import entry_export
+import daily_stats
+import name_popularity
+from db_indexes import apply_indexes
+from name_keys import NAME_KEY_COLLATION, name_fields, normalize_name, exact_name_query, partial_name_query
 from models import UserManager
 from forms import RegistrationForm, LoginForm, ProfileUpdateForm, ChangePasswordForm, ProfileCompletionForm
 import requests
@@ -84,82 +102,82 @@ _ingredient_rules = None
 _food_entries = None
 _recipes = None
 _generated_recipes = None
+_cache_versions = None
+_recipe_leases = None
+_daily_stats = None
 _user_manager = None
+_report_store = None
+
+def _open_local_store():
+    """The embedded SQLite store (STORAGE_BACKEND=sqlite)"""
+    return SQLiteDatabase(Config.SQLITE_PATH, name=Config.DATABASE_NAME)
 
 def get_db():
-    """Lazy initialization of MongoDB connection"""
-    global _client, _db, _ingredient_rules, _food_entries, _recipes, _generated_recipes, _user_manager
+    """Lazy initialization of the database connection (MongoDB or the SQLite store)"""
+    global _client, _db, _ingredient_rules, _food_entries, _recipes, _generated_recipes, _cache_versions, _recipe_leases, _daily_stats, _user_manager
     
     if _db is None:
-        try:
-            # Initialize MongoDB client with connection pooling for better performance
-            _client = MongoClient(
-                Config.MONGODB_URI,
-                # Connection Pool Settings
-                maxPoolSize=Config.MONGODB_MAX_POOL_SIZE,  # Max connections in pool
-                minPoolSize=Config.MONGODB_MIN_POOL_SIZE,  # Min connections to maintain
-                maxIdleTimeMS=Config.MONGODB_MAX_IDLE_TIME_MS,  # Max idle time before removal
-                waitQueueTimeoutMS=Config.MONGODB_WAIT_QUEUE_TIMEOUT_MS,  # Wait time for connection
-                maxConnecting=Config.MONGODB_MAX_CONNECTING,  # Limit concurrent connection establishment
-                # Timeout Settings (optimized for serverless)
-                serverSelectionTimeoutMS=Config.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
-                connectTimeoutMS=Config.MONGODB_CONNECT_TIMEOUT_MS,
-                socketTimeoutMS=Config.MONGODB_SOCKET_TIMEOUT_MS,
-                # Additional optimizations
-                retryWrites=True,  # Automatically retry write operations
-                retryReads=True,  # Automatically retry read operations
-                # Write Concern - optimize for performance (acknowledge writes but don't wait for journal)
-                w=1,  # Wait for acknowledgment from primary
-                # Read Preference - read from nearest server for better latency
-                readPreference='primaryPreferred',  # Read from primary if available, otherwise secondary
-                # Connection monitoring
-                appName='health-recipe-modifier',  # Helps identify connections in MongoDB logs
-                # Compression for reduced network traffic
-                compressors='snappy,zlib',  # Enable compression
-            )
-            _db = _client[Config.DATABASE_NAME]
-            
-            # Initialize collections
-            _ingredient_rules = _db['ingredient_rules']
-            _food_entries = _db['food_entries']
-            _recipes = _db['recipes']
-            _generated_recipes = _db['generated_recipes']
-            
-            # Ensure indexes for fast lookups
+        if Config.STORAGE_BACKEND == 'sqlite':
+            _db = _open_local_store()
+        else:
             try:
-                _ingredient_rules.create_index('ingredient', unique=True)
-                _generated_recipes.create_index([('condition', 1), ('ingredients_key', 1)])
-            except Exception:
-                # Index creation is best-effort; ignore if permissions/environment restrict this
-                pass
-            
-            # Initialize User Manager
-            _user_manager = UserManager(_db)
-            
-            # Initialize database on first connection
-            initialize_database()
-            ensure_core_ingredients()
-            
-        except Exception as e:
-            print(f"MongoDB connection error: {e}")
-            # Create dummy collections to prevent crashes
-            class DummyCollection:
-                def find_one(self, *args, **kwargs): return None
-                def find(self, *args, **kwargs): return []
-                def insert_one(self, *args, **kwargs): return type('obj', (object,), {'inserted_id': None})()
-                def update_one(self, *args, **kwargs): return type('obj', (object,), {'modified_count': 0})()
-                def count_documents(self, *args, **kwargs): return 0
-                def create_index(self, *args, **kwargs): pass
-                def aggregate(self, *args, **kwargs): return []
-                def sort(self, *args, **kwargs): return self
-                def limit(self, *args, **kwargs): return self
-                def delete_one(self, *args, **kwargs): return type('obj', (object,), {'deleted_count': 0})()
-            
-            _ingredient_rules = DummyCollection()
-            _food_entries = DummyCollection()
-            _recipes = DummyCollection()
-            _generated_recipes = DummyCollection()
-            _user_manager = UserManager(None)
+                # Initialize MongoDB client with connection pooling for better performance
+                _client = MongoClient(
+                    Config.MONGODB_URI,
+                    # Connection Pool Settings
+                    maxPoolSize=Config.MONGODB_MAX_POOL_SIZE,  # Max connections in pool
+                    minPoolSize=Config.MONGODB_MIN_POOL_SIZE,  # Min connections to maintain
+                    maxIdleTimeMS=Config.MONGODB_MAX_IDLE_TIME_MS,  # Max idle time before removal
+                    waitQueueTimeoutMS=Config.MONGODB_WAIT_QUEUE_TIMEOUT_MS,  # Wait time for connection
+                    maxConnecting=Config.MONGODB_MAX_CONNECTING,  # Limit concurrent connection establishment
+                    # Timeout Settings (optimized for serverless)
+                    serverSelectionTimeoutMS=Config.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                    connectTimeoutMS=Config.MONGODB_CONNECT_TIMEOUT_MS,
+                    socketTimeoutMS=Config.MONGODB_SOCKET_TIMEOUT_MS,
+                    # Additional optimizations
+                    retryWrites=True,  # Automatically retry write operations
+                    retryReads=True,  # Automatically retry read operations
+                    # Write Concern - optimize for performance (acknowledge writes but don't wait for journal)
+                    w=1,  # Wait for acknowledgment from primary
+                    # Read Preference - read from nearest server for better latency
+                    readPreference='primaryPreferred',  # Read from primary if available, otherwise secondary
+                    # Connection monitoring
+                    appName='health-recipe-modifier',  # Helps identify connections in MongoDB logs
+                    # Compression for reduced network traffic
+                    compressors='snappy,zlib',  # Enable compression
+                )
+                _db = _client[Config.DATABASE_NAME]
+            except Exception as e:
+                # No fallback store: writes would be split between nodes or lost on restart.
+                # get_db() tries again on the next call
+                print(f"MongoDB connection error: {e}")
+                _client = None
+                raise
+        
+        # Initialize collections
+        _ingredient_rules = _db['ingredient_rules']
+        _food_entries = _db['food_entries']
+        _recipes = _db['recipes']
+        _generated_recipes = _db['generated_recipes']
+        _cache_versions = _db['cache_versions']
+        _daily_stats = _db['user_daily_stats']
+        ingredient_rules_cache.attach(_ingredient_rules, _cache_versions)
+        _recipe_leases = MongoLease(_db['recipe_leases'], ttl_seconds=Config.RECIPE_LEASE_TTL)
+        nutrition_service.attach_store(_db['nutrition_cache'])
+        
+        # MongoDB indexes are applied at deploy time (python db_indexes.py apply); opt in to
+        # creating them on first connection for local development. The SQLite store
+        # always creates its own (idempotent and local)
+        if Config.MONGODB_ENSURE_INDEXES or _client is None:
+            for name, error in apply_indexes(_db):
+                print(f"Index creation failed on {name}: {error}")
+        
+        # Initialize User Manager
+        _user_manager = UserManager(_db)
+        
+        # Seeding runs from warm_up() / `python migrations.py seed-database`,
+        # not on the first request
+        ingredient_rules_cache.watch()
     
     return _db
 
@@ -181,40 +199,280 @@ def get_generated_recipes():
     get_db()
     return _generated_recipes
 
+def get_cache_versions():
+    get_db()
+    return _cache_versions
+
+def get_recipe_leases():
+    get_db()
+    return _recipe_leases
+
+def get_daily_stats():
+    get_db()
+    return _daily_stats
+
+def get_name_popularity():
+    get_db()
+    return _db['name_popularity']
+
+def get_recipe_blobs():
+    get_db()
+    return _db['recipe_blobs']
+
+def get_report_jobs():
+    get_db()
+    return _db['report_jobs']
+
+def get_report_files():
+    get_db()
+    return _db['report_files']
+
+def get_report_store():
+    """Where rendered reports are kept: GridFS on MongoDB (shared by all instances), else local disk"""
+    global _report_store
+    get_db()
+    if _report_store is None:
+        if _client is not None and Config.REPORT_STORE != 'local':
+            _report_store = GridFSReportStore(_db, bucket_name='reports')
+        else:
+            _report_store = LocalReportStore(_report_blobs_dir)
+    return _report_store
+
+# Food entries keep a recipe_ref into recipe_blobs instead of the recipe text
+recipe_blobs = RecipeBlobStore(
+    get_recipe_blobs,
+    codec=Config.RECIPE_BLOB_CODEC,
+    compress_threshold=Config.RECIPE_BLOB_COMPRESS_THRESHOLD
+)
+
+# Food entry inserts are buffered and written in batches when enabled (see write_behind.py).
+# The flusher thread starts in warm_up() or on the first insert, in the process serving requests
+food_entry_writes = None
+if Config.WRITE_BEHIND_ENABLED:
+    food_entry_writes = WriteBehindBuffer(
+        get_food_entries,
+        max_batch=Config.WRITE_BEHIND_MAX_BATCH,
+        flush_interval=Config.WRITE_BEHIND_FLUSH_INTERVAL,
+        max_backlog=Config.WRITE_BEHIND_MAX_BACKLOG
+    )
+
+def insert_food_entry(food_entry):
+    """Store a food entry (buffered when write-behind is on); returns its _id"""
+    if food_entry_writes is not None:
+        if not food_entry_writes.started:
+            food_entry_writes.start()
+        return food_entry_writes.insert(food_entry)
+    return get_food_entries().insert_one(food_entry).inserted_id
+
+def update_food_entry(entry_id, patient_id, fields, projection):
+    """
+    Set fields on one of patient_id's food entries.
+
+    Returns:
+        dict: The entry before the update (projected), or None if not found
+    """
+    entry_id = ObjectId(entry_id)
+    if food_entry_writes is not None:
+        previous = food_entry_writes.update_pending(entry_id, patient_id, fields)
+        if previous is not None:
+            return {key: previous.get(key) for key in projection}
+    return get_food_entries().find_one_and_update(
+        {"_id": entry_id, "patient_id": patient_id},
+        {"$set": fields},
+        projection=projection,
+        return_document=ReturnDocument.BEFORE
+    )
+
 def get_user_manager():
     get_db()
     return _user_manager
 
-# Ingredient rules cache for faster lookups
-_ingredient_rules_cache = None
-_ingredient_rules_cache_time = 0
-_CACHE_TTL = 300  # 5 minutes
+# Ingredient rules cache: held until a change stream event or a bump of the
+# version counter says the rules changed (see rules_cache.py)
+ingredient_rules_cache = IngredientRulesCache(
+    poll_interval=Config.RULES_CACHE_POLL_INTERVAL,
+    use_change_stream=Config.RULES_CACHE_CHANGE_STREAM
+)
 
 def get_cached_ingredient_rules():
-    """Get ingredient rules from cache (cached for 5 minutes)"""
-    global _ingredient_rules_cache, _ingredient_rules_cache_time
-    
-    current_time = time.time()
-    if _ingredient_rules_cache is None or (current_time - _ingredient_rules_cache_time) > _CACHE_TTL:
-        try:
-            rules = list(get_ingredient_rules().find({}, {"ingredient": 1, "harmful_for": 1, "alternative": 1, "_id": 0}))
-            _ingredient_rules_cache = {doc["ingredient"].lower(): doc for doc in rules if doc.get("ingredient")}
-            _ingredient_rules_cache_time = current_time
-        except Exception as e:
-            print(f"Error caching ingredient rules: {e}")
-            if _ingredient_rules_cache is None:
-                _ingredient_rules_cache = {}
-    
-    return _ingredient_rules_cache
+    """Get ingredient rules from the invalidation-driven cache"""
+    get_db()
+    return ingredient_rules_cache.get()
 
 def get_cached_db_ingredients():
     """Get all ingredient names from cache"""
     rules = get_cached_ingredient_rules()
     return set(rules.keys())
 
+# Compiled rule index, rebuilt only when the cached rules are replaced
+_ingredient_rule_index = None
+
+def get_ingredient_rule_index():
+    """Get the compiled ingredient rule index for the current rules snapshot"""
+    global _ingredient_rule_index
+    
+    rules = get_cached_ingredient_rules()
+    if _ingredient_rule_index is None or _ingredient_rule_index.version != ingredient_rules_cache.version:
+        _ingredient_rule_index = build_rule_index(rules, version=ingredient_rules_cache.version)
+    return _ingredient_rule_index
+
+# Autocomplete index over ingredient and recipe names, rebuilt when rules change.
+# Requests keep answering from the current index while one background thread
+# builds the next
+_autocomplete_index = None
+_autocomplete_built = (None, 0)  # (rules cache version, build time)
+_autocomplete_lock = threading.Lock()  # Held by the one build in progress
+
+def _name_popularity(kind):
+    """How often each (lowercased) name was used in food entries, most used first"""
+    limit = Config.AUTOCOMPLETE_POPULARITY_LIMIT
+    try:
+        counts = name_popularity.top_names(get_name_popularity(), kind, limit)
+        if counts is not None:
+            return counts
+    except Exception as e:
+        print(f"Error reading {kind} popularity counters: {e}")
+    
+    # Counters not rebuilt yet (python migrations.py rebuild-name-popularity): group the entries
+    field, unwind = name_popularity.KINDS[kind]
+    pipeline = [{"$match": {field: {"$exists": True, "$ne": None}}}]
+    if unwind:
+        pipeline.append({"$unwind": f"${field}"})
+    pipeline += [
+        {"$group": {"_id": {"$toLower": f"${field}"}, "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": limit},
+    ]
+    try:
+        return {doc["_id"]: doc["count"] for doc in get_food_entries().aggregate(pipeline) if doc.get("_id")}
+    except Exception as e:
+        print(f"Error computing {kind} popularity: {e}")
+        return {}
+
+def _build_autocomplete_index():
+    """Build the index for the current rules snapshot and store it with that version"""
+    global _autocomplete_index, _autocomplete_built
+    
+    version = ingredient_rules_cache.version
+    rules = get_cached_ingredient_rules()
+    ingredient_counts = _name_popularity("ingredient")
+    recipe_counts = _name_popularity("recipe")
+    entries = [(rule.get("ingredient") or name, "ingredient", ingredient_counts.get(name, 0))
+               for name, rule in rules.items()]
+    try:
+        for doc in get_recipes().find({}, {"name": 1, "_id": 0}):
+            name = doc.get("name")
+            if name:
+                entries.append((name, "recipe", recipe_counts.get(name.lower(), 0)))
+    except Exception as e:
+        print(f"Error loading recipe names for autocomplete: {e}")
+    for name in spell_checker.get_all_recipes():
+        entries.append((name, "recipe", recipe_counts.get(name.lower(), 0)))
+    
+    _autocomplete_index = build_prefix_index(entries, max_results=Config.AUTOCOMPLETE_MAX_RESULTS)
+    _autocomplete_built = (version, time.time())
+
+def _refresh_autocomplete_index():
+    """Background rebuild; releases the build lock taken by get_autocomplete_index()"""
+    try:
+        _build_autocomplete_index()
+    except Exception as e:
+        print(f"Error rebuilding autocomplete index: {e}")
+    finally:
+        _autocomplete_lock.release()
+
+def get_autocomplete_index():
+    """Get the prefix index over ingredient names, recipe names and models/recipes.csv"""
+    get_cached_ingredient_rules()  # Picks up rule changes (and their new version)
+    if _autocomplete_index is None:
+        # Nothing to serve yet: the first requests wait for a single build
+        with _autocomplete_lock:
+            if _autocomplete_index is None:
+                _build_autocomplete_index()
+        return _autocomplete_index
+    
+    built_version, built_at = _autocomplete_built
+    stale = (built_version != ingredient_rules_cache.version
+             or time.time() - built_at >= Config.AUTOCOMPLETE_REFRESH_INTERVAL)
+    if stale and _autocomplete_lock.acquire(blocking=False):
+        threading.Thread(target=_refresh_autocomplete_index, name='autocomplete-refresh', daemon=True).start()
+    return _autocomplete_index
+
 # Note: All database access should use the getter functions above
 # Direct access to collections is no longer supported
 
+def _after_fork_in_child():
+    """
+    Forget the MongoDB client and background threads inherited from the parent.
+
+    A MongoClient is not fork-safe: its pooled sockets and monitor threads
+    belong to the parent. The child's copies are dropped without closing them
+    (closing would tear down the parent's connections) and get_db() creates a
+    fresh client in the worker on first use or in warm_up().
+    """
+    global _client, _db, _ingredient_rules, _food_entries, _recipes, _generated_recipes, _cache_versions, _recipe_leases, _daily_stats, _user_manager, _report_store, _autocomplete_lock
+    _client = _db = None
+    _ingredient_rules = _food_entries = _recipes = _generated_recipes = None
+    _cache_versions = _recipe_leases = _daily_stats = _user_manager = None
+    _report_store = None
+    _autocomplete_lock = threading.Lock()  # A build running in the parent does not exist here
+    ingredient_rules_cache.after_fork()
+    nutrition_service.after_fork()
+    if food_entry_writes is not None:
+        food_entry_writes.after_fork()
+    report_jobs.after_fork()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+def seed_database():
+    """Insert the sample data and core ingredients (idempotent; deploy step or warm_up)"""
+    initialize_database()
+    ensure_core_ingredients()
+
+def _prefill_pool(size):
+    """Open up to size pooled connections now instead of on the first requests"""
+    if _client is None or size <= 0:
+        return 0
+    def ping(_):
+        _client.admin.command('ping')
+        return True
+    # Concurrent pings each check out a connection, so the pool grows to size
+    with ThreadPoolExecutor(max_workers=size, thread_name_prefix='pool-warmup') as executor:
+        return sum(1 for ok in executor.map(ping, range(size)) if ok)
+
+def warm_up(seed=None, prefill_pool=True):
+    """
+    Get this process ready to serve: connect, optionally seed, pre-establish
+    MONGODB_MIN_POOL_SIZE connections and load the rules and spell-checker
+    caches. Call it once per process after fork (gunicorn post_fork, see
+    gunicorn.conf.py), before app.run(), or at serverless module load
+    (api/index.py, without the pool prefill).
+
+    Returns:
+        dict: Milliseconds spent per step
+    """
+    timings = {}
+    def step(name, func):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            print(f"Warm-up step {name} failed: {e}")
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    
+    step('connect', get_db)
+    if Config.SEED_ON_STARTUP if seed is None else seed:
+        step('seed', seed_database)
+    if prefill_pool:
+        step('pool', lambda: _prefill_pool(Config.MONGODB_MIN_POOL_SIZE))
+    step('rules', get_ingredient_rule_index)
+    step('spell_checker', spell_checker.get_all_recipes)
+    if food_entry_writes is not None:
+        step('write_behind', food_entry_writes.start)
+    print(f"Warm-up done in pid {os.getpid()}: {timings}")
+    return timings
+
 @login_manager.user_loader
 def load_user(user_id):
     """Load user for Flask-Login"""
@@ -296,6 +554,8 @@ def initialize_database():
                 }
             ]
             ingredient_rules_col.insert_many(sample_rules)
+            mark_rules_changed(ingredient_rules_col, get_cache_versions(),
+                               [rule["ingredient"] for rule in sample_rules])
             print("Sample ingredient rules added to database")
     except Exception as e:
         print(f"Error adding sample ingredient rules: {e}")
@@ -333,7 +593,7 @@ def initialize_database():
                     "tags": ["indian", "sweet", "festive"]
                 }
             ]
-            recipes_col.insert_many(sample_recipes)
+            recipes_col.insert_many([dict(recipe, **name_fields(recipe["name"])) for recipe in sample_recipes])
             print("Sample recipes added to database")
     except Exception as e:
         print(f"Error adding sample recipes: {e}")
@@ -352,16 +612,21 @@ def ensure_core_ingredients():
                 "category": "grain"
             }
         ]
+        inserted = []
         for item in core_ingredients:
             try:
-                ingredient_rules_col.update_one(
+                result = ingredient_rules_col.update_one(
                     {"ingredient": item["ingredient"]},
                     {"$setOnInsert": item},
                     upsert=True
                 )
+                if result.upserted_id is not None:
+                    inserted.append(item["ingredient"])
             except Exception:
                 # Best-effort; ignore failures in restricted environments
                 pass
+        if inserted:
+            mark_rules_changed(ingredient_rules_col, get_cache_versions(), inserted)
     except Exception as e:
         print(f"Error ensuring core ingredients: {e}")
 
@@ -402,43 +667,11 @@ def ensure_core_ingredients():
 def check_ingredients(ingredients, condition):
     """Check ingredients against patient condition and return harmful/safe lists.
 
-    Optimized to use cached ingredient rules instead of per-ingredient lookups.
-    Handles plural/singular safely.
+    Uses the compiled rule index (interned ids, per-condition harmful sets and
+    precomputed plural forms), so each ingredient costs one dict lookup and one
+    set membership test.
     """
-    harmful_ingredients = []
-    safe_ingredients = []
-    replacements = {}
-
-    # Use cached ingredient rules for fast lookups
-    DB_INGREDIENTS = get_cached_db_ingredients()
-    rules_by_ingredient = get_cached_ingredient_rules()
-
-    # Safe plural → singular normalizer
-    def safe_normalize(name: str) -> str:
-        name = name.strip().lower()
-        if name.endswith("s"):
-            singular = name[:-1]
-            if singular in DB_INGREDIENTS:
-                return singular
-        return name
-
-    # Map original ingredients to normalized
-    original_to_normalized = {}
-    for ing in ingredients:
-        if ing and ing.strip():
-            normalized = safe_normalize(ing)
-            original_to_normalized[ing] = normalized
-
-    # Determine harmful/safe using normalized ingredient but store original
-    for original, ingredient in original_to_normalized.items():
-        rule = rules_by_ingredient.get(ingredient)
-        if rule and condition in rule.get("harmful_for", []):
-            harmful_ingredients.append(original)
-            replacements[original] = rule.get("alternative")
-        else:
-            safe_ingredients.append(original)
-
-    return harmful_ingredients, safe_ingredients, replacements
+    return get_ingredient_rule_index().classify(ingredients, condition)
 
 
 
@@ -526,9 +759,8 @@ def render_current_section(section_type, content):
     else:
         return f'<p class="mb-3 lh-base">{" ".join(content)}</p>'
 
-def generate_recipe(original_ingredients, safe_ingredients, replacements, condition, recipe_name=None):
-    """Generate a modified recipe based on safe ingredients using Gemini API"""
-    
+def _generation_ingredients(original_ingredients, replacements):
+    """Build the (modified, harmful) ingredient lists sent to Gemini"""
     # Create modified ingredient list
     modified_ingredients = []
     for ingredient in original_ingredients:
@@ -540,6 +772,11 @@ def generate_recipe(original_ingredients, safe_ingredients, replacements, condit
     
     # Get harmful ingredients for Gemini
     harmful_ingredients = list(replacements.keys())
+    return modified_ingredients, harmful_ingredients
+
+def generate_recipe(original_ingredients, safe_ingredients, replacements, condition, recipe_name=None):
+    """Generate a modified recipe based on safe ingredients using Gemini API"""
+    modified_ingredients, harmful_ingredients = _generation_ingredients(original_ingredients, replacements)
     
     # Use Gemini API to generate detailed recipe
     recipe = gemini_service.generate_recipe_instructions(
@@ -552,6 +789,139 @@ def generate_recipe(original_ingredients, safe_ingredients, replacements, condit
     
     return recipe
 
+def stream_recipe(original_ingredients, replacements, condition, recipe_name=None):
+    """Generate a modified recipe section by section (markdown strings)"""
+    modified_ingredients, harmful_ingredients = _generation_ingredients(original_ingredients, replacements)
+    return gemini_service.stream_recipe_instructions(
+        original_ingredients,
+        modified_ingredients,
+        condition,
+        harmful_ingredients,
+        recipe_name
+    )
+
+# In-process single-flight table for recipe generations
+recipe_flights = SingleFlight()
+
+# L1 for generated recipes in front of the generated_recipes collection (L2)
+generated_recipes_l1 = LRUCache(
+    max_entries=Config.RECIPE_L1_MAX_ENTRIES,
+    max_bytes=Config.RECIPE_L1_MAX_BYTES,
+    ttl=Config.RECIPE_L1_TTL,
+    compress_threshold=1024,
+    name='generated_recipes'
+)
+
+def _find_generated_recipe(condition, ingredients_key):
+    """Return the cached generated recipe text (L1, then Mongo), or None"""
+    recipe = generated_recipes_l1.get((condition, ingredients_key))
+    if recipe is not None:
+        return recipe
+    cached_doc = get_generated_recipes().find_one({"condition": condition, "ingredients_key": ingredients_key}, {"recipe": 1, "_id": 0})
+    if cached_doc and cached_doc.get("recipe"):
+        generated_recipes_l1.set((condition, ingredients_key), cached_doc["recipe"])
+        return cached_doc["recipe"]
+    return None
+
+def _store_generated_recipe(condition, ingredients_key, recipe):
+    """Write a generated recipe to the cache (best-effort)"""
+    generated_recipes_l1.set((condition, ingredients_key), recipe)
+    try:
+        get_generated_recipes().update_one(
+            {"condition": condition, "ingredients_key": ingredients_key},
+            {"$set": {"recipe": recipe, "updated_at": datetime.now()}},
+            upsert=True
+        )
+    except Exception:
+        # Caching is best-effort; ignore failures
+        pass
+
+def _await_generated_recipe(condition, ingredients_key, lease_id):
+    """Wait for another worker holding the lease to cache its recipe.
+
+    The holder renews its lease while it generates, so this waits as long as
+    the lease is alive and stops as soon as it is released or expires.
+    """
+    while True:
+        recipe = _find_generated_recipe(condition, ingredients_key)
+        if recipe is not None:
+            return recipe
+        if not get_recipe_leases().is_held(lease_id):
+            # Holder finished or died; one last look before generating ourselves
+            return _find_generated_recipe(condition, ingredients_key)
+        time.sleep(0.25)
+
+def _await_leader(future, lease_id):
+    """Wait for this process's leader; None if it failed or nobody holds the lease any more"""
+    while True:
+        try:
+            return future.result(timeout=Config.RECIPE_LEASE_TTL / 3)
+        except FutureTimeoutError:
+            # Still generating (here or in the worker it waits for) while the lease is held
+            if not get_recipe_leases().is_held(lease_id):
+                return None
+        except Exception:
+            return None
+
+def generate_recipe_sections_once(condition, ingredients_key, recipe_name, produce):
+    """Yield recipe sections, generating at most once per key at any moment.
+
+    Concurrent requests for the same (condition, ingredients_key, recipe_name)
+    in this process wait on the leader's future; across workers the leader
+    takes a Mongo lease and the others poll the generated_recipes cache.
+    ``produce`` is a callable returning an iterator of markdown sections.
+    The recipe is only cached and shared once ``produce`` finished cleanly;
+    if it fails, the error propagates and waiters generate their own.
+    """
+    flight_key = (condition, ingredients_key, recipe_name)
+    future, leader = recipe_flights.claim(flight_key)
+    
+    lease_id = MongoLease.lease_id(*flight_key)
+    if not leader:
+        recipe = _await_leader(future, lease_id)
+        if recipe:
+            yield from iter_recipe_sections(recipe)
+        else:
+            # The leader failed or gave up; generate without coordination
+            yield from produce()
+        return
+    
+    recipe = error = None
+    try:
+        recipe = _find_generated_recipe(condition, ingredients_key)
+        if recipe is None:
+            leases = get_recipe_leases()
+            acquired = leases.acquire(lease_id)
+            try:
+                if not acquired:
+                    recipe = _await_generated_recipe(condition, ingredients_key, lease_id)
+                if recipe is None:
+                    sections = []
+                    # Renewed while Gemini streams, however long that takes
+                    with leases.keep_alive(lease_id):
+                        try:
+                            for section in produce():
+                                sections.append(section)
+                                yield section
+                        except Exception as e:
+                            # A partial recipe is neither cached nor handed to waiters
+                            error = e
+                            raise
+                    recipe = "\n\n".join(sections)
+                    _store_generated_recipe(condition, ingredients_key, recipe)
+                    return
+            finally:
+                if acquired:
+                    leases.release(lease_id)
+        yield from iter_recipe_sections(recipe)
+    finally:
+        # Always release waiters, even if the client disconnected mid-stream
+        recipe_flights.complete(flight_key, result=recipe, error=error)
+
+# Signs the parameters of a deferred (streamed) recipe generation
+_recipe_stream_serializer = URLSafeTimedSerializer(Config.SECRET_KEY, salt='recipe-stream')
+_RECIPE_STREAM_MAX_AGE = 600  # seconds a result page may wait before opening the stream
+
 def _reports_dir():
     """Return a writable reports directory (handles Vercel /tmp)."""
     # Check if we're on Vercel (serverless environment)
@@ -564,157 +934,26 @@ def _reports_dir():
     os.makedirs(base_dir, exist_ok=True)
     return base_dir
 
-def generate_pdf_report(user_id):
+def _report_blobs_dir():
+    """Directory of the local report store (single node / SQLite store)"""
+    base_dir = os.path.join(_reports_dir(), 'blobs')
+    os.makedirs(base_dir, exist_ok=True)
+    return base_dir
+
+def generate_pdf_report(user_id, filename=None):
     print(f"[DEBUG] Generating PDF report... {user_id}")
-    # make pdf report for user
+    # make pdf report for user, streaming the entries from the cursor (see report_builder.py)
     try:
         user = get_user_manager().get_user_by_id(user_id)
-        entries = list(get_food_entries().find({"patient_id": user_id}).sort("timestamp", -1))
-        
-        if not entries:
+        entries = (get_food_entries()
+                   .find({"patient_id": user_id}, REPORT_ENTRY_PROJECTION)
+                   .sort("timestamp", -1)
+                   .batch_size(Config.REPORT_BATCH_SIZE))
+        filename = filename or os.path.join(_reports_dir(), f"patient_{user_id}_report.pdf")
+        # Recipe text is only needed as a title fallback for unnamed entries; one $in per batch
+        if build_report(filename, user_id, user, entries, resolve_recipes=recipe_blobs.resolve,
+                        batch_size=Config.REPORT_BATCH_SIZE) is None:
             return None
-            
-        filename = os.path.join(_reports_dir(), f"patient_{user_id}_report.pdf")
-        doc = SimpleDocTemplate(filename, pagesize=letter, rightMargin=36, leftMargin=36, topMargin=36, bottomMargin=36)
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Title
-        title_style = styles['Title']
-        title_style.fontSize = 24
-        elements.append(Paragraph("Patient Health Report", title_style))
-        elements.append(Spacer(1, 24))
-        
-        # Patient Info Section (Top)
-        # Patient ID, Age/Gender, Health Condition, Diet Type, Allergies, Report Generated On, Report Version
-        
-        # Safe access to user attributes
-        u_age = getattr(user, 'age', 'N/A')
-        u_gender = getattr(user, 'gender', 'Not Specified') # Field implied by request
-        u_condition = getattr(user, 'medical_condition', 'None')
-        u_diet = getattr(user, 'diet_type', 'Not Specified') # Field implied by request
-        u_allergies = getattr(user, 'allergies', 'Not Specified') # Field implied by request
-        
-        # If diet/allergies stored elsewhere or need default "N/A"
-        if not u_age: u_age = "N/A"
-        if not u_condition: u_condition = "None"
-        
-        user_info = [
-            [Paragraph(f"<b>Patient ID:</b> {user_id}", styles['Normal']), Paragraph(f"<b>Report Version:</b> v1.1", styles['Normal'])],
-            [Paragraph(f"<b>Age / Gender:</b> {u_age} / {u_gender}", styles['Normal']), Paragraph(f"<b>Report Generated On:</b> {datetime.now().strftime('%d-%m-%Y %H:%M')}", styles['Normal'])],
-            [Paragraph(f"<b>Health Condition(s):</b> {u_condition.title()}", styles['Normal']), ""],
-            [Paragraph(f"<b>Diet Type:</b> {u_diet}", styles['Normal']), ""],
-            [Paragraph(f"<b>Allergies:</b> {u_allergies}", styles['Normal']), ""]
-        ]
-        
-        t_info = Table(user_info, colWidths=[4*inch, 3.5*inch])
-        t_info.setStyle(TableStyle([
-            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 8),
-        ]))
-        elements.append(t_info)
-        elements.append(Spacer(1, 24))
-        
-        # Table of Records (Bottom)
-        # Headers: Sr No | Recipe Name | Harmful Ingredients | Safe Alternatives | Net Calories | Timestamp
-        
-        headers = [
-            Paragraph("<b>Sr No</b>", styles['Normal']),
-            Paragraph("<b>Recipe Name</b>", styles['Normal']),
-            Paragraph("<b>Harmful Ingredients</b>", styles['Normal']),
-            Paragraph("<b>Safe Alternatives</b>", styles['Normal']),
-            Paragraph("<b>Net Calories</b>", styles['Normal']),
-            Paragraph("<b>Timestamp</b>", styles['Normal'])
-        ]
-        
-        data = [headers]
-        
-        for idx, entry in enumerate(entries, 1):
-            # 1. Sr No
-            sr_no = str(idx)
-            
-            # 2. Recipe Name (Use input ingredients as proxy if no name)
-            # 2. Recipe Name
-            recipe_name_text = entry.get("recipe_name", "")
-            
-            # If no explicit name, try to extract from the generated recipe text (for old records)
-            if not recipe_name_text:
-                recipe_text = entry.get("recipe", "")
-                if recipe_text:
-                    lines = recipe_text.split('\n')
-                    for line in lines:
-                        line = line.strip()
-                        if not line: continue
-                        # Check for bold title style **Title**
-                        if line.startswith('**') and line.endswith('**'):
-                            cleaned = line.replace('**', '').strip()
-                            # Filter out common section headers
-                            if cleaned.lower() not in ['ingredients', 'instructions', 'method', 'directions', 'nutritional info', 'nutrition']:
-                                recipe_name_text = cleaned
-                                break
-            
-            # Final fallback
-            if not recipe_name_text:
-                # User requested avoiding ingredient list in name column
-                recipe_name_text = "Custom Recipe"  
-                
-            # 3. Harmful Ingredients
-            harmful_text = ", ".join(entry.get("harmful", [])).title() or "None"
-            
-            # 4. Safe Alternatives (Using user's safe list or replacements)
-            # Request says "Safe Alternatives", but we store full safe list. 
-            # Showing full safe list is more useful.
-            safe_text = ", ".join(entry.get("safe", [])).title() or "None"
-
-            # 5. Net Calories
-            calories_text = "N/A"
-            if 'nutrition' in entry and entry['nutrition']:
-                nut = entry['nutrition']
-                # Check for nested structure (new format)
-                if isinstance(nut, dict):
-                    if 'macros' in nut and isinstance(nut['macros'], dict):
-                        cal_entry = nut['macros'].get('calories')
-                        if isinstance(cal_entry, dict):
-                            calories_text = f"{int(cal_entry.get('value', 0))} kcal"
-                    # Fallback for legacy flat format
-                    elif 'calories' in nut:
-                        calories_text = f"{int(nut.get('calories', 0))} kcal"
-            
-            # 6. Timestamp
-            ts = entry.get("timestamp")
-            timestamp_text = ts.strftime('%Y-%m-%d\n%H:%M') if ts else "N/A"
-            
-            row = [
-                sr_no,
-                Paragraph(recipe_name_text, styles['Normal']),
-                Paragraph(harmful_text, styles['Normal']),
-                Paragraph(safe_text, styles['Normal']),
-                calories_text,
-                timestamp_text
-            ]
-            data.append(row)
-            
-        # Table Styling
-        # Columns: 0.5, 1.5, 1.5, 1.5, 1.0, 1.0 = 7.0 inch total width
-        col_widths = [0.5*inch, 1.4*inch, 1.5*inch, 1.5*inch, 1.0*inch, 1.1*inch]
-        
-        t_data = Table(data, colWidths=col_widths, repeatRows=1)
-        t_data.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.Color(0.9, 0.9, 0.9)), # Header background
-            ('TEXTCOLOR', (0,0), (-1,0), colors.black),
-            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
-            ('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
-            ('FONTSIZE', (0,0), (-1,-1), 9),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 6),
-            ('TOPPADDING', (0,0), (-1,-1), 6),
-        ]))
-        
-        elements.append(t_data)
-        
-        doc.build(elements)
         print(f"PDF report generated for user {user_id}: {filename}")
         return filename
     except Exception as e:
@@ -722,6 +961,42 @@ def generate_pdf_report(user_id):
         import traceback
         traceback.print_exc()
         return None
+
+# Rendered reports are kept per content fingerprint and re-rendered only when it changes;
+# renders go to a local scratch file, then into the report store (see report_store.py)
+pdf_reports = ReportCache(get_report_store, get_report_files, _reports_dir, generate_pdf_report)
+
+# Reports for the viewer render in a process pool; the page polls /api/reports/<job_id>
+report_jobs = ReportJobQueue(
+    pdf_reports,
+    get_report_jobs,
+    generate_pdf_report,
+    max_workers=Config.REPORT_JOB_WORKERS,
+    max_pending=Config.REPORT_JOB_MAX_PENDING,
+    timeout=Config.REPORT_JOB_TIMEOUT,
+    start_method=Config.REPORT_JOB_START_METHOD
+)
+
+def get_pdf_report(user):
+    """user's current report record and an open stream of it, or (None, None) when there is none"""
+    try:
+        report = pdf_reports.get(get_food_entries(), user)
+        if report is None:
+            return None, None
+        return report, pdf_reports.open(report)
+    except Exception as e:
+        print(f"Error getting PDF report: {e}")
+        return None, None
+
+def _send_report(report, stream, **kwargs):
+    """Stream a stored report with ETag/Last-Modified (304 when the client's copy is current)"""
+    response = send_file(stream, mimetype='application/pdf', etag=report['blob'],
+                         last_modified=report['created_at'], conditional=True, **kwargs)
+    if response.status_code == 200:
+        response.content_length = report['size']
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.call_on_close(stream.close)
+    return response
     
     
 @app.route('/')
@@ -782,22 +1057,24 @@ def check_ingredients_route():
 
     # Try to serve from cache first to avoid a slow LLM call
     ingredients_key = ",".join(sorted([i.strip().lower() for i in modified_ingredients if i and i.strip()]))
+    recipe_stream_payload = None
     try:
-        cached_doc = get_generated_recipes().find_one({"condition": condition, "ingredients_key": ingredients_key}, {"recipe": 1, "_id": 0})
-        if cached_doc and cached_doc.get("recipe"):
-            recipe = cached_doc["recipe"]
-        else:
-            # Generate modified recipe via Gemini
-            recipe = generate_recipe(ingredients, safe, replacements, condition, recipe_name)
-            try:
-                get_generated_recipes().update_one(
-                    {"condition": condition, "ingredients_key": ingredients_key},
-                    {"$set": {"recipe": recipe, "updated_at": datetime.now()}},
-                    upsert=True
-                )
-            except Exception:
-                # Caching is best-effort; ignore failures
-                pass
+        recipe = _find_generated_recipe(condition, ingredients_key)
+        if recipe is None and Config.GEMINI_STREAMING:
+            # Render the analysis now; the page streams the recipe from /api/recipe/stream
+            recipe = ""
+            recipe_stream_payload = {
+                "ingredients": ingredients,
+                "condition": condition,
+                "recipe_name": recipe_name,
+                "ingredients_key": ingredients_key,
+            }
+        elif recipe is None:
+            # Generate modified recipe via Gemini (once, however many users ask at the same time)
+            recipe = "\n\n".join(generate_recipe_sections_once(
+                condition, ingredients_key, recipe_name,
+                lambda: iter([generate_recipe(ingredients, safe, replacements, condition, recipe_name)])
+            ))
     except Exception as e:
         print(f"Error checking cache: {e}")
         # Generate modified recipe via Gemini
@@ -814,23 +1091,33 @@ def check_ingredients_route():
             "patient_id": patient_id,
             "condition": condition,
             "recipe_name": recipe_name,
+            **name_fields(recipe_name),
             "input_ingredients": ingredients,
             "harmful": harmful,
             "safe": modified_ingredients,
-            "recipe": recipe,
             "timestamp": datetime.now(),
             "is_favorite": False,
             "category": "General"
             }
         
         try:
-            result = get_food_entries().insert_one(food_entry)
-            entry_id = str(result.inserted_id)
+            if recipe:
+                food_entry["recipe_ref"] = recipe_blobs.store(recipe)
+            entry_id = str(insert_food_entry(food_entry))
+            daily_stats.record_entry(get_daily_stats(), food_entry)
+            name_popularity.record_entry(get_name_popularity(), food_entry)
         except Exception as e:
             print(f"Error storing food entry: {e}")
     
     # Format recipe for better display and sanitize HTML to prevent XSS
-    formatted_recipe = sanitize_html(format_recipe_html(recipe))
+    recipe_stream_url = None
+    if recipe_stream_payload is not None:
+        recipe_stream_payload["entry_id"] = entry_id
+        token = _recipe_stream_serializer.dumps(recipe_stream_payload)
+        recipe_stream_url = url_for('stream_recipe_route', token=token)
+        formatted_recipe = ""
+    else:
+        formatted_recipe = sanitize_html(format_recipe_html(recipe))
     
     # Generate profile-based warnings for the result page
     profile_warnings = []
@@ -842,15 +1129,16 @@ def check_ingredients_route():
     if current_user.is_authenticated and recipe_name:
         existing_fav = get_food_entries().find_one({
             "patient_id": current_user.user_id,
-            "is_favorite": True,
-            "recipe_name": {"$regex": f"^{recipe_name.strip()}$", "$options": "i"}
-        })
+            **exact_name_query(recipe_name),
+            "is_favorite": True
+        }, collation=NAME_KEY_COLLATION)
         is_already_saved = existing_fav is not None
     
     return render_template('result.html', 
                          harmful=harmful, 
                          safe=modified_ingredients, 
                          recipe=formatted_recipe,
+                         recipe_stream_url=recipe_stream_url,
                          original_ingredients=ingredients,
                          condition=condition,
                          nutrition=None,  # Will be loaded via AJAX
@@ -862,20 +1150,72 @@ def check_ingredients_route():
                          is_already_saved=is_already_saved,
                          moment=datetime.now().strftime('%B %d, %Y at %I:%M %p'))
 
+@app.route('/api/recipe/stream/<token>')
+def stream_recipe_route(token):
+    """Stream a generated recipe to the result page as server-sent events.
+
+    Each ``message`` event carries one sanitized HTML section; a final
+    ``done`` event closes the stream. The finished recipe is written to the
+    generated_recipes cache and to the food entry created for the result page.
+    If generation breaks off midway, an ``incomplete`` event ends the stream
+    instead and nothing is written.
+    """
+    try:
+        payload = _recipe_stream_serializer.loads(token, max_age=_RECIPE_STREAM_MAX_AGE)
+    except BadSignature:
+        # Also covers expired tokens (SignatureExpired)
+        abort(404)
+    
+    ingredients = payload.get("ingredients", [])
+    condition = payload.get("condition", "")
+    recipe_name = payload.get("recipe_name", "")
+    ingredients_key = payload.get("ingredients_key", "")
+    entry_id = payload.get("entry_id")
+    patient_id = current_user.user_id if current_user.is_authenticated else None
+    
+    _, _, replacements = check_ingredients(ingredients, condition)
+    
+    def generate():
+        sections = []
+        try:
+            for section in generate_recipe_sections_once(
+                    condition, ingredients_key, recipe_name,
+                    lambda: stream_recipe(ingredients, replacements, condition, recipe_name)):
+                sections.append(section)
+                html = sanitize_html(format_recipe_html(section))
+                yield f"data: {json.dumps({'html': html})}\n\n"
+        except RecipeStreamInterrupted as e:
+            print(f"Recipe stream for entry {entry_id} broke off after {len(sections)} sections: {e}")
+            yield "event: incomplete\ndata: {}\n\n"
+            return
+        
+        recipe = "\n\n".join(sections)
+        if entry_id and patient_id:
+            try:
+                update_food_entry(entry_id, patient_id, {"recipe_ref": recipe_blobs.store(recipe)}, {"_id": 1})
+            except Exception as e:
+                print(f"Error storing streamed recipe for entry {entry_id}: {e}")
+        yield "event: done\ndata: {}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Disable proxy buffering so sections arrive as they are sent
+    })
+
 @app.route('/generate_report/<patient_id>')
 @login_required
 def generate_report(patient_id):
     """Generate and download PDF report"""
     if str(current_user.user_id) != str(patient_id):
         abort(403)
-    filename = generate_pdf_report(patient_id)
+    report, stream = get_pdf_report(current_user)
     
-    if filename and os.path.exists(filename):
+    if report:
         # Build compact download name: firstname_lastname_DDMMYY_HHMM.pdf
         safe_name = current_user.username.strip().lower().replace(' ', '_')
         now = datetime.now()
         download_name = f"{safe_name}_{now.strftime('%d%m%y')}_{now.strftime('%H%M')}.pdf"
-        return send_file(filename, as_attachment=True, download_name=download_name)
+        return _send_report(report, stream, as_attachment=True, download_name=download_name)
     else:
         return "Report generation failed", 400
 
@@ -886,15 +1226,25 @@ def view_report(patient_id):
     if str(current_user.user_id) != str(patient_id):
         abort(403)
     
-    # Generate the PDF (so it's ready for the iframe)
-    filename = generate_pdf_report(patient_id)
-    report_available = filename is not None and os.path.exists(filename)
+    # Queue the PDF unless it is current; the page polls the job until it is ready
+    try:
+        job = report_jobs.submit(get_food_entries(), current_user)
+    except ReportQueueFull:
+        job = {"job_id": None, "status": "busy", "error": None}
+    except Exception as e:
+        print(f"Error queuing PDF report: {e}")
+        job = {"job_id": None, "status": "failed", "error": str(e)}
+    report_available = job["status"] == "done"
     
     # Gather info for the report viewer page
     user = current_user
     total_entries = 0
     try:
-        total_entries = get_food_entries().count_documents({"patient_id": patient_id})
+        totals = daily_stats.user_totals(get_daily_stats(), patient_id)
+        if totals is not None:
+            total_entries = totals["entries"]
+        else:
+            total_entries = get_food_entries().count_documents({"patient_id": patient_id})
     except Exception:
         pass
     
@@ -913,6 +1263,8 @@ def view_report(patient_id):
                          condition=condition,
                          total_entries=total_entries,
                          report_filename=report_filename,
+                         job_id=job["job_id"],
+                         job_status=job["status"],
                          generated_date=now.strftime('%B %d, %Y'),
                          generated_time=now.strftime('%I:%M %p'))
 
@@ -922,12 +1274,47 @@ def serve_report_pdf(patient_id):
     """Serve the raw PDF file for embedding in the report viewer"""
     if str(current_user.user_id) != str(patient_id):
         abort(403)
-    filename = os.path.join(_reports_dir(), f"patient_{patient_id}_report.pdf")
-    if filename and os.path.exists(filename):
-        return send_file(filename, mimetype='application/pdf')
+    report, stream = get_pdf_report(current_user)
+    if report:
+        return _send_report(report, stream)
     else:
         return "Report not found", 404
 
+def _report_job_response(job, status_code=200):
+    """JSON of a report job, with the PDF's URL once it is done"""
+    if job["status"] == "done":
+        job = dict(job, url=url_for('serve_report_pdf', patient_id=current_user.user_id))
+    return jsonify(job), status_code
+
+@app.route('/api/reports', methods=['POST'])
+@login_required
+def queue_report():
+    """Queue a render of the current user's report (202 while it is pending)"""
+    try:
+        job = report_jobs.submit(get_food_entries(), current_user)
+    except ReportQueueFull:
+        response = jsonify({"error": "Too many reports are being generated, try again shortly"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    except Exception as e:
+        print(f"Error queuing PDF report: {e}")
+        return jsonify({"error": "Report generation failed"}), 500
+    return _report_job_response(job, 202 if job["status"] == "pending" else 200)
+
+@app.route('/api/reports/<job_id>')
+@login_required
+@limiter.limit("120 per minute")  # Polled every 1-5 s while a report renders; replaces the hourly default
+def report_job_status(job_id):
+    """Status of a report job: pending, done (with the PDF's url) or failed"""
+    try:
+        job = report_jobs.status(job_id, current_user.user_id)
+    except Exception as e:
+        print(f"Error reading report job {job_id}: {e}")
+        return jsonify({"error": "Report status unavailable"}), 503
+    if job is None:
+        return jsonify({"error": "Report job not found"}), 404
+    return _report_job_response(job)
+
 @app.route('/api/ingredients')
 def get_ingredients():
     """API endpoint to get all available ingredients"""
@@ -938,6 +1325,44 @@ def get_ingredients():
         print(f"Error getting ingredients: {e}")
         return jsonify([])
 
+@app.route('/api/autocomplete')
+@limiter.limit("30 per second")  # One request per keystroke; replaces the hourly default
+def autocomplete():
+    """Top prefix completions over ingredient and recipe names
+
+    Query: ?q=<prefix>&limit=<k>&type=ingredient|recipe
+    Returns: { query, results: [{text, type}, ...] } with an ETag (304 when unchanged)
+    """
+    prefix = request.args.get('q', '')[:100]
+    kind = request.args.get('type') or None
+    try:
+        limit = int(request.args.get('limit', 8))
+    except ValueError:
+        limit = 8
+    
+    try:
+        index = get_autocomplete_index()
+        if kind is not None and kind not in index.kinds:
+            return jsonify({"error": "Unknown type"}), 400
+        response = jsonify({"query": prefix, "results": index.complete(prefix, limit, kind)})
+        response.set_etag(index.etag(prefix.lower().strip(), limit, kind))
+        response.headers['Cache-Control'] = f"public, max-age={Config.AUTOCOMPLETE_MAX_AGE}"
+        # Answers 304 Not Modified when If-None-Match carries the same ETag
+        return response.make_conditional(request)
+    except Exception as e:
+        print(f"Autocomplete error: {e}")
+        return jsonify({"query": prefix, "results": []})
+
+def find_recipe_by_name(name):
+    """Find a recipe by exact case-insensitive name, falling back to a word/prefix match"""
+    recipes_col = get_recipes()
+    recipe_doc = recipes_col.find_one(exact_name_query(name), collation=NAME_KEY_COLLATION)
+    if not recipe_doc:
+        query = partial_name_query(name)
+        if query is not None:
+            recipe_doc = recipes_col.find_one(query)
+    return recipe_doc
+
 @app.route('/api/recipes/ingredients')
 def get_recipe_ingredients():
     """API endpoint to get ingredients list by recipe name"""
@@ -945,11 +1370,7 @@ def get_recipe_ingredients():
     if not name:
         return jsonify({"error": "Missing recipe name"}), 400
     try:
-        # Try exact case-insensitive match first
-        recipe_doc = get_recipes().find_one({"name": {"$regex": f"^{name.strip()}$", "$options": "i"}})
-        if not recipe_doc:
-            # Fallback to partial case-insensitive contains match
-            recipe_doc = get_recipes().find_one({"name": {"$regex": name.strip(), "$options": "i"}})
+        recipe_doc = find_recipe_by_name(name)
         if not recipe_doc:
             return jsonify({"ingredients": []})
         return jsonify({"ingredients": recipe_doc.get("ingredients", [])})
@@ -983,9 +1404,7 @@ def ai_extract_ingredients():
 
         # 2) Fallback to recipes DB lookup by name (exact, then partial)
         try:
-            recipe_doc = get_recipes().find_one({"name": {"$regex": f"^{text}$", "$options": "i"}})
-            if not recipe_doc:
-                recipe_doc = get_recipes().find_one({"name": {"$regex": text, "$options": "i"}})
+            recipe_doc = find_recipe_by_name(text)
             if recipe_doc:
                 return jsonify({"ingredients": recipe_doc.get("ingredients", [])}), 200
         except Exception as e:
@@ -1326,10 +1745,15 @@ def get_nutrition_data():
         if entry_id:
             try:
                 if current_user.is_authenticated:
-                    get_food_entries().update_one(
-                        {"_id": ObjectId(entry_id), "patient_id": current_user.user_id},
-                        {"$set": {"nutrition": formatted_nutrition}}
-                    )
+                    previous = update_food_entry(entry_id, current_user.user_id,
+                                                 {"nutrition": formatted_nutrition},
+                                                 {"nutrition": 1, "timestamp": 1})
+                    if previous:
+                        daily_stats.record_change(
+                            get_daily_stats(), current_user.user_id, previous.get("timestamp"),
+                            calories=(daily_stats.entry_calories(formatted_nutrition) -
+                                      daily_stats.entry_calories(previous.get("nutrition")))
+                        )
             except Exception as e:
                 print(f"Error updating nutrition for entry {entry_id}: {e}")
         
@@ -1342,20 +1766,15 @@ def get_nutrition_data():
         return jsonify({'nutrition': None, 'warnings': [], 'error': str(e)})
 
 # Cache for landing page stats
-_landing_stats_cache = None
-_landing_stats_cache_time = 0
-_STATS_CACHE_TTL = 60  # Cache for 60 seconds
+_landing_stats_cache = LRUCache(max_entries=1, ttl=60, name='landing_stats')  # Cache for 60 seconds
 
 @app.route('/api/stats')
 def get_landing_stats():
     """API endpoint to get dynamic statistics for landing page (cached)"""
-    global _landing_stats_cache, _landing_stats_cache_time
-    
-    current_time = time.time()
-    
     # Return cached stats if still valid
-    if _landing_stats_cache is not None and (current_time - _landing_stats_cache_time) < _STATS_CACHE_TTL:
-        return jsonify(_landing_stats_cache)
+    cached_stats = _landing_stats_cache.get('stats')
+    if cached_stats is not None:
+        return jsonify(cached_stats)
     
     try:
         # Get total user count from users collection
@@ -1378,8 +1797,10 @@ def get_landing_stats():
         # Get total recipes modified from food_entries collection
         recipes_modified = 0
         try:
-            # Use count_documents for accurate count
-            recipes_modified = get_food_entries().count_documents({})
+            # Summed from the daily rollups; count the entries until they are built
+            recipes_modified = daily_stats.total_entries(get_daily_stats())
+            if recipes_modified is None:
+                recipes_modified = get_food_entries().count_documents({})
             print(f"[DEBUG] Total recipes: {recipes_modified}")
         except Exception as e:
             print(f"Error counting recipes: {e}")
@@ -1389,10 +1810,7 @@ def get_landing_stats():
         health_conditions = 12  # Default count
         try:
             # Use cached ingredient rules to avoid DB query
-            cached_rules = get_cached_ingredient_rules()
-            conditions_set = set()
-            for rule in cached_rules.values():
-                conditions_set.update(rule.get('harmful_for', []))
+            conditions_set = get_ingredient_rule_index().conditions
             health_conditions = len(conditions_set) if conditions_set else 12
             print(f"[DEBUG] Total conditions: {health_conditions}")
         except Exception as e:
@@ -1407,8 +1825,7 @@ def get_landing_stats():
         }
         
         # Update cache
-        _landing_stats_cache = stats
-        _landing_stats_cache_time = current_time
+        _landing_stats_cache.set('stats', stats)
         
         print(f"[DEBUG] Returning stats: {stats}")
         return jsonify(stats)
@@ -1424,6 +1841,21 @@ def get_landing_stats():
             'accuracy_rate': 99
         })
 
+@app.route('/api/metrics')
+@limiter.exempt  # Scraped by monitoring; protected by METRICS_TOKEN instead
+def get_metrics():
+    """Internal counters: write-behind backlog and in-process cache stats (Authorization: Bearer <METRICS_TOKEN>)"""
+    if not Config.METRICS_TOKEN:
+        abort(404)
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.strip().encode(), Config.METRICS_TOKEN.encode()):
+        return jsonify({"error": "Unauthorized"}), 401, {'WWW-Authenticate': 'Bearer'}
+    return jsonify({
+        'write_behind': food_entry_writes.stats() if food_entry_writes is not None else None,
+        'caches': [cache.stats() for cache in (generated_recipes_l1, _landing_stats_cache, recipe_blobs, pdf_reports)],
+        'report_jobs': report_jobs.stats(),
+    })
+
 # Authentication Routes
 @app.route('/register', methods=['GET', 'POST'])
 @limiter.limit("3 per minute", error_message="Too many registration attempts. Please try again later.")
@@ -1559,39 +1991,18 @@ def logout():
 def profile():
     """User profile page"""
     try:
-        # Get user statistics
-        user_entries = list(get_food_entries().find({"patient_id": current_user.user_id}))
-        total_entries = len(user_entries)
-        
-        total_harmful = sum(len(entry.get('harmful', [])) for entry in user_entries)
-        total_safe = sum(len(entry.get('safe', [])) for entry in user_entries)
-        
-        # Get recent entries
-        recent_entries = list(get_food_entries().find({"patient_id": current_user.user_id})
-                             .sort("timestamp", -1).limit(10))
+        # Totals and today's calories from the daily rollups (or one aggregation over the entries)
+        stats = get_profile_stats(get_food_entries(), current_user.user_id, rollups=get_daily_stats())
+        total_entries = stats["total_entries"]
+        total_harmful = stats["total_harmful"]
+        total_safe = stats["total_safe"]
+        recent_entries = stats["recent_entries"]
+        today_calories = stats["today_calories"]
         
-        # Calculate today's calorie consumption
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_entries = list(get_food_entries().find({
-            "patient_id": current_user.user_id,
-            "timestamp": {"$gte": today}
-        }))
-        
-        # Sum up calories from today's entries (if nutrition data exists)
-        today_calories = 0
-        for entry in today_entries:
-            if 'nutrition' in entry and entry['nutrition']:
-                # Extract calories from nutrition data
-                nutrition = entry['nutrition']
-                if isinstance(nutrition, dict):
-                    # Check for nested structure (new format)
-                    if 'macros' in nutrition and isinstance(nutrition['macros'], dict):
-                        cal_entry = nutrition['macros'].get('calories')
-                        if isinstance(cal_entry, dict):
-                            today_calories += int(cal_entry.get('value', 0))
-                    # Fallback for legacy flat format
-                    elif 'calories' in nutrition:
-                        today_calories += int(nutrition.get('calories', 0))
+        # Older history is loaded page by page from /api/entries
+        history_cursor = None
+        if len(recent_entries) >= RECENT_ENTRIES_LIMIT:
+            history_cursor = entry_pages.encode_cursor(recent_entries[-1])
         
         # Calculate BMI if height and weight are available
         bmi = None
@@ -1617,11 +2028,11 @@ def profile():
         
     except Exception as e:
         print(f"Error getting user profile data: {e}")
-        user_entries = []
         total_entries = 0
         total_harmful = 0
         total_safe = 0
         recent_entries = []
+        history_cursor = None
         today_calories = 0
         calorie_percentage = 0
         bmi = None
@@ -1642,6 +2053,7 @@ def profile():
                          harmful_ingredients=total_harmful,
                          safe_ingredients=total_safe,
                          recent_entries=recent_entries,
+                         history_cursor=history_cursor,
                          today_calories=today_calories,
                          calorie_percentage=calorie_percentage,
                          bmi=bmi,
@@ -1709,64 +2121,128 @@ def change_password():
 def cookbook():
     """Personal Cookbook (Meal Portfolio) page"""
     try:
-        # Get all favorited entries for the user, sorted by newest first
-        all_favorites = list(get_food_entries().find({
-            "patient_id": current_user.user_id,
-            "is_favorite": True
-        }).sort("timestamp", -1))
-        
-        # Deduplicate by recipe_name — keep only the most recent entry per recipe
-        seen_recipes = set()
-        favorite_entries = []
-        for entry in all_favorites:
-            recipe_key = (entry.get('recipe_name', '') or '').strip().lower()
-            if not recipe_key:
-                # Fallback: use original_ingredients as key
-                recipe_key = ','.join(sorted(entry.get('original_ingredients', [])))
-            if recipe_key and recipe_key not in seen_recipes:
-                seen_recipes.add(recipe_key)
-                favorite_entries.append(entry)
-        
-        # Get unique categories used by the user
-        categories = sorted(list(set(entry.get('category', 'General') for entry in favorite_entries)))
-        if 'General' not in categories:
-            categories.insert(0, 'General')
-            
+        # First page of favorites, one per recipe name; later pages come from /api/cookbook
+        favorite_entries, next_cursor = entry_pages.cookbook_page(get_food_entries(), current_user.user_id)
+        categories = entry_pages.cookbook_categories(get_food_entries(), current_user.user_id)
     except Exception as e:
         print(f"Error getting cookbook data: {e}")
         favorite_entries = []
+        next_cursor = None
         categories = ['General']
     
     return render_template('cookbook.html', 
                          entries=favorite_entries, 
+                         next_cursor=next_cursor,
                          categories=categories)
 
+def _entry_page_response(fetch_page):
+    """JSON for one page of entries: {entries, next_cursor}"""
+    try:
+        entries, next_cursor = fetch_page(
+            get_food_entries(), current_user.user_id,
+            cursor=request.args.get('cursor') or None,
+            limit=entry_pages.page_size(request.args.get('limit'))
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error listing entries: {e}")
+        return jsonify({"error": "Could not load entries"}), 500
+    return jsonify({
+        "entries": [entry_pages.serialize_entry(entry) for entry in entries],
+        "next_cursor": next_cursor,
+    })
+
+@app.route('/api/entries')
+@login_required
+def list_entries():
+    """Recipe history, newest first (?cursor=&limit=)"""
+    return _entry_page_response(entry_pages.entries_page)
+
+@app.route('/api/cookbook')
+@login_required
+def list_cookbook():
+    """Cookbook favorites, newest first, one per recipe name (?cursor=&limit=)"""
+    return _entry_page_response(entry_pages.cookbook_page)
+
+@app.route('/api/export/<patient_id>.<any(ndjson, csv):fmt>')
+@login_required
+def export_entries(patient_id, fmt):
+    """Stream the full history as NDJSON or CSV, oldest first (?start=&end=&cursor=&recipes=1)"""
+    if str(current_user.user_id) != str(patient_id):
+        abort(403)
+    compress = request.accept_encodings['gzip'] > 0
+    try:
+        chunks = entry_export.iter_export(
+            get_food_entries(), current_user.user_id, fmt,
+            start=entry_export.parse_bound(request.args.get('start'), 'start'),
+            end=entry_export.parse_bound(request.args.get('end'), 'end'),
+            cursor=request.args.get('cursor') or None,
+            resolve_recipes=recipe_blobs.resolve if request.args.get('recipes') == '1' else None,
+            batch_size=Config.EXPORT_BATCH_SIZE,
+            compress=compress
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    headers = {
+        'Content-Disposition': f'attachment; filename="entries_{patient_id}.{fmt}"',
+        'Cache-Control': 'no-store',
+        'Vary': 'Accept-Encoding',
+        'X-Accel-Buffering': 'no',  # Rows reach the client as they are read
+    }
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(chunks), mimetype=entry_export.FORMATS[fmt], headers=headers)
+
+@app.route('/api/entries/<entry_id>')
+@login_required
+def get_entry_recipe(entry_id):
+    """Full recipe text of one entry (listings leave it out)"""
+    try:
+        entry = None
+        if food_entry_writes is not None:  # Not written yet right after the analysis
+            entry = food_entry_writes.get_pending(ObjectId(entry_id), current_user.user_id)
+        if entry is None:
+            entry = get_food_entries().find_one(
+                {"_id": ObjectId(entry_id), "patient_id": current_user.user_id},
+                {"recipe_name": 1, "recipe": 1, "recipe_ref": 1}
+            )
+    except Exception:
+        entry = None
+    if not entry:
+        return jsonify({"error": "Entry not found"}), 404
+    return jsonify({"id": entry_id, "recipe_name": entry.get("recipe_name") or "",
+                    "recipe": recipe_blobs.recipe_text(entry)})
+
 @app.route('/api/favorite/<entry_id>', methods=['POST'])
 @login_required
 def toggle_favorite(entry_id):
     """Toggle favorite status for a recipe entry"""
     try:
-        entry = get_food_entries().find_one({"_id": ObjectId(entry_id), "patient_id": current_user.user_id})
+        entry = get_food_entries().find_one({"_id": ObjectId(entry_id), "patient_id": current_user.user_id},
+                                            {"recipe_name": 1, "is_favorite": 1, "timestamp": 1})
         if not entry:
             return jsonify({"error": "Entry not found"}), 404
         
         data = request.get_json(force=True, silent=True) or {}
         force_replace = data.get('force', False)
         
-        # If currently not a favorite and user wants to save it
-        current_fav = entry.get('is_favorite', False)
-        if not current_fav:
-            # Check if another entry with the same recipe_name is already favorited
-            recipe_name = (entry.get('recipe_name', '') or '').strip().lower()
-            if recipe_name and not force_replace:
-                existing = get_food_entries().find_one({
-                    "patient_id": current_user.user_id,
-                    "is_favorite": True,
-                    "_id": {"$ne": ObjectId(entry_id)},
-                    "$expr": {
-                        "$eq": [{"$toLower": {"$trim": {"input": {"$ifNull": ["$recipe_name", ""]}}}}, recipe_name]
-                    }
-                })
+        new_status = not entry.get('is_favorite', False)
+        updates = [UpdateOne({"_id": entry["_id"]}, {"$set": {"is_favorite": new_status}})]
+        replaced = []
+        
+        recipe_name = entry.get('recipe_name', '') or ''
+        if new_status and recipe_name.strip():
+            # Other favorites of the same recipe (normalized name, indexed)
+            same_name = {
+                "patient_id": current_user.user_id,
+                **exact_name_query(recipe_name),
+                "is_favorite": True,
+                "_id": {"$ne": entry["_id"]},
+            }
+            if not force_replace:
+                existing = get_food_entries().find_one(same_name, {"category": 1, "timestamp": 1},
+                                                       collation=NAME_KEY_COLLATION)
                 if existing:
                     return jsonify({
                         "success": False,
@@ -1775,32 +2251,122 @@ def toggle_favorite(entry_id):
                         "existing_category": existing.get("category", "General"),
                         "existing_date": existing.get("timestamp", "").strftime("%b %d, %Y") if existing.get("timestamp") else "Unknown"
                     })
-            
-            # If force_replace, un-favorite existing entries with the same recipe name
-            if force_replace and recipe_name:
-                same_name_entries = get_food_entries().find({
-                    "patient_id": current_user.user_id,
-                    "is_favorite": True,
-                    "_id": {"$ne": ObjectId(entry_id)}
-                })
-                for e in same_name_entries:
-                    e_name = (e.get('recipe_name', '') or '').strip().lower()
-                    if e_name == recipe_name:
-                        get_food_entries().update_one(
-                            {"_id": e["_id"]},
-                            {"$set": {"is_favorite": False}}
-                        )
-            
-        new_status = not current_fav
-        get_food_entries().update_one(
-            {"_id": ObjectId(entry_id)},
-            {"$set": {"is_favorite": new_status}}
-        )
+            else:
+                # Un-favorite them in the same round-trip as the toggle
+                replaced = list(get_food_entries().find(same_name, {"timestamp": 1},
+                                                        collation=NAME_KEY_COLLATION))
+                if replaced:
+                    updates.append(UpdateMany({"_id": {"$in": [e["_id"] for e in replaced]}},
+                                              {"$set": {"is_favorite": False}}))
+        
+        get_food_entries().bulk_write(updates, ordered=False)
+        daily_stats.record_favorite_changes(get_daily_stats(), current_user.user_id,
+                                            [e.get("timestamp") for e in replaced], -1)
+        daily_stats.record_change(get_daily_stats(), current_user.user_id, entry.get("timestamp"),
+                                  favorites=1 if new_status else -1)
         return jsonify({"success": True, "is_favorite": new_status})
     except Exception as e:
         print(f"Error toggling favorite: {e}")
         return jsonify({"error": str(e)}), 500
 
+# Most entries one /api/favorites/bulk request may change
+_BULK_FAVORITES_MAX = 500
+
+def _favorite_name_key(entry):
+    """Normalized recipe name a favorite is deduplicated by ('' for unnamed entries)"""
+    return entry.get("name_key") or normalize_name(entry.get("recipe_name") or "")
+
+def _unfavorite_same_names(patient_id, keep):
+    """
+    Un-favorite patient_id's other favorites of the recipes in keep, so each
+    recipe stays favorited once (as toggle_favorite does).
+
+    Returns:
+        tuple: (UpdateMany to add to the same bulk_write or None, the entries
+        it un-favorites, for the daily rollups)
+    """
+    keys = sorted({_favorite_name_key(entry) for entry in keep} - {""})
+    if not keys:
+        return None, []
+    same_name = {
+        "patient_id": patient_id,
+        "name_key": keys[0] if len(keys) == 1 else {"$in": keys},
+        "is_favorite": True,
+        "_id": {"$nin": [entry["_id"] for entry in keep]},
+    }
+    replaced = list(get_food_entries().find(same_name, {"timestamp": 1}, collation=NAME_KEY_COLLATION))
+    if not replaced:
+        return None, []
+    return UpdateMany(same_name, {"$set": {"is_favorite": False}}, collation=NAME_KEY_COLLATION), replaced
+
+@app.route('/api/favorites/bulk', methods=['POST'])
+@login_required
+def bulk_favorites():
+    """Favorite, unfavorite or recategorize many entries in one request.
+
+    Body: {"entry_ids": [...], "action": "favorite" | "unfavorite" | "categorize",
+           "category": "..."} (category only for "categorize", which also favorites)
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    action = data.get('action')
+    raw_ids = data.get('entry_ids') or []
+    if action not in ('favorite', 'unfavorite', 'categorize'):
+        return jsonify({"error": "action must be favorite, unfavorite or categorize"}), 400
+    if not isinstance(raw_ids, list) or not raw_ids:
+        return jsonify({"error": "entry_ids must be a non-empty list"}), 400
+    if len(raw_ids) > _BULK_FAVORITES_MAX:
+        return jsonify({"error": f"At most {_BULK_FAVORITES_MAX} entries per request"}), 400
+    try:
+        entry_ids = list({ObjectId(entry_id) for entry_id in raw_ids})
+    except Exception:
+        return jsonify({"error": "Invalid entry id"}), 400
+    
+    if action == 'categorize':
+        category = (data.get('category') or '').strip() or 'General'
+        changes = {"category": category, "is_favorite": True}  # Categorizing makes it a favorite
+    else:
+        changes = {"is_favorite": action == 'favorite'}
+    
+    try:
+        entries = list(get_food_entries().find(
+            {"_id": {"$in": entry_ids}, "patient_id": current_user.user_id},
+            {"timestamp": 1, "is_favorite": 1, "category": 1, "recipe_name": 1, "name_key": 1}))
+        targets, replaced, updates = entries, [], []
+        if changes["is_favorite"]:
+            # One favorite per recipe: the newest selected entry of each name
+            newest = {}
+            for entry in entries:
+                key = _favorite_name_key(entry) or entry["_id"]
+                if key not in newest or ((entry.get("timestamp") or datetime.min, entry["_id"]) >
+                                         (newest[key].get("timestamp") or datetime.min, newest[key]["_id"])):
+                    newest[key] = entry
+            targets = list(newest.values())
+            dedup, replaced = _unfavorite_same_names(current_user.user_id, targets)
+            if dedup is not None:
+                updates.append(dedup)
+        if targets:
+            updates.insert(0, UpdateMany({"_id": {"$in": [e["_id"] for e in targets]},
+                                          "patient_id": current_user.user_id}, {"$set": changes}))
+            get_food_entries().bulk_write(updates, ordered=False)
+        # Entries whose favorite flag flips, for the daily rollups
+        flipping = [e for e in targets if bool(e.get("is_favorite")) != changes["is_favorite"]]
+        daily_stats.record_favorite_changes(get_daily_stats(), current_user.user_id,
+                                            [e.get("timestamp") for e in flipping],
+                                            1 if changes["is_favorite"] else -1)
+        daily_stats.record_favorite_changes(get_daily_stats(), current_user.user_id,
+                                            [e.get("timestamp") for e in replaced], -1)
+        recategorized = [e for e in targets if "category" in changes and e.get("category") != changes["category"]]
+        return jsonify({
+            "success": True,
+            "matched": len(entries),
+            "modified": len({e["_id"] for e in flipping + recategorized}),
+            "replaced": len(replaced),
+            **({"category": changes["category"]} if "category" in changes else {}),
+        })
+    except Exception as e:
+        print(f"Error updating favorites in bulk: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/categorize/<entry_id>', methods=['POST'])
 @login_required
 def update_category(entry_id):
@@ -1812,13 +2378,25 @@ def update_category(entry_id):
         if not category:
             category = 'General'
             
-        result = get_food_entries().update_one(
+        previous = get_food_entries().find_one(
             {"_id": ObjectId(entry_id), "patient_id": current_user.user_id},
-            {"$set": {"category": category, "is_favorite": True}} # Categorizing automatically makes it a favorite
+            {"category": 1, "is_favorite": 1, "timestamp": 1, "recipe_name": 1, "name_key": 1}
         )
         
-        if result.modified_count == 0:
+        if not previous or (previous.get("category") == category and previous.get("is_favorite") is True):
             return jsonify({"error": "Entry not found or not modified"}), 404
+        
+        # Categorizing automatically makes it a favorite, the only one of its recipe
+        updates = [UpdateOne({"_id": previous["_id"]}, {"$set": {"category": category, "is_favorite": True}})]
+        dedup, replaced = _unfavorite_same_names(current_user.user_id, [previous])
+        if dedup is not None:
+            updates.append(dedup)
+        get_food_entries().bulk_write(updates, ordered=False)
+        daily_stats.record_favorite_changes(get_daily_stats(), current_user.user_id,
+                                            [e.get("timestamp") for e in replaced], -1)
+        if not previous.get("is_favorite"):
+            daily_stats.record_change(get_daily_stats(), current_user.user_id,
+                                      previous.get("timestamp"), favorites=1)
             
         return jsonify({"success": True, "category": category})
     except Exception as e:
@@ -1826,10 +2404,9 @@ def update_category(entry_id):
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
-    # Initialize database on startup (only for local development)
-    # On Vercel, initialization happens lazily on first request
-    initialize_database()
-    ensure_core_ingredients()
+    # Connect, seed and load caches before serving (only for local development);
+    # gunicorn workers do this in post_fork (gunicorn.conf.py)
+    warm_up()
     
     # Create reports directory
     os.makedirs("reports", exist_ok=True)
@@ -0,0 +1,142 @@
+"""
+Prefix Autocomplete Index
+
+One in-memory index over ingredient names and recipe names, answering
+"top-k completions for this prefix" without touching MongoDB:
+
+- every name is stored once; each word start of a name is a sorted key, so
+  "masala" completes "paneer butter masala" as well as "masala dosa"
+- a prefix maps to a contiguous slice of the sorted keys (two bisects)
+- the top-k of short prefixes (which match huge slices) is precomputed at
+  build time; longer prefixes select from their slice, and answers for
+  slices that are still large are memoized
+- ranking is popularity first (how often the name was used), then shorter,
+  then alphabetical
+"""
+
+import hashlib
+import heapq
+import logging
+import time
+from bisect import bisect_left
+
+from memory_cache import LRUCache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Prefixes up to this length get their top-k precomputed
+_PRECOMPUTED_PREFIX_LEN = 2
+
+# Longer prefixes matching more keys than this have their answers memoized
+_SCAN_LIMIT = 256
+
+
+class PrefixIndex:
+    """Immutable sorted-array prefix index with popularity ranking"""
+
+    def __init__(self, entries, max_results=20):
+        """
+        Build the index.
+
+        Args:
+            entries: Iterable of (name, kind, popularity); the same name and
+                kind seen twice keeps the highest popularity
+            max_results: Largest k callers may ask for
+        """
+        self.max_results = max_results
+        best = {}
+        for name, kind, popularity in entries:
+            name = " ".join((name or "").split())
+            if not name:
+                continue
+            key = (name.lower(), kind)
+            if key not in best or popularity > best[key][2]:
+                best[key] = (name, kind, popularity)
+
+        # Entry ids are ranks: id 0 is the best completion overall
+        ranked = sorted(best.values(), key=lambda e: (-e[2], len(e[0]), e[0].lower()))
+        self.entries = ranked
+        self.kinds = sorted({kind for _, kind, _ in ranked})
+
+        pairs = []
+        for entry_id, (name, _, _) in enumerate(ranked):
+            words = name.lower().split(" ")
+            for i in range(len(words)):
+                pairs.append((" ".join(words[i:]), entry_id))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.ids = [entry_id for _, entry_id in pairs]
+
+        # Short prefixes match large slices; keep their best ids (lowest = best) ready
+        by_prefix = {}  # (kind or None, prefix) -> entry ids
+        for key, entry_id in pairs:
+            kind = ranked[entry_id][1]
+            for length in range(1, min(_PRECOMPUTED_PREFIX_LEN, len(key)) + 1):
+                by_prefix.setdefault((None, key[:length]), set()).add(entry_id)
+                by_prefix.setdefault((kind, key[:length]), set()).add(entry_id)
+        self._top = {prefix: heapq.nsmallest(max_results, ids) for prefix, ids in by_prefix.items()}
+        self._large_slices = LRUCache(max_entries=4096, name='autocomplete')
+
+        digest = hashlib.sha1()
+        for name, kind, popularity in ranked:
+            digest.update(f"{name}\x1f{kind}\x1f{popularity}\x1e".encode("utf-8"))
+        self.version = digest.hexdigest()[:16]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def complete(self, prefix, limit=8, kind=None):
+        """
+        Top completions for a prefix.
+
+        Args:
+            prefix: What the user has typed so far
+            limit: Number of results (capped at max_results)
+            kind: Only return entries of this kind (e.g. 'ingredient', 'recipe')
+
+        Returns:
+            list: [{"text": name, "type": kind}, ...], best first
+        """
+        prefix = " ".join(prefix.lower().split())
+        limit = max(1, min(limit, self.max_results))
+        if not prefix:
+            return []
+
+        if len(prefix) <= _PRECOMPUTED_PREFIX_LEN:
+            entry_ids = self._top.get((kind, prefix), [])
+        else:
+            start = bisect_left(self.keys, prefix)
+            end = bisect_left(self.keys, prefix + "\uffff", start)
+            if end - start <= _SCAN_LIMIT:
+                entry_ids = self._best_ids(start, end, kind, limit)
+            else:
+                entry_ids = self._large_slices.get((kind, prefix))
+                if entry_ids is None:
+                    entry_ids = self._best_ids(start, end, kind, self.max_results)
+                    self._large_slices.set((kind, prefix), entry_ids)
+
+        return [{"text": self.entries[i][0], "type": self.entries[i][1]} for i in entry_ids[:limit]]
+
+    def _best_ids(self, start, end, kind, limit):
+        """Best (lowest) distinct entry ids in keys[start:end]"""
+        entry_ids = set(self.ids[start:end])
+        if kind is not None:
+            entry_ids = [i for i in entry_ids if self.entries[i][1] == kind]
+        return heapq.nsmallest(limit, entry_ids)
+
+    def etag(self, *parts):
+        """ETag value (unquoted) for a response computed from this index"""
+        raw = "\x1f".join([self.version] + [str(p) for p in parts])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+
+def build_prefix_index(entries, **kwargs):
+    """Build a PrefixIndex, logging its size and build cost"""
+    start = time.perf_counter()
+    index = PrefixIndex(entries, **kwargs)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logger.info(f"Built autocomplete index: {len(index)} names, {len(index.keys)} keys "
+                f"in {elapsed_ms:.1f}ms")
+    return index
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: ingredient classification throughput.
+
+Compares the compiled IngredientRuleIndex against the previous approach
+(rebuilding the ingredient-name set and scanning ``harmful_for`` lists on
+every call) for 10k, 100k and 1M synthetic ingredient rules.
+
+Usage:
+    python benchmarks/bench_ingredient_index.py [--sizes 10000,100000,1000000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingredient_index import IngredientRuleIndex  # noqa: E402
+
+CONDITIONS = ['diabetes', 'obesity', 'hypertension', 'heart_disease', 'celiac',
+              'gluten_intolerance', 'cholesterol', 'lactose_intolerance',
+              'egg_allergy', 'peanut_allergy', 'soy_allergy', 'corn_allergy']
+
+
+def make_rules(count, seed=42):
+    """Generate `count` synthetic rule documents keyed by ingredient name"""
+    rng = random.Random(seed)
+    rules = {}
+    for i in range(count):
+        name = f"ingredient{i}"
+        rules[name] = {
+            "ingredient": name,
+            "harmful_for": rng.sample(CONDITIONS, rng.randint(0, 3)),
+            "alternative": f"alternative{i}",
+        }
+    return rules
+
+
+def make_requests(rules, count, per_request=8, seed=7):
+    """Generate ingredient lists mixing known, pluralised and unknown names"""
+    rng = random.Random(seed)
+    names = list(rules.keys())
+    requests = []
+    for _ in range(count):
+        items = []
+        for _ in range(per_request):
+            roll = rng.random()
+            name = rng.choice(names)
+            if roll < 0.2:
+                items.append(name + "s")
+            elif roll < 0.9:
+                items.append(name.title())
+            else:
+                items.append(f"unknown{rng.randint(0, 10**6)}")
+        requests.append(items)
+    return requests
+
+
+def legacy_check(ingredients, condition, rules):
+    """The pre-index implementation of app.check_ingredients"""
+    harmful, safe, replacements = [], [], {}
+    db_ingredients = set(rules.keys())
+
+    def safe_normalize(name):
+        name = name.strip().lower()
+        if name.endswith("s") and name[:-1] in db_ingredients:
+            return name[:-1]
+        return name
+
+    for original in ingredients:
+        rule = rules.get(safe_normalize(original))
+        if rule and condition in rule.get("harmful_for", []):
+            harmful.append(original)
+            replacements[original] = rule.get("alternative")
+        else:
+            safe.append(original)
+    return harmful, safe, replacements
+
+
+def run(size, request_count):
+    rules = make_rules(size)
+    requests = make_requests(rules, request_count)
+    ingredient_total = sum(len(r) for r in requests)
+
+    start = time.perf_counter()
+    index = IngredientRuleIndex(rules)
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i, items in enumerate(requests):
+        index.classify(items, CONDITIONS[i % len(CONDITIONS)])
+    indexed_s = time.perf_counter() - start
+
+    # The legacy path rebuilds a set of every rule per call, so sample fewer calls
+    legacy_requests = requests[:max(1, min(request_count, 2_000_000 // size))]
+    start = time.perf_counter()
+    for i, items in enumerate(legacy_requests):
+        legacy_check(items, CONDITIONS[i % len(CONDITIONS)], rules)
+    legacy_s = time.perf_counter() - start
+    legacy_per_call = legacy_s / len(legacy_requests)
+
+    print(f"{size:>9,} rules | build {build_s * 1000:8.1f} ms | "
+          f"indexed {ingredient_total / indexed_s:12,.0f} ingredients/s "
+          f"({indexed_s / request_count * 1e6:7.2f} us/call) | "
+          f"legacy {legacy_per_call * 1e6:12.2f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(',')):
+        run(size, args.requests)
+
+
+if __name__ == '__main__':
+    main()
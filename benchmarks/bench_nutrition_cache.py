@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark: nutrition cache hit rates and USDA calls avoided.
+
+Replays an ingredient trace against NutritionService with the USDA search
+replaced by a counting stand-in, simulating several cold-started workers
+that share one ``nutrition_cache`` collection.
+
+Usage:
+    python benchmarks/bench_nutrition_cache.py [--trace FILE] [--workers 8] [--mongo-uri URI]
+
+The trace is a text file with one ingredient per line (e.g. exported from
+food_entries.input_ingredients). Without --trace a Zipf-distributed
+synthetic trace is generated. Without --mongo-uri the shared cache uses
+mongomock if it is installed, otherwise only the in-memory LRU is measured.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nutrition_service as ns  # noqa: E402
+
+VOCABULARY = ['sugar', 'salt', 'flour', 'butter', 'milk', 'eggs', 'peanuts', 'soy', 'wheat',
+              'corn', 'banana', 'rice', 'chicken', 'onion', 'garlic', 'tomato', 'olive oil',
+              'stevia', 'almond flour', 'almond milk', 'paneer', 'ghee', 'jaggery', 'lentils',
+              'spinach', 'potato', 'yogurt', 'cheese', 'pasta', 'oats', 'honey', 'ginger']
+
+
+def synthetic_trace(length, seed=3):
+    """Zipf-like trace: a few staple ingredients dominate, with a long tail"""
+    rng = random.Random(seed)
+    vocabulary = VOCABULARY + [f"rare ingredient {i}" for i in range(2000)]
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    return rng.choices(vocabulary, weights=weights, k=length)
+
+
+def load_trace(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def fake_search(service):
+    """Stand-in for the USDA search: counts calls, misses 'rare' ingredients"""
+    def search(query, limit):
+        service.usda_calls += 1
+        if query.startswith('rare'):
+            return []
+        return [{'fdcId': sum(map(ord, query)) * 1000 + len(query), 'description': query.title(), 'foodNutrients': [{'nutrientId': 1008, 'value': 100}]}]
+    return search
+
+
+def make_store(mongo_uri):
+    if mongo_uri:
+        from pymongo import MongoClient
+        collection = MongoClient(mongo_uri)['nutrition_bench']['nutrition_cache']
+        collection.drop()
+        return collection, 'mongodb'
+    try:
+        import mongomock
+    except ImportError:
+        return None, 'none'
+    return mongomock.MongoClient()['nutrition_bench']['nutrition_cache'], 'mongomock'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trace')
+    parser.add_argument('--length', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=8, help='cold-started service instances')
+    parser.add_argument('--mongo-uri')
+    args = parser.parse_args()
+
+    trace = load_trace(args.trace) if args.trace else synthetic_trace(args.length)
+    store, store_kind = make_store(args.mongo_uri)
+
+    l1_hits = l1_misses = store_hits = usda_calls = 0
+    chunk = max(1, len(trace) // args.workers)
+    start = time.perf_counter()
+    for worker in range(args.workers):
+        service = ns.NutritionService()
+        service.available = True
+        service._search_food = fake_search(service)
+        if store is not None:
+            service.attach_store(store)
+        for ingredient in trace[worker * chunk:(worker + 1) * chunk]:
+            service.get_ingredient_nutrition(ingredient)
+        stats = service._cache.stats()
+        l1_hits += stats['hits']
+        l1_misses += stats['misses']
+        store_hits += service.store_hits
+        usda_calls += service.usda_calls
+    elapsed = time.perf_counter() - start
+
+    lookups = chunk * args.workers
+    print(f"trace: {lookups:,} lookups, {len(set(trace)):,} distinct ingredients, "
+          f"{args.workers} workers, shared store: {store_kind}")
+    print(f"L1 hit rate:        {l1_hits / lookups:6.1%}")
+    print(f"L2 hit rate:        {store_hits / max(1, l1_misses):6.1%} of L1 misses")
+    print(f"USDA calls:         {usda_calls:,} (uncached baseline would make {lookups:,})")
+    print(f"USDA calls avoided: {lookups - usda_calls:,} ({(lookups - usda_calls) / lookups:.1%})")
+    print(f"replay time:        {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /profile dashboard statistics.
+
+Seeds one user with N food entries and compares the previous approach (load
+every entry into Python plus two more queries) with the single ``$facet``
+aggregation in profile_stats. Reports wall time and peak Python memory
+(tracemalloc) per call.
+
+Needs a real MongoDB (the pipeline uses ``$convert``/``$type``, which
+mongomock does not implement). Data goes to a throwaway database that is
+dropped afterwards.
+
+Usage:
+    python benchmarks/bench_profile_stats.py [--mongo-uri mongodb://localhost:27017/]
+                                            [--entries 100000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient  # noqa: E402
+
+from config import Config  # noqa: E402
+from profile_stats import get_profile_stats, start_of_today  # noqa: E402
+
+PATIENT_ID = "bench-user"
+INGREDIENTS = ["rice", "dal", "ghee", "sugar", "salt", "paneer", "tomato", "onion",
+               "garlic", "wheat flour", "butter", "milk", "spinach", "potato"]
+
+
+def make_entries(count, seed=42):
+    """Entries spread over the last year, a few of them logged today"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    for i in range(count):
+        ingredients = rng.sample(INGREDIENTS, rng.randint(3, 8))
+        split = rng.randint(0, len(ingredients))
+        calories = rng.randint(150, 900)
+        nutrition = ({"macros": {"calories": {"value": calories, "unit": "kcal"}}}
+                     if rng.random() < 0.8 else {"calories": calories})
+        yield {
+            "patient_id": PATIENT_ID,
+            "recipe_name": f"recipe {i % 500}",
+            "input_ingredients": ingredients,
+            "harmful": ingredients[:split],
+            "safe": ingredients[split:],
+            "nutrition": nutrition,
+            "is_favorite": rng.random() < 0.05,
+            "timestamp": now - timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+        }
+
+
+def seed(collection, count, batch_size=5000):
+    collection.create_index([("patient_id", 1), ("timestamp", -1)])
+    batch = []
+    for entry in make_entries(count):
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def legacy_profile_stats(food_entries, patient_id):
+    """The /profile statistics as computed before the aggregation"""
+    user_entries = list(food_entries.find({"patient_id": patient_id}))
+    total_entries = len(user_entries)
+    total_harmful = sum(len(entry.get('harmful', [])) for entry in user_entries)
+    total_safe = sum(len(entry.get('safe', [])) for entry in user_entries)
+
+    recent_entries = list(food_entries.find({"patient_id": patient_id})
+                          .sort("timestamp", -1).limit(10))
+
+    today_entries = list(food_entries.find({
+        "patient_id": patient_id,
+        "timestamp": {"$gte": start_of_today()}
+    }))
+    today_calories = 0
+    for entry in today_entries:
+        nutrition = entry.get('nutrition')
+        if isinstance(nutrition, dict):
+            if 'macros' in nutrition and isinstance(nutrition['macros'], dict):
+                cal_entry = nutrition['macros'].get('calories')
+                if isinstance(cal_entry, dict):
+                    today_calories += int(cal_entry.get('value', 0))
+            elif 'calories' in nutrition:
+                today_calories += int(nutrition.get('calories', 0))
+
+    return {
+        "total_entries": total_entries,
+        "total_harmful": total_harmful,
+        "total_safe": total_safe,
+        "recent_entries": recent_entries,
+        "today_calories": today_calories,
+    }
+
+
+def measure(fn, repeat):
+    """Median wall time (ms) and peak traced memory (MB) of fn()"""
+    times = []
+    peak = 0
+    result = None
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return statistics.median(times), peak / (1024 * 1024), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mongo-uri", default=Config.MONGODB_URI)
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri, serverSelectionTimeoutMS=3000)
+    try:
+        client.admin.command("ping")
+    except Exception as e:
+        print(f"❌ MongoDB not reachable at {args.mongo_uri}: {e}")
+        return 1
+
+    db_name = f"bench_profile_stats_{os.getpid()}"
+    collection = client[db_name]["food_entries"]
+    try:
+        print(f"Seeding {args.entries} entries...")
+        seed(collection, args.entries)
+
+        legacy_ms, legacy_mb, legacy = measure(
+            lambda: legacy_profile_stats(collection, PATIENT_ID), args.repeat)
+        facet_ms, facet_mb, facet = measure(
+            lambda: get_profile_stats(collection, PATIENT_ID), args.repeat)
+
+        for key in ("total_entries", "total_harmful", "total_safe", "today_calories"):
+            if legacy[key] != facet[key]:
+                print(f"⚠️  {key} differs: legacy={legacy[key]} facet={facet[key]}")
+        if ([e["_id"] for e in legacy["recent_entries"]] !=
+                [e["_id"] for e in facet["recent_entries"]]):
+            print("⚠️  recent entries differ")
+
+        print(f"\n{'approach':<12} {'median ms':>10} {'peak MB':>10}")
+        print(f"{'legacy':<12} {legacy_ms:>10.1f} {legacy_mb:>10.1f}")
+        print(f"{'$facet':<12} {facet_ms:>10.1f} {facet_mb:>10.2f}")
+        print(f"\nspeedup: {legacy_ms / facet_ms:.1f}x, "
+              f"memory: {legacy_mb / max(facet_mb, 1e-6):.0f}x less")
+    finally:
+        client.drop_database(db_name)
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
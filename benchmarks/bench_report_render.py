@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark: PDF report render time and peak memory by history length.
+
+Renders the patient report for 1k, 10k and 100k synthetic food entries with
+the streaming builder (report_builder.build_report), each size in a fresh
+process so peak RSS is per render. With --legacy it also renders the old
+layout (all entries in a list, one big Table) for sizes up to --legacy-max.
+
+Entries come from a generator, as from a batched MongoDB cursor; no
+database is needed.
+
+Usage:
+    python benchmarks/bench_report_render.py [--sizes 1000,10000,100000] [--legacy] [--legacy-max 10000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process: argv = mode, entries, output path
+WORKER = r"""
+import json, os, random, resource, sys, time
+from datetime import datetime, timedelta
+sys.path.insert(0, os.getcwd())
+import report_builder
+
+mode, count, path = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+INGREDIENTS = ["rice", "dal", "ghee", "sugar", "salt", "paneer", "tomato", "onion",
+               "garlic", "wheat flour", "butter", "milk", "spinach", "potato"]
+
+class Patient:
+    age, gender, medical_condition, diet_type, allergies = 42, "Female", "diabetes", "Vegetarian", "None"
+
+def entries():
+    rng, now = random.Random(42), datetime.now()
+    for i in range(count):
+        ingredients = rng.sample(INGREDIENTS, rng.randint(3, 8))
+        split = rng.randint(0, len(ingredients))
+        yield {"recipe_name": f"recipe {i % 300}", "harmful": ingredients[:split], "safe": ingredients[split:],
+               "nutrition": {"macros": {"calories": {"value": rng.randint(150, 900)}}},
+               "timestamp": now - timedelta(minutes=i * 7)}
+
+start = time.perf_counter()
+if mode == "streaming":
+    report_builder.build_report(path, "patient-1", Patient(), entries())
+else:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table
+    style = getSampleStyleSheet()['Normal']
+    rows = [report_builder.entry_row(idx, entry, style) for idx, entry in enumerate(list(entries()), 1)]
+    table = Table([["Sr No", "Recipe Name", "Harmful", "Safe", "Calories", "Timestamp"]] + rows,
+                  colWidths=report_builder.COL_WIDTHS, repeatRows=1)
+    table.setStyle(report_builder.TABLE_STYLE)
+    SimpleDocTemplate(path, pagesize=letter).build([table])
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "pdf_mb": os.path.getsize(path) / 1e6}))
+"""
+
+
+def render(mode, count, directory):
+    path = os.path.join(directory, f"{mode}_{count}.pdf")
+    result = subprocess.run([sys.executable, "-c", WORKER, mode, str(count), path],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    os.remove(path)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated entry counts")
+    parser.add_argument("--legacy", action="store_true", help="also render the old single-table layout")
+    parser.add_argument("--legacy-max", type=int, default=10000, help="largest size rendered with --legacy")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    modes = ["streaming"] + (["legacy"] if args.legacy else [])
+
+    print(f"{'mode':<10} {'entries':>8} {'seconds':>9} {'peak RSS MB':>12} {'PDF MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for count in sizes:
+            for mode in modes:
+                if mode == "legacy" and count > args.legacy_max:
+                    continue
+                try:
+                    result = render(mode, count, directory)
+                except subprocess.CalledProcessError as e:
+                    print(f"❌ {mode} render of {count} entries failed:\n{e.stderr}")
+                    return 1
+                print(f"{mode:<10} {count:>8} {result['seconds']:>9.1f} {result['peak_rss_mb']:>12.1f} "
+                      f"{result['pdf_mb']:>8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark: recipe-name spell checking, n-gram index vs difflib.
+
+Runs typo'd queries against
+- difflib: ``get_close_matches`` over the full name list (the previous code)
+- index: ``NGramIndex.get_close_matches`` (see fuzzy_index.py)
+
+on ``models/recipes.csv`` and on a synthetic corpus built from its words
+(1M names by default). Reports per-query latency and how often the index
+suggestions equal difflib's. difflib is only timed on a sample of queries
+for large corpora because each query scans every name.
+
+Usage:
+    python benchmarks/bench_spell_checker.py [--synthetic 1000000] [--queries 500]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from difflib import get_close_matches
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzy_index import build_ngram_index  # noqa: E402
+
+RECIPES_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models', 'recipes.csv')
+
+
+def load_recipes():
+    with open(RECIPES_CSV, 'r', encoding='utf-8') as f:
+        return [line.strip().lower() for line in f.readlines()[1:] if line.strip()]
+
+
+def synthetic_corpus(words, count, seed=5):
+    """Unique 2-5 word names drawn from the real recipe vocabulary"""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        names.add(' '.join(rng.choice(words) for _ in range(rng.randint(2, 5))))
+    return sorted(names)
+
+
+def typo(name, rng):
+    """One or two random edits: drop, swap, replace or insert a character"""
+    chars = list(name)
+    for _ in range(rng.randint(1, 2)):
+        if len(chars) < 3:
+            break
+        i = rng.randrange(len(chars) - 1)
+        op = rng.random()
+        if op < 0.25:
+            del chars[i]
+        elif op < 0.5:
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+        elif op < 0.75:
+            chars[i] = rng.choice('abcdefghijklmnopqrstuvwxyz')
+        else:
+            chars.insert(i, rng.choice('abcdefghijklmnopqrstuvwxyz'))
+    return ''.join(chars)
+
+
+def make_queries(names, count, seed=9):
+    rng = random.Random(seed)
+    return [typo(rng.choice(names), rng) for _ in range(count)]
+
+
+def timed(fn, queries):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(fn(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return results, latencies
+
+
+def summary(latencies):
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    return f"mean {statistics.mean(latencies):9.3f}ms  p50 {latencies[len(latencies) // 2]:9.3f}ms  p95 {p95:9.3f}ms"
+
+
+def run(label, names, queries, difflib_sample):
+    print(f"\n== {label}: {len(names):,} names, {len(queries)} queries ==")
+    start = time.perf_counter()
+    index = build_ngram_index(names)
+    print(f"index build: {time.perf_counter() - start:.2f}s, {len(index.vocabulary.words):,} words")
+
+    index_results, index_latencies = timed(lambda q: index.get_close_matches(q, 3, 0.6), queries)
+    print(f"index:   {summary(index_latencies)}")
+
+    sample = queries[:difflib_sample]
+    difflib_results, difflib_latencies = timed(lambda q: get_close_matches(q, names, 3, 0.6), sample)
+    print(f"difflib: {summary(difflib_latencies)}  ({len(sample)} queries)")
+
+    same_top = sum(1 for a, b in zip(index_results, difflib_results) if a[:1] == b[:1])
+    same_all = sum(1 for a, b in zip(index_results, difflib_results) if a == b)
+    print(f"agreement with difflib: top suggestion {same_top / len(sample):.1%}, "
+          f"all suggestions {same_all / len(sample):.1%}")
+    print(f"speedup (mean): {statistics.mean(difflib_latencies) / statistics.mean(index_latencies):,.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--synthetic', type=int, default=1000000, help='synthetic corpus size (0 to skip)')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--difflib-sample', type=int, default=20,
+                        help='queries timed with difflib on the synthetic corpus')
+    args = parser.parse_args()
+
+    recipes = load_recipes()
+    run('models/recipes.csv', recipes, make_queries(recipes, args.queries), args.queries)
+
+    if args.synthetic:
+        words = sorted({word for name in recipes for word in name.split()})
+        corpus = synthetic_corpus(words, args.synthetic)
+        run('synthetic', corpus, make_queries(corpus, args.queries), args.difflib_sample)
+
+
+if __name__ == '__main__':
+    main()
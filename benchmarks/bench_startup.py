@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark: worker startup and first-request latency.
+
+Starts fresh Python processes (like newly forked workers) and has each one
+serve a burst of concurrent first requests through the Flask test client,
+once lazily (the first requests connect and load the caches) and once
+after ``app.warm_up()``. Reports the warm-up time and the
+median and slowest latency of the burst.
+
+Needs a real MongoDB: the point is connection setup and pool growth, which
+mongomock does not have. Data goes to a throwaway database that is dropped
+afterwards.
+
+Usage:
+    python benchmarks/bench_startup.py [--mongo-uri mongodb://localhost:27017/]
+                                       [--burst 16] [--runs 3]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pymongo import MongoClient  # noqa: E402
+
+from config import Config  # noqa: E402
+
+# Requests a new worker typically gets first: rules (autocomplete), the
+# spell-checker recipe list and a few queries (landing stats)
+FIRST_REQUESTS = [
+    ("GET", "/api/autocomplete?q=su", None),
+    ("POST", "/api/spell-check", {"recipe_name": "biryni"}),
+    ("GET", "/api/stats", None),
+]
+
+# Runs in the child process: argv = database name, mode, burst size, requests (JSON)
+WORKER = r"""
+import json, os, sys, threading, time
+sys.path.insert(0, os.getcwd())
+from config import Config
+Config.DATABASE_NAME = sys.argv[1]
+mode, burst = sys.argv[2], int(sys.argv[3])
+requests_ = json.loads(sys.argv[4])
+
+start = time.perf_counter()
+import app
+import_ms = (time.perf_counter() - start) * 1000
+warm_ms = 0.0
+if mode == "warm":
+    start = time.perf_counter()
+    app.warm_up()
+    warm_ms = (time.perf_counter() - start) * 1000
+
+latencies = []
+lock = threading.Lock()
+gate = threading.Barrier(burst)
+
+def first_request(i):
+    method, path, body = requests_[i % len(requests_)]
+    client = app.app.test_client()
+    gate.wait()
+    start = time.perf_counter()
+    client.open(path, method=method, json=body)
+    with lock:
+        latencies.append((time.perf_counter() - start) * 1000)
+
+threads = [threading.Thread(target=first_request, args=(i,)) for i in range(burst)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+print(json.dumps({"import_ms": import_ms, "warm_ms": warm_ms, "latencies": latencies}))
+"""
+
+
+def run_worker(mongo_uri, db_name, mode, burst):
+    env = dict(os.environ, MONGODB_URI=mongo_uri, SEED_ON_STARTUP="true", WRITE_BEHIND_ENABLED="false")
+    result = subprocess.run(
+        [sys.executable, "-c", WORKER, db_name, mode, str(burst), json.dumps(FIRST_REQUESTS)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mongo-uri", default=Config.MONGODB_URI)
+    parser.add_argument("--burst", type=int, default=16, help="concurrent first requests per worker")
+    parser.add_argument("--runs", type=int, default=3, help="fresh workers per mode")
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri, serverSelectionTimeoutMS=3000)
+    try:
+        client.admin.command("ping")
+    except Exception as e:
+        print(f"❌ MongoDB not reachable at {args.mongo_uri}: {e}")
+        return 1
+
+    db_name = f"bench_startup_{os.getpid()}"
+    try:
+        # Seed once so both modes start from the same data
+        run_worker(args.mongo_uri, db_name, "warm", 1)
+
+        print(f"{'mode':<6} {'warm-up ms':>11} {'median ms':>10} {'slowest ms':>11}")
+        for mode in ("lazy", "warm"):
+            warm, medians, slowest = [], [], []
+            for _ in range(args.runs):
+                result = run_worker(args.mongo_uri, db_name, mode, args.burst)
+                warm.append(result["warm_ms"])
+                medians.append(statistics.median(result["latencies"]))
+                slowest.append(max(result["latencies"]))
+            print(f"{mode:<6} {statistics.median(warm):>11.1f} {statistics.median(medians):>10.1f} "
+                  f"{statistics.median(slowest):>11.1f}")
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Worker failed:\n{e.stderr}")
+        return 1
+    finally:
+        client.drop_database(db_name)
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark: read latency of the storage backends.
+
+Seeds the same users and food entries into the embedded SQLite store (a
+temporary file) and, when one is reachable, a MongoDB database, then times
+the reads a page view makes: a user lookup, a history page, a cookbook page
+and the profile statistics. Reports the median and p95 per read.
+
+MongoDB is optional (pass --mongo-uri ''); its data goes to a throwaway
+database that is dropped afterwards.
+
+Usage:
+    python benchmarks/bench_storage_backend.py [--mongo-uri mongodb://localhost:27017/]
+                                               [--users 200] [--entries 50000] [--repeat 200]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient  # noqa: E402
+
+import entry_pages  # noqa: E402
+from config import Config  # noqa: E402
+from db_indexes import apply_indexes  # noqa: E402
+from name_keys import name_fields  # noqa: E402
+from profile_stats import get_profile_stats  # noqa: E402
+from sqlite_store import SQLiteDatabase  # noqa: E402
+
+INGREDIENTS = ["rice", "dal", "ghee", "sugar", "salt", "paneer", "tomato", "onion",
+               "garlic", "wheat flour", "butter", "milk", "spinach", "potato"]
+
+
+def make_data(users, entries, seed=42):
+    rng = random.Random(seed)
+    now = datetime.now()
+    user_docs = [{"user_id": f"user-{i}", "username": f"user{i}", "email": f"user{i}@example.com",
+                  "medical_condition": "diabetes"} for i in range(users)]
+    entry_docs = []
+    for i in range(entries):
+        ingredients = rng.sample(INGREDIENTS, rng.randint(3, 8))
+        split = rng.randint(0, len(ingredients))
+        recipe_name = f"recipe {i % 300}"
+        entry_docs.append({
+            "patient_id": f"user-{rng.randrange(users)}",
+            "recipe_name": recipe_name,
+            **name_fields(recipe_name),
+            "input_ingredients": ingredients,
+            "harmful": ingredients[:split],
+            "safe": ingredients[split:],
+            "nutrition": {"macros": {"calories": {"value": rng.randint(150, 900), "unit": "kcal"}}},
+            "is_favorite": rng.random() < 0.1,
+            "category": "General",
+            "timestamp": now - timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+        })
+    return user_docs, entry_docs
+
+
+def seed(db, users, entries):
+    apply_indexes(db)
+    db["users"].insert_many([dict(doc) for doc in users])
+    for start in range(0, len(entries), 5000):
+        db["food_entries"].insert_many([dict(doc) for doc in entries[start:start + 5000]])
+
+
+def measure(func, repeat, rng, users):
+    times = []
+    for _ in range(repeat):
+        user = rng.randrange(users)
+        start = time.perf_counter()
+        func(user)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.95) - 1]
+
+
+def run_reads(db, users, repeat):
+    entries = db["food_entries"]
+    reads = {
+        "user by username": lambda u: db["users"].find_one({"username": f"user{u}"}),
+        "history page": lambda u: entry_pages.entries_page(entries, f"user-{u}"),
+        "cookbook page": lambda u: entry_pages.cookbook_page(entries, f"user-{u}"),
+        "profile stats": lambda u: get_profile_stats(entries, f"user-{u}"),
+    }
+    rng = random.Random(7)
+    return {name: measure(read, repeat, rng, users) for name, read in reads.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mongo-uri", default=Config.MONGODB_URI)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--entries", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    users, entries = make_data(args.users, args.entries)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteDatabase(os.path.join(directory, "bench.sqlite3"))
+        print(f"Seeding SQLite with {args.entries} entries...")
+        seed(store, users, entries)
+        results["sqlite"] = run_reads(store, args.users, args.repeat)
+        store.close()
+
+    if args.mongo_uri:
+        client = MongoClient(args.mongo_uri, serverSelectionTimeoutMS=3000)
+        db_name = f"bench_storage_{os.getpid()}"
+        try:
+            client.admin.command("ping")
+            print(f"Seeding MongoDB with {args.entries} entries...")
+            seed(client[db_name], users, entries)
+            results["mongodb"] = run_reads(client[db_name], args.users, args.repeat)
+        except Exception as e:
+            print(f"⚠️  Skipping MongoDB ({args.mongo_uri}): {e}")
+        finally:
+            client.drop_database(db_name)
+            client.close()
+
+    print(f"\n{'read':<18} " + " ".join(f"{backend + ' p50/p95 ms':>24}" for backend in results))
+    for read in next(iter(results.values())):
+        cells = " ".join(f"{results[b][read][0]:>14.3f} / {results[b][read][1]:<7.3f}" for b in results)
+        print(f"{read:<18} {cells}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark: USDA requests per recipe and latency, batched vs per-ingredient.
+
+Starts the local fake FoodData Central server of tests/fake_usda.py
+(``/foods/search`` and bulk ``POST /foods``, with configurable latency per
+request) and compares:
+
+- legacy: a new ThreadPoolExecutor per recipe and one un-pooled
+  ``requests.get`` search per ingredient (the previous implementation)
+- batched: ``NutritionService.calculate_recipe_nutrition`` with the pooled
+  session, shared executor and the name -> FDC id cache
+
+Two scenarios are run for the batched path: cold (nothing cached) and known
+ids (name -> FDC id cached in the shared store, nutrient records expired),
+which exercises the bulk ``POST /foods`` path.
+
+Usage:
+    python benchmarks/bench_usda_batching.py [--recipes 50] [--latency-ms 40]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nutrition_service as ns  # noqa: E402
+from tests.fake_usda import VOCABULARY, FakeUSDA, start_fake_usda  # noqa: E402
+
+
+def legacy_recipe_nutrition(base_url, api_key, ingredients):
+    """The previous strategy: per-recipe pool, one un-pooled search per ingredient"""
+    def fetch(ingredient):
+        response = requests.get(f"{base_url}/foods/search",
+                                params={'api_key': api_key, 'query': ingredient, 'pageSize': 1}, timeout=3)
+        response.raise_for_status()
+        return response.json().get('foods', [])
+
+    with ThreadPoolExecutor(max_workers=min(8, len(ingredients))) as executor:
+        futures = [executor.submit(fetch, ingredient) for ingredient in ingredients]
+        return [future.result() for future in as_completed(futures)]
+
+
+def make_recipes(count, seed=11):
+    rng = random.Random(seed)
+    recipes = []
+    for _ in range(count):
+        ingredients = rng.sample(VOCABULARY, rng.randint(6, 14))
+        ingredients += [f"mystery spice {rng.randint(0, 3)}"]
+        recipes.append(ingredients)
+    return recipes
+
+
+def measure(label, recipes, run):
+    FakeUSDA.requests_served = 0
+    FakeUSDA.connections = 0
+    latencies = []
+    for ingredients in recipes:
+        start = time.perf_counter()
+        run(ingredients)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+    print(f"{label:<26} {FakeUSDA.requests_served / len(recipes):>8.2f} "
+          f"{FakeUSDA.connections / len(recipes):>8.2f} "
+          f"{statistics.mean(latencies):>10.1f} {p95:>10.1f}")
+
+
+def make_store():
+    try:
+        import mongomock
+    except ImportError:
+        return None
+    return mongomock.MongoClient()['usda_bench']['nutrition_cache']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipes', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=40)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_usda(latency=args.latency_ms / 1000)
+    ns.USDA_API_BASE_URL = base_url
+    os.environ['USDA_API_KEY'] = 'bench'
+
+    recipes = make_recipes(args.recipes)
+    print(f"{args.recipes} recipes, {statistics.mean(len(r) for r in recipes):.1f} ingredients each, "
+          f"{args.latency_ms:.0f}ms server latency")
+    print(f"{'strategy':<26} {'req/rec':>8} {'conn/rec':>8} {'mean ms':>10} {'p95 ms':>10}")
+
+    measure('legacy per-ingredient', recipes, lambda ing: legacy_recipe_nutrition(base_url, 'bench', ing))
+
+    # Cold: every worker starts empty, so each recipe pays for its own searches
+    def cold(ingredients):
+        service = ns.NutritionService()
+        service._session = shared['session']
+        service._executor = shared['executor']
+        service.calculate_recipe_nutrition(ingredients)
+
+    warm_service = ns.NutritionService()
+    shared = {'session': warm_service._get_session(), 'executor': warm_service._get_executor()}
+    measure('batched, cold caches', recipes, cold)
+
+    # Known ids: names resolved in the shared store, nutrient records expired
+    store = make_store()
+    if store is None:
+        print("mongomock not installed; skipping the known-ids scenario")
+    else:
+        seeder = ns.NutritionService()
+        seeder.attach_store(store)
+        seeder.get_nutrition_batch(VOCABULARY)
+        store.update_many({'_id': {'$regex': '^fdc:'}},
+                          {'$set': {'expires_at': datetime.utcnow() - timedelta(seconds=1)}})
+
+        def known_ids(ingredients):
+            service = ns.NutritionService()
+            service._session = shared['session']
+            service._executor = shared['executor']
+            service.attach_store(store)
+            service.calculate_recipe_nutrition(ingredients)
+
+        measure('batched, known FDC ids', recipes, known_ids)
+
+    # Steady state: one long-lived worker with a warm in-memory cache
+    for ingredients in recipes:
+        warm_service.calculate_recipe_nutrition(ingredients)
+    measure('batched, warm worker', recipes, warm_service.calculate_recipe_nutrition)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,16 @@ class Config:
     # Flask Configuration
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-change-this-in-production'
     
+    # Bearer token required by /api/metrics; the endpoint is disabled (404) when unset
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+    
+    # Storage backend: 'mongodb', or 'sqlite' for an embedded single-node store (see sqlite_store.py).
+    # Only used when chosen here: an unreachable MongoDB is an error, not a switch to SQLite
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongodb').lower()
+    
+    # SQLite database file; also where data goes when MongoDB cannot be reached
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', os.path.join('data', 'recipe_modifier.sqlite3'))
+    
     # MongoDB Configuration
     MONGODB_URI = os.environ.get('MONGODB_URI') or 'mongodb://localhost:27017/'
     DATABASE_NAME = 'health_recipe_modifier'
@@ -38,9 +48,63 @@ class Config:
     # Maximum number of milliseconds that a connection can be in the pool before being removed and replaced
     MONGODB_MAX_CONNECTING = int(os.environ.get('MONGODB_MAX_CONNECTING', 2))  # Limit concurrent connection establishment
     
+    # Create missing indexes on first connection (deployments run `python db_indexes.py apply` instead)
+    MONGODB_ENSURE_INDEXES = os.environ.get('MONGODB_ENSURE_INDEXES', 'false').lower() == 'true'
+    
+    # Insert sample data and core ingredients at startup, never on a request: once per
+    # gunicorn start (on_starting), else in warm_up(); turn off when
+    # `python migrations.py seed-database` runs as a deploy step
+    SEED_ON_STARTUP = os.environ.get('SEED_ON_STARTUP', 'true').lower() == 'true'
+    
+    # Ingredient Rules Cache Configuration
+    # How often (seconds) to check the rules version counter when no change stream is available
+    RULES_CACHE_POLL_INTERVAL = int(os.environ.get('RULES_CACHE_POLL_INTERVAL', 30))
+    
+    # Use a MongoDB change stream for instant invalidation (requires a replica set / Atlas)
+    RULES_CACHE_CHANGE_STREAM = os.environ.get('RULES_CACHE_CHANGE_STREAM', 'true').lower() == 'true'
+    
     # Gemini API Configuration
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY') or 'your-gemini-api-key-here'
     
+    # Seconds a worker may hold the lease for generating one recipe before others take over
+    RECIPE_LEASE_TTL = int(os.environ.get('RECIPE_LEASE_TTL', 60))
+    
+    # In-process (L1) cache for generated recipes in front of the generated_recipes collection
+    RECIPE_L1_MAX_ENTRIES = int(os.environ.get('RECIPE_L1_MAX_ENTRIES', 2000))
+    RECIPE_L1_MAX_BYTES = int(os.environ.get('RECIPE_L1_MAX_BYTES', 8 * 1024 * 1024))  # 8MB
+    RECIPE_L1_TTL = int(os.environ.get('RECIPE_L1_TTL', 3600))  # 1 hour
+
+    # Food entries reference deduplicated recipe texts in recipe_blobs (see recipe_blobs.py)
+    RECIPE_BLOB_CODEC = os.environ.get('RECIPE_BLOB_CODEC', 'zlib').lower()  # zlib, zstd (needs zstandard) or none
+    RECIPE_BLOB_COMPRESS_THRESHOLD = int(os.environ.get('RECIPE_BLOB_COMPRESS_THRESHOLD', 256))  # Bytes
+
+    # Render results immediately and stream the generated recipe in (server-sent events)
+    GEMINI_STREAMING = os.environ.get('GEMINI_STREAMING', 'true').lower() == 'true'
+    
+    # Autocomplete (/api/autocomplete) index over ingredient and recipe names
+    AUTOCOMPLETE_REFRESH_INTERVAL = int(os.environ.get('AUTOCOMPLETE_REFRESH_INTERVAL', 300))  # Rebuild to pick up new names/popularity
+    AUTOCOMPLETE_POPULARITY_LIMIT = int(os.environ.get('AUTOCOMPLETE_POPULARITY_LIMIT', 5000))  # Most-used names counted per kind
+    AUTOCOMPLETE_MAX_RESULTS = 20
+    AUTOCOMPLETE_MAX_AGE = int(os.environ.get('AUTOCOMPLETE_MAX_AGE', 300))  # Browser cache lifetime (seconds)
+    
+    # Write-behind buffer for food entry inserts (see write_behind.py); off by default
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+    WRITE_BEHIND_MAX_BATCH = int(os.environ.get('WRITE_BEHIND_MAX_BATCH', 200))  # Flush when this many entries wait
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL', 1.0))  # Seconds an entry may wait
+    WRITE_BEHIND_MAX_BACKLOG = int(os.environ.get('WRITE_BEHIND_MAX_BACKLOG', 10000))  # Kept across failed flushes
+
+    # PDF reports render in a process pool (see report_jobs.py); 0 renders in the request (serverless)
+    REPORT_JOB_WORKERS = int(os.environ.get('REPORT_JOB_WORKERS', 0 if os.environ.get('VERCEL') else 2))
+    REPORT_JOB_MAX_PENDING = int(os.environ.get('REPORT_JOB_MAX_PENDING', 16))  # Queued renders per app process
+    REPORT_JOB_TIMEOUT = int(os.environ.get('REPORT_JOB_TIMEOUT', 300))  # Seconds before a pending job counts as lost
+    REPORT_JOB_START_METHOD = os.environ.get('REPORT_JOB_START_METHOD', 'spawn')  # multiprocessing start method
+    REPORT_BATCH_SIZE = int(os.environ.get('REPORT_BATCH_SIZE', 500))  # Entries fetched per cursor batch while rendering
+    # Rendered reports go to GridFS on MongoDB (any instance can serve them); 'local' keeps them on this node's disk
+    REPORT_STORE = os.environ.get('REPORT_STORE', 'gridfs').lower()
+
+    # Entries per cursor batch (and per response chunk) of /api/export/<patient_id>.ndjson|csv
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+    
     # Session Configuration
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
     
@@ -0,0 +1,257 @@
+"""
+Per-User, Per-Day Statistics Rollups
+
+The ``user_daily_stats`` collection holds one document per (patient, day)
+with counters that are kept up to date with ``$inc`` as food entries are
+written, so dashboards sum a few documents per day of history instead of
+scanning every entry:
+
+    {_id: "<patient_id>|<YYYY-MM-DD>", patient_id, day,
+     entries, harmful, safe, calories, favorites, updated_at}
+
+Documents with patient_id ``ALL_USERS`` hold the same counters summed over
+every user (for the landing-page totals).
+
+Incremental updates are best-effort: a failed ``$inc`` is logged and the
+rollup drifts until the next rebuild. ``rebuild`` recomputes everything from
+``food_entries`` (``python migrations.py rebuild-daily-stats``); until it has
+run once, readers report the rollups as not ready and callers fall back to
+querying the entries.
+"""
+
+import logging
+from datetime import datetime
+
+from pymongo import ReplaceOne, UpdateOne
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# patient_id of the rollups summed over all users
+ALL_USERS = "*"
+
+# _id of the document recording that a full rebuild has completed
+READY_ID = "__rebuilt__"
+
+COUNTERS = ("entries", "harmful", "safe", "calories", "favorites")
+
+
+def _to_long(field):
+    return {"$convert": {"input": field, "to": "long", "onError": 0, "onNull": 0}}
+
+
+# Calories of one entry: nested nutrition.macros.calories.value (current
+# format), else the legacy flat nutrition.calories
+ENTRY_CALORIES = {
+    "$cond": [
+        {"$eq": [{"$type": "$nutrition.macros"}, "object"]},
+        {"$cond": [
+            {"$eq": [{"$type": "$nutrition.macros.calories"}, "object"]},
+            _to_long("$nutrition.macros.calories.value"),
+            0,
+        ]},
+        _to_long("$nutrition.calories"),
+    ]
+}
+
+
+# Collections (by full name) whose readiness marker has been seen
+_ready_collections = set()
+
+
+def day_key(timestamp):
+    """Day bucket of an entry timestamp (entries store naive local time)"""
+    return (timestamp or datetime.now()).strftime("%Y-%m-%d")
+
+
+def entry_calories(nutrition):
+    """Calories of one entry's nutrition; same rules as ENTRY_CALORIES"""
+    if not isinstance(nutrition, dict):
+        return 0
+    try:
+        macros = nutrition.get("macros")
+        if isinstance(macros, dict):
+            calories = macros.get("calories")
+            return int(calories.get("value") or 0) if isinstance(calories, dict) else 0
+        return int(nutrition.get("calories") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _size(value):
+    return len(value) if isinstance(value, list) else 0
+
+
+def record_change(rollups, patient_id, timestamp, **deltas):
+    """
+    Add deltas (entries=1, calories=-250, ...) to the patient's and the
+    all-users rollups of the day the entry belongs to.
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas or not patient_id:
+        return
+    day = day_key(timestamp)
+    now = datetime.now()
+    try:
+        for owner in (patient_id, ALL_USERS):
+            rollups.update_one(
+                {"_id": f"{owner}|{day}"},
+                {"$inc": deltas, "$set": {"patient_id": owner, "day": day, "updated_at": now}},
+                upsert=True
+            )
+    except Exception as e:
+        logger.warning(f"Daily stats update failed for {patient_id} on {day}: {e}")
+
+
+def record_favorite_changes(rollups, patient_id, timestamps, delta):
+    """
+    Add delta to the favorites counters of the days of several entries
+    (e.g. after an update_many), in one bulk write.
+    """
+    per_day = {}
+    for timestamp in timestamps:
+        day = day_key(timestamp)
+        per_day[day] = per_day.get(day, 0) + delta
+    if not per_day or not patient_id:
+        return
+    now = datetime.now()
+    requests = [
+        UpdateOne(
+            {"_id": f"{owner}|{day}"},
+            {"$inc": {"favorites": count}, "$set": {"patient_id": owner, "day": day, "updated_at": now}},
+            upsert=True
+        )
+        for day, count in per_day.items() for owner in (patient_id, ALL_USERS)
+    ]
+    try:
+        rollups.bulk_write(requests, ordered=False)
+    except Exception as e:
+        logger.warning(f"Daily stats favorites update failed for {patient_id}: {e}")
+
+
+def record_entry(rollups, entry):
+    """Count a newly inserted food entry"""
+    record_change(
+        rollups, entry.get("patient_id"), entry.get("timestamp"),
+        entries=1,
+        harmful=_size(entry.get("harmful")),
+        safe=_size(entry.get("safe")),
+        calories=entry_calories(entry.get("nutrition")),
+        favorites=1 if entry.get("is_favorite") else 0,
+    )
+
+
+def is_ready(rollups):
+    """True once a full rebuild has populated the rollups"""
+    name = getattr(rollups, "full_name", None)
+    if name in _ready_collections:
+        return True
+    try:
+        ready = rollups.find_one({"_id": READY_ID}) is not None
+    except Exception:
+        return False
+    if ready and name:
+        _ready_collections.add(name)
+    return ready
+
+
+def user_totals(rollups, patient_id, today=None):
+    """
+    Lifetime totals of one patient plus today's calories, from the rollups.
+
+    Returns:
+        dict: entries, harmful, safe, favorites, today_calories; or None when
+        the rollups are not ready
+    """
+    if not is_ready(rollups):
+        return None
+    today = today or day_key(None)
+    result = next(iter(rollups.aggregate([
+        {"$match": {"patient_id": patient_id}},
+        {"$group": {
+            "_id": None,
+            "entries": {"$sum": "$entries"},
+            "harmful": {"$sum": "$harmful"},
+            "safe": {"$sum": "$safe"},
+            "favorites": {"$sum": "$favorites"},
+            "today_calories": {"$sum": {"$cond": [{"$eq": ["$day", today]}, "$calories", 0]}},
+        }},
+    ])), None) or {}
+    return {key: result.get(key, 0) for key in
+            ("entries", "harmful", "safe", "favorites", "today_calories")}
+
+
+def total_entries(rollups):
+    """Entries logged by all users, or None when the rollups are not ready"""
+    totals = user_totals(rollups, ALL_USERS)
+    return totals["entries"] if totals is not None else None
+
+
+def rebuild(food_entries, rollups, batch_size=1000, dry_run=False):
+    """
+    Recompute every rollup from food_entries.
+
+    Rollups of days that no longer have entries are removed. Entries written
+    while the rebuild runs may be counted twice; re-run it when quiet.
+
+    Returns:
+        int: Number of rollup documents written
+    """
+    started = datetime.now()
+    pipeline = [
+        {"$group": {
+            "_id": {
+                "patient_id": "$patient_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+            },
+            "entries": {"$sum": 1},
+            "harmful": {"$sum": {"$cond": [{"$isArray": "$harmful"}, {"$size": "$harmful"}, 0]}},
+            "safe": {"$sum": {"$cond": [{"$isArray": "$safe"}, {"$size": "$safe"}, 0]}},
+            "calories": {"$sum": ENTRY_CALORIES},
+            "favorites": {"$sum": {"$cond": [{"$eq": ["$is_favorite", True]}, 1, 0]}},
+        }},
+    ]
+
+    all_users = {}  # day -> summed counters
+    written = 0
+    batch = []
+    for row in food_entries.aggregate(pipeline, allowDiskUse=True):
+        patient_id, day = row["_id"].get("patient_id"), row["_id"].get("day")
+        if not patient_id or not day:
+            continue
+        counters = {key: row.get(key, 0) for key in COUNTERS}
+        totals = all_users.setdefault(day, dict.fromkeys(COUNTERS, 0))
+        for key, value in counters.items():
+            totals[key] += value
+        batch.append(_replacement(patient_id, day, counters))
+        if len(batch) >= batch_size:
+            written += _flush(rollups, batch, dry_run)
+            batch = []
+
+    batch.extend(_replacement(ALL_USERS, day, counters) for day, counters in all_users.items())
+    written += _flush(rollups, batch, dry_run)
+
+    if not dry_run:
+        rollups.delete_many({"_id": {"$ne": READY_ID}, "updated_at": {"$lt": started}})
+        rollups.replace_one({"_id": READY_ID}, {"_id": READY_ID, "rebuilt_at": datetime.now()},
+                            upsert=True)
+    return written
+
+
+def _replacement(owner, day, counters):
+    doc_id = f"{owner}|{day}"
+    return ReplaceOne(
+        {"_id": doc_id},
+        {"_id": doc_id, "patient_id": owner, "day": day, **counters, "updated_at": datetime.now()},
+        upsert=True
+    )
+
+
+def _flush(rollups, batch, dry_run):
+    if not batch:
+        return 0
+    if dry_run:
+        return len(batch)
+    rollups.bulk_write(batch, ordered=False)
+    return len(batch)
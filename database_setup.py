@@ -5,6 +5,7 @@ This script initializes the MongoDB database with sample data.
 """
 
 from pymongo import MongoClient
+from rules_cache import mark_rules_reset
 from datetime import datetime
 
 def setup_database():
@@ -95,6 +96,8 @@ def setup_database():
         
         # Insert ingredient rules
         result = ingredient_rules.insert_many(sample_rules)
+        # Running app instances reload their rule caches from scratch
+        mark_rules_reset(db['cache_versions'])
         print(f"✅ Added {len(result.inserted_ids)} ingredient rules")
         
         # Sample patient
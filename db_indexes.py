@@ -0,0 +1,256 @@
+"""
+MongoDB Index Registry
+
+Every index the app relies on, declared in one place and applied at deploy
+time instead of from the request path:
+
+    python db_indexes.py apply     # create missing indexes (idempotent)
+    python db_indexes.py verify    # explain() every query and pipeline shape, fail on COLLSCAN
+
+Run verify after apply (against a database with the real collections);
+queries on a collection that does not exist yet explain as EOF and pass.
+
+``QUERY_SHAPES`` lists the selective queries the app issues and
+``AGGREGATE_SHAPES`` the aggregations that start with a selective
+``$match``, with placeholder values. Whole-collection reads (loading the
+rules cache, the autocomplete name list, the landing-page user count, the
+name popularity fallback used until the counters are rebuilt) scan by
+design and are not part of it. Add a shape here whenever a new query is added, and an
+index to ``INDEXES`` if verify starts failing.
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from functools import partial
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
+from pymongo.errors import OperationFailure
+
+from config import Config
+from entry_export import export_query
+from entry_pages import cookbook_query, encode_cursor
+from name_keys import NAME_KEY_COLLATION
+from profile_stats import profile_stats_pipeline
+
+# collection -> indexes. Default index names, so re-applying (or meeting an index an
+# earlier release created from get_db) is a no-op
+INDEXES = {
+    'ingredient_rules': [
+        IndexModel([('ingredient', ASCENDING)], unique=True),
+        # Polling rules caches fetch documents changed since their version
+        IndexModel([('rules_version', ASCENDING)]),
+    ],
+    'generated_recipes': [
+        IndexModel([('condition', ASCENDING), ('ingredients_key', ASCENDING)]),
+    ],
+    'recipe_leases': [
+        # Let MongoDB reap leases whose holder died
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0),
+    ],
+    'nutrition_cache': [
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0),
+    ],
+    'report_jobs': [
+        # Finished and abandoned report jobs expire a day after their last update
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0),
+    ],
+    'report_files': [
+        # A patient's older reports are removed when a new one is stored
+        IndexModel([('patient_id', ASCENDING)]),
+    ],
+    'recipes': [
+        # Normalized recipe-name lookups (see name_keys.py, backfill via migrations.py)
+        IndexModel([('name_key', ASCENDING)], unique=True, collation=NAME_KEY_COLLATION,
+                   partialFilterExpression={'name_key': {'$type': 'string'}}),
+        IndexModel([('name_tokens', ASCENDING)]),
+    ],
+    'food_entries': [
+        # History, recent entries, today's entries and per-user counts; _id makes
+        # keyset pages (entry_pages.py) an ordered range scan with no sort stage
+        IndexModel([('patient_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)]),
+        # Cookbook: a user's favorites, newest first
+        IndexModel([('patient_id', ASCENDING), ('is_favorite', ASCENDING), ('timestamp', DESCENDING),
+                    ('_id', DESCENDING)]),
+        # "Already saved?" checks by recipe name
+        IndexModel([('patient_id', ASCENDING), ('name_key', ASCENDING), ('is_favorite', ASCENDING)],
+                   collation=NAME_KEY_COLLATION),
+    ],
+    'user_daily_stats': [
+        IndexModel([('patient_id', ASCENDING), ('day', ASCENDING)]),
+    ],
+    'name_popularity': [
+        # Autocomplete ranking: most-used names of a kind
+        IndexModel([('kind', ASCENDING), ('count', DESCENDING)]),
+    ],
+    'users': [
+        IndexModel([('user_id', ASCENDING)], unique=True),
+        IndexModel([('username', ASCENDING)], unique=True),
+        IndexModel([('email', ASCENDING)], unique=True),
+    ],
+}
+
+_PATIENT = 'explain-patient'
+_NOW = datetime(2000, 1, 1)
+_CURSOR = encode_cursor({'timestamp': _NOW, '_id': ObjectId('0' * 24)})
+
+# (description, collection, filter, sort, find options) for every selective query
+QUERY_SHAPES = [
+    ('rules changed since version', 'ingredient_rules', {'rules_version': {'$gt': 0}}, None, {}),
+    ('rule by ingredient', 'ingredient_rules', {'ingredient': {'$in': ['sugar', 'salt']}}, None, {}),
+    ('generated recipe lookup', 'generated_recipes',
+     {'condition': 'diabetes', 'ingredients_key': 'rice,salt'}, None, {}),
+    ('stale lease takeover', 'recipe_leases', {'_id': 'lease', 'expires_at': {'$lt': _NOW}}, None, {}),
+    ('report job status', 'report_jobs', {'_id': '0' * 32, 'patient_id': _PATIENT}, None, {}),
+    ('stale reports of patient', 'report_files', {'patient_id': _PATIENT, '_id': {'$ne': '0' * 32}}, None, {}),
+    ('recipe blobs batch', 'recipe_blobs', {'_id': {'$in': ['0' * 64]}}, None, {}),
+    ('nutrition cache batch', 'nutrition_cache',
+     {'_id': {'$in': ['name:rice', 'fdc:1']}, 'expires_at': {'$gt': _NOW}}, None, {}),
+    ('recipe by exact name', 'recipes', {'name_key': 'dal makhani'}, None,
+     {'collation': NAME_KEY_COLLATION}),
+    ('recipe by partial name', 'recipes',
+     {'$and': [{'name_tokens': 'dal'}, {'name_tokens': {'$regex': '^mak'}}]}, None, {}),
+    ('user entries', 'food_entries', {'patient_id': _PATIENT}, [('timestamp', DESCENDING)], {}),
+    ('export of a time range', 'food_entries', export_query(_PATIENT, _NOW, _NOW),
+     [('timestamp', ASCENDING), ('_id', ASCENDING)], {}),
+    ('export resumed after cursor', 'food_entries', export_query(_PATIENT, _NOW, _NOW, _CURSOR),
+     [('timestamp', ASCENDING), ('_id', ASCENDING)], {}),
+    ('history page after cursor', 'food_entries',
+     {'patient_id': _PATIENT, '$or': [{'timestamp': {'$lt': _NOW}},
+                                      {'timestamp': _NOW, '_id': {'$lt': ObjectId('0' * 24)}}]},
+     [('timestamp', DESCENDING), ('_id', DESCENDING)], {}),
+    ('entries since midnight', 'food_entries',
+     {'patient_id': _PATIENT, 'timestamp': {'$gte': _NOW}}, None, {}),
+    ('cookbook page', 'food_entries', cookbook_query(_PATIENT),
+     [('timestamp', DESCENDING), ('_id', DESCENDING)], {}),
+    ('cookbook page after cursor', 'food_entries', cookbook_query(_PATIENT, _CURSOR),
+     [('timestamp', DESCENDING), ('_id', DESCENDING)], {}),
+    ('saved recipe check', 'food_entries',
+     {'patient_id': _PATIENT, 'name_key': 'dal makhani', 'is_favorite': True}, None,
+     {'collation': NAME_KEY_COLLATION}),
+    ('daily stats of a user', 'user_daily_stats', {'patient_id': _PATIENT}, None, {}),
+    ('most used names', 'name_popularity', {'kind': 'ingredient'}, [('count', DESCENDING)], {}),
+    ('user by id', 'users', {'user_id': _PATIENT}, None, {}),
+    ('user by username', 'users', {'username': 'someone'}, None, {}),
+    ('user by email', 'users', {'email': 'someone@example.com'}, None, {}),
+    ('registration duplicate check', 'users',
+     {'$or': [{'username': 'someone'}, {'email': 'someone@example.com'}]}, None, {}),
+]
+
+# (description, collection, pipeline) for every aggregation over a selective $match
+AGGREGATE_SHAPES = [
+    ('profile stats', 'food_entries', profile_stats_pipeline(_PATIENT, _NOW)),
+    ('daily stats totals of a user', 'user_daily_stats',
+     [{'$match': {'patient_id': _PATIENT}}, {'$group': {'_id': None, 'entries': {'$sum': '$entries'}}}]),
+]
+
+
+def apply_indexes(db):
+    """
+    Create every registered index. Existing identical indexes are left alone.
+
+    Returns:
+        list: (collection, error) for indexes that could not be created, e.g.
+        a unique index over duplicate data or a conflicting older definition
+    """
+    failures = []
+    for name, models in INDEXES.items():
+        for model in models:
+            try:
+                db[name].create_indexes([model])
+            except Exception as e:
+                failures.append((name, f"{model.document['name']}: {e}"))
+    return failures
+
+
+def _plan_stages(plan):
+    """Every stage name in an explain() plan tree"""
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def _winning_stages(explained):
+    """Stage names of every winning plan in a find or aggregate explain() result"""
+    if isinstance(explained, dict):
+        for key, value in explained.items():
+            if key == 'winningPlan':
+                yield from _plan_stages(value)
+            elif key != 'rejectedPlans':
+                yield from _winning_stages(value)
+    elif isinstance(explained, list):
+        for item in explained:
+            yield from _winning_stages(item)
+
+
+def _explain_find(db, name, query, sort, options):
+    cursor = db[name].find(query, **options)
+    if sort:
+        cursor = cursor.sort(sort)
+    return cursor.explain()
+
+
+def _explain_aggregate(db, name, pipeline):
+    return db.command('aggregate', name, pipeline=pipeline, explain=True)
+
+
+def verify_query_plans(db):
+    """
+    Explain every registered query and aggregation shape.
+
+    Returns:
+        list: (description, problem) for shapes whose winning plan scans the
+        collection or that could not be explained
+    """
+    shapes = [(description, name, partial(_explain_find, db, name, query, sort, options))
+              for description, name, query, sort, options in QUERY_SHAPES]
+    shapes += [(description, name, partial(_explain_aggregate, db, name, pipeline))
+               for description, name, pipeline in AGGREGATE_SHAPES]
+    problems = []
+    for description, name, explain in shapes:
+        try:
+            explained = explain()
+        except OperationFailure as e:
+            problems.append((description, f"explain failed: {e}"))
+            continue
+        if 'COLLSCAN' in set(_winning_stages(explained)):
+            problems.append((description, f"COLLSCAN on {name}"))
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes")
+    parser.add_argument('command', choices=['apply', 'verify'])
+    parser.add_argument('--mongo-uri', default=Config.MONGODB_URI)
+    parser.add_argument('--database', default=Config.DATABASE_NAME)
+    args = parser.parse_args(argv)
+
+    client = MongoClient(args.mongo_uri)
+    try:
+        db = client[args.database]
+        if args.command == 'apply':
+            failures = apply_indexes(db)
+            for name, error in failures:
+                print(f"❌ {name}: {error}")
+            count = sum(len(models) for models in INDEXES.values())
+            print(f"🗂️  {count - len(failures)}/{count} indexes in place")
+        else:
+            problems = verify_query_plans(db)
+            for description, problem in problems:
+                print(f"❌ {description}: {problem}")
+            count = len(QUERY_SHAPES) + len(AGGREGATE_SHAPES)
+            print(f"🔎 {count - len(problems)}/{count} query shapes use an index")
+            failures = problems
+    finally:
+        client.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Streaming Food Entry Export
+
+Writes a patient's full history as NDJSON (one JSON object per line) or
+CSV, straight from a projected, batched cursor: rows are encoded one
+cursor batch at a time and handed to the response as they are produced, so
+memory stays at one batch whatever the history length.
+
+Rows go oldest first (entries added during an export show up at its end)
+and each carries a ``cursor`` (same format as entry_pages.py): passing the
+last received row's cursor back as ``?cursor=`` resumes an interrupted
+export right after that row. Optional ``start`` (inclusive) and ``end``
+(exclusive) bounds, ISO dates or datetimes, limit it to a time range.
+
+With ``compress=True`` the output is one gzip stream, flushed after each
+batch so the client can decode it as it arrives.
+"""
+
+import csv
+import io
+import json
+import logging
+import zlib
+from datetime import datetime
+from itertools import islice
+
+from daily_stats import entry_calories
+from entry_pages import decode_cursor, encode_cursor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Fields an export row is built from (recipe_ref only when recipes are included)
+EXPORT_PROJECTION = {
+    "timestamp": 1,
+    "condition": 1,
+    "recipe_name": 1,
+    "input_ingredients": 1,
+    "harmful": 1,
+    "safe": 1,
+    "nutrition.macros.calories": 1,
+    "nutrition.calories": 1,
+    "is_favorite": 1,
+    "category": 1,
+}
+
+CSV_FIELDS = ["cursor", "id", "timestamp", "condition", "recipe_name", "input_ingredients", "harmful", "safe",
+              "calories", "is_favorite", "category"]
+
+_OLDEST_FIRST = [("timestamp", 1), ("_id", 1)]
+
+
+def parse_bound(value, name):
+    """datetime of a start/end parameter (None if empty); ValueError if it is not ISO 8601"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError as e:
+        raise ValueError(f"Invalid {name}: {value!r} (expected an ISO date or datetime)") from e
+
+
+def export_query(patient_id, start=None, end=None, cursor=None):
+    """Filter for the rows of an export; ValueError if cursor is malformed"""
+    query = {"patient_id": patient_id}
+    if start or end:
+        query["timestamp"] = {}
+        if start:
+            query["timestamp"]["$gte"] = start
+        if end:
+            query["timestamp"]["$lt"] = end
+    if cursor:
+        timestamp, entry_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"timestamp": {"$gt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$gt": entry_id}},
+        ]
+    return query
+
+
+def export_row(entry, include_recipe=False):
+    """Export record of one food entry"""
+    timestamp = entry.get("timestamp")
+    nutrition = entry.get("nutrition")
+    row = {
+        "cursor": encode_cursor(entry) if timestamp else None,
+        "id": str(entry["_id"]),
+        "timestamp": timestamp.isoformat() if timestamp else None,
+        "condition": entry.get("condition") or "",
+        "recipe_name": entry.get("recipe_name") or "",
+        "input_ingredients": entry.get("input_ingredients") or [],
+        "harmful": entry.get("harmful") or [],
+        "safe": entry.get("safe") or [],
+        "calories": entry_calories(nutrition) if nutrition else None,
+        "is_favorite": bool(entry.get("is_favorite")),
+        "category": entry.get("category") or "General",
+    }
+    if include_recipe:
+        row["recipe"] = entry.get("recipe") or ""
+    return row
+
+
+def _ndjson(rows):
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+
+class _CSVEncoder:
+    """CSV text of row batches, header first; lists are joined with '; '"""
+
+    def __init__(self, fields):
+        self._buffer = io.StringIO()
+        self._writer = csv.DictWriter(self._buffer, fieldnames=fields, extrasaction="ignore")
+        self._writer.writeheader()
+
+    def __call__(self, rows):
+        for row in rows:
+            self._writer.writerow({key: "; ".join(value) if isinstance(value, list) else value
+                                   for key, value in row.items()})
+        text = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return text
+
+
+def iter_export(food_entries, patient_id, fmt, start=None, end=None, cursor=None, resolve_recipes=None,
+                batch_size=500, compress=False):
+    """
+    Encoded export of patient_id's entries, one chunk per cursor batch.
+
+    Args:
+        fmt: "ndjson" or "csv"
+        resolve_recipes: Optional callable filling in ``recipe`` for a list
+            of entries (one lookup per batch); the recipe text is only
+            exported when it is given
+        compress: Yield a gzip stream instead of plain text
+
+    Yields:
+        bytes
+    Raises:
+        ValueError: fmt is unknown or cursor is malformed (before anything is yielded)
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt!r}")
+    query = export_query(patient_id, start, end, cursor)
+    include_recipe = resolve_recipes is not None
+    projection = dict(EXPORT_PROJECTION, recipe_ref=1) if include_recipe else EXPORT_PROJECTION
+    if fmt == "csv":
+        encode = _CSVEncoder(CSV_FIELDS + (["recipe"] if include_recipe else []))
+    else:
+        encode = _ndjson
+    return _chunks(food_entries, query, projection, encode, resolve_recipes, batch_size, compress, fmt)
+
+
+def _chunks(food_entries, query, projection, encode, resolve_recipes, batch_size, compress, fmt):
+    # wbits 31: gzip container
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def output(text, final=False):
+        data = text.encode("utf-8")
+        if compressor is None:
+            return data
+        return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+    entries = food_entries.find(query, projection).sort(_OLDEST_FIRST).batch_size(batch_size)
+    last = None
+    text = encode([]) if fmt == "csv" else ""  # CSV header even for an empty export
+    try:
+        while True:
+            batch = list(islice(entries, batch_size))
+            if not batch:
+                break
+            if resolve_recipes is not None:
+                resolve_recipes(batch)
+            rows = [export_row(entry, resolve_recipes is not None) for entry in batch]
+            last = rows[-1]["cursor"]
+            yield output(text + encode(rows))
+            text = ""
+    except Exception as e:
+        # Headers are gone: NDJSON ends with an error line naming where to resume
+        logger.error(f"Export of {query.get('patient_id')} stopped after cursor {last}: {e}")
+        if fmt == "ndjson":
+            text += json.dumps({"error": "Export interrupted", "resume_cursor": last}) + "\n"
+    finally:
+        entries.close()
+    yield output(text, final=True)
@@ -0,0 +1,138 @@
+"""
+Keyset-Paginated Food Entry Listings
+
+Pages through a user's history and cookbook newest first, keyed on
+(timestamp, _id) instead of skip/offset: each page is an index range scan
+starting right after the last row of the previous page, so fetching page
+500 costs the same as page 1. Only the fields the listings render are
+returned; the full recipe text is fetched separately when it is opened.
+
+Cursors are opaque URL-safe strings; ``decode_cursor`` raises ValueError
+for anything it did not produce.
+"""
+
+import base64
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Fields the history table and cookbook cards render
+ENTRY_LIST_PROJECTION = {
+    "timestamp": 1,
+    "recipe_name": 1,
+    "input_ingredients": 1,
+    "harmful": 1,
+    "safe": 1,
+    "is_favorite": 1,
+    "category": 1,
+}
+
+_NEWEST_FIRST = [("timestamp", -1), ("_id", -1)]
+
+# Cookbook entries with the same normalized recipe name are one recipe (the app
+# keeps one of them favorited; migrations.py dedupe-favorites fixes older data);
+# entries written before name_key existed fall back to the trimmed name
+COOKBOOK_KEY = {"$ifNull": ["$name_key", {"$toLower": {"$trim": {"input": {"$ifNull": ["$recipe_name", ""]}}}}]}
+
+
+def encode_cursor(entry):
+    """Cursor pointing just past entry in newest-first order"""
+    raw = f"{entry['timestamp'].isoformat()}|{entry['_id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(timestamp, ObjectId) from a cursor; ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        timestamp, entry_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), ObjectId(entry_id)
+    except (ValueError, TypeError, InvalidId, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def page_size(value):
+    """Clamp a requested page size to 1..MAX_PAGE_SIZE"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _after(cursor):
+    """Filter for rows strictly older than the cursor position"""
+    if not cursor:
+        return {}
+    timestamp, entry_id = decode_cursor(cursor)
+    return {"$or": [
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$lt": entry_id}},
+    ]}
+
+
+def _page(rows, limit):
+    """(rows, next cursor or None) from limit + 1 fetched rows"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+
+def entries_page(food_entries, patient_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of a user's food entries, newest first.
+
+    Returns:
+        tuple: (entries, next cursor or None when this is the last page)
+    """
+    query = {"patient_id": patient_id, **_after(cursor)}
+    rows = list(food_entries.find(query, ENTRY_LIST_PROJECTION).sort(_NEWEST_FIRST).limit(limit + 1))
+    return _page(rows, limit)
+
+
+def cookbook_query(patient_id, cursor=None):
+    """Filter for a user's named favorites after the cursor position"""
+    return {"patient_id": patient_id, "is_favorite": True, "recipe_name": {"$regex": r"\S"}, **_after(cursor)}
+
+
+def cookbook_page(food_entries, patient_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of a user's favorites, newest first. Favorites are kept to one
+    entry per recipe name when they are set, so this is a plain range scan
+    like entries_page. Favorites without a recipe name are not listed.
+
+    Returns:
+        tuple: (entries, next cursor or None when this is the last page)
+    """
+    query = cookbook_query(patient_id, cursor)
+    rows = list(food_entries.find(query, ENTRY_LIST_PROJECTION).sort(_NEWEST_FIRST).limit(limit + 1))
+    return _page(rows, limit)
+
+
+def cookbook_categories(food_entries, patient_id):
+    """Categories used by a user's favorites; always includes 'General'"""
+    categories = sorted({c for c in food_entries.distinct(
+        "category", {"patient_id": patient_id, "is_favorite": True}) if c})
+    if "General" not in categories:
+        categories.insert(0, "General")
+    return categories
+
+
+def serialize_entry(entry):
+    """JSON-ready form of a listed entry"""
+    timestamp = entry.get("timestamp")
+    return {
+        "id": str(entry["_id"]),
+        "recipe_name": entry.get("recipe_name") or "",
+        "category": entry.get("category") or "General",
+        "timestamp": timestamp.isoformat() if timestamp else None,
+        "input_ingredients": entry.get("input_ingredients") or [],
+        "harmful": entry.get("harmful") or [],
+        "safe": entry.get("safe") or [],
+        "is_favorite": bool(entry.get("is_favorite")),
+    }
@@ -0,0 +1,244 @@
+"""
+N-gram Index for Fuzzy Name Matching
+
+A drop-in for ``difflib.get_close_matches`` over a large, fixed list of
+multi-word names (recipe names). Instead of running SequenceMatcher against
+every name it:
+
+- corrects each query word against the vocabulary with a character-trigram
+  index (the vocabulary is tiny compared to the names)
+- looks up names by word and by adjacent word pair (word bigrams); pairs are
+  highly selective even when single words appear in a large share of names
+- ranks names by how many query words/pairs they share when the posting
+  lists are short; otherwise intersects the word lists, rarest first, until
+  a small shortlist is left, skipping any word whose postings would empty
+  it (it is usually the misspelled one)
+- scores only that shortlist with SequenceMatcher
+
+Results use difflib's scores, cutoff and tie-breaking, so they match
+``get_close_matches`` whenever the true best matches make the shortlist.
+When the shortlist finds nothing, or the index knows fewer related names
+than it would shortlist (short prefixes, words too mangled to correct), every
+name is scored instead, as difflib does, so the index never comes back
+empty-handed where difflib would not.
+"""
+
+import heapq
+import logging
+import time
+from array import array
+from bisect import bisect_left
+from difflib import SequenceMatcher
+from itertools import product
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def trigrams(text):
+    """Character trigrams of text, padded so short words and word edges count"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def close_matches(word, candidates, n, cutoff):
+    """get_close_matches over an explicit candidate list (difflib scoring and ties)"""
+    best = []  # min-heap of the n best (score, candidate) so far
+    matcher = SequenceMatcher()
+    matcher.set_seq2(word)
+    for candidate in candidates:
+        # Once n matches are known, the cheap upper bounds can reject most of the rest
+        bar = max(cutoff, best[0][0]) if len(best) >= n else cutoff
+        matcher.set_seq1(candidate)
+        if (matcher.real_quick_ratio() >= bar and
+                matcher.quick_ratio() >= bar):
+            score = matcher.ratio()
+            if score >= bar:
+                if len(best) < n:
+                    heapq.heappush(best, (score, candidate))
+                else:
+                    heapq.heappushpop(best, (score, candidate))
+    return [candidate for _, candidate in sorted(best, reverse=True)]
+
+
+class WordTrigramIndex:
+    """Trigram index over a vocabulary of single words"""
+
+    def __init__(self, words):
+        self.words = words
+        self.postings = {}  # trigram -> array of word ids
+        for word_id, word in enumerate(words):
+            for gram in trigrams(word):
+                ids = self.postings.get(gram)
+                if ids is None:
+                    ids = self.postings[gram] = array('I')
+                ids.append(word_id)
+
+    def close_words(self, word, n=3, cutoff=0.6, max_candidates=32):
+        """Vocabulary words most similar to word, best first"""
+        counts = {}
+        get = counts.get
+        for gram in trigrams(word):
+            for word_id in self.postings.get(gram, ()):
+                counts[word_id] = get(word_id, 0) + 1
+        shortlist = heapq.nlargest(max_candidates, counts, key=counts.get)
+        return close_matches(word, [self.words[i] for i in shortlist], n, cutoff)
+
+
+class NGramIndex:
+    """Word-posting index over lowercase names with trigram word correction"""
+
+    def __init__(self, names, max_candidates=32, word_alternatives=3, scan_budget=4000):
+        """
+        Build the index.
+
+        Args:
+            names: Lowercase names; ids are positions in this list
+            max_candidates: Shortlisted names scored with SequenceMatcher
+            word_alternatives: Vocabulary corrections tried per unknown word
+            scan_budget: Queries whose posting lists hold fewer ids than this
+                rank every name sharing a word or pair
+        """
+        self.names = names
+        self.max_candidates = max_candidates
+        self.word_alternatives = word_alternatives
+        self.scan_budget = scan_budget
+        self.positions = {}   # name -> first id
+        word_postings = {}
+        pair_postings = {}
+
+        for name_id, name in enumerate(names):
+            if name in self.positions:
+                continue
+            self.positions[name] = name_id
+            words = name.split()
+            for word in set(words):
+                ids = word_postings.get(word)
+                if ids is None:
+                    ids = word_postings[word] = array('I')
+                ids.append(name_id)
+            for pair in set(zip(words, words[1:])):
+                ids = pair_postings.get(pair)
+                if ids is None:
+                    ids = pair_postings[pair] = array('I')
+                ids.append(name_id)
+
+        self.word_postings = word_postings  # word -> sorted array of name ids
+        self.pair_postings = pair_postings  # (word, next word) -> sorted array of name ids
+        self.vocabulary = WordTrigramIndex(sorted(word_postings))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, name):
+        return name in self.positions
+
+    def index_of(self, name):
+        """Id of an exact name, or None"""
+        return self.positions.get(name)
+
+    def _groups(self, query, cutoff):
+        """
+        Posting lists for a query, one group per query word or word pair.
+
+        Returns:
+            tuple: (pair groups, word groups); word groups list exact words
+            first, then corrected ones, each part rarest first
+        """
+        exact = []
+        corrected = []
+        choices = []  # per query word: the vocabulary words it may stand for
+        for word in query.split():
+            postings = self.word_postings.get(word)
+            if postings is not None:
+                choices.append([word])
+                exact.append([postings])
+                continue
+            alternatives = self.vocabulary.close_words(word, self.word_alternatives, cutoff)
+            choices.append(alternatives)
+            if alternatives:
+                corrected.append([self.word_postings[alt] for alt in alternatives])
+
+        pairs = []
+        for left, right in zip(choices, choices[1:]):
+            group = [self.pair_postings[pair] for pair in product(left, right) if pair in self.pair_postings]
+            if group:
+                pairs.append(group)
+
+        size = lambda group: sum(len(postings) for postings in group)
+        return sorted(pairs, key=size), sorted(exact, key=size) + sorted(corrected, key=size)
+
+    def _rank_by_hits(self, groups, query_len):
+        """Names sharing the most groups with the query, then closest in length"""
+        names = self.names
+        hits = {}
+        get = hits.get
+        for group in groups:
+            for name_id in (group[0] if len(group) == 1 else set().union(*group)):
+                hits[name_id] = get(name_id, 0) + 1
+        return heapq.nsmallest(
+            self.max_candidates, hits,
+            key=lambda i: (-hits[i], abs(len(names[i]) - query_len), i)
+        )
+
+    def shortlist(self, query, cutoff=0.6):
+        """Ids of names worth scoring for a query, best first"""
+        pair_groups, word_groups = self._groups(query, cutoff)
+        query_len = len(query)
+        size = sum(len(postings) for group in pair_groups + word_groups for postings in group)
+        if size <= self.scan_budget:
+            # Small enough to rank every name by how many query words/pairs it shares
+            return self._rank_by_hits(pair_groups + word_groups, query_len)
+        if pair_groups:
+            return self._rank_by_hits(pair_groups, query_len)
+
+        if not word_groups:
+            return []
+
+        candidates = set()
+        for postings in word_groups[0]:
+            candidates.update(postings)
+
+        for group in word_groups[1:]:
+            if len(candidates) <= self.max_candidates:
+                break
+            narrowed = set()
+            for postings in group:
+                if len(postings) <= 8 * len(candidates):
+                    narrowed.update(candidates.intersection(postings))
+                else:
+                    # Long posting list: probe it for each candidate instead
+                    narrowed.update(c for c in candidates if _contains(postings, c))
+            if narrowed:
+                candidates = narrowed
+
+        # ratio = 2*M / (len(a) + len(b)) peaks when the lengths are close
+        names = self.names
+        return heapq.nsmallest(
+            self.max_candidates, candidates, key=lambda i: (abs(len(names[i]) - query_len), i)
+        )
+
+    def get_close_matches(self, word, n=3, cutoff=0.6):
+        """Same contract as difflib.get_close_matches, over the indexed names"""
+        shortlist = self.shortlist(word, cutoff)
+        matches = close_matches(word, [self.names[i] for i in shortlist], n, cutoff)
+        if (not matches or len(shortlist) < self.max_candidates) and len(shortlist) < len(self.names):
+            # The index has too little to go on: score every name
+            matches = close_matches(word, self.names, n, cutoff)
+        return matches
+
+
+def _contains(sorted_ids, value):
+    i = bisect_left(sorted_ids, value)
+    return i < len(sorted_ids) and sorted_ids[i] == value
+
+
+def build_ngram_index(names, **kwargs):
+    """Build an NGramIndex, logging its size and build cost"""
+    start = time.perf_counter()
+    index = NGramIndex(names, **kwargs)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logger.info(f"Built name index: {len(index)} names, {len(index.vocabulary.words)} words "
+                f"in {elapsed_ms:.1f}ms")
+    return index
@@ -1,5 +1,4 @@
 from google import genai
-from config import Config
 import logging
 import os
 from dotenv import load_dotenv
@@ -10,9 +9,56 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def split_recipe_sections(text):
+    """
+    Split markdown recipe text into complete sections and a trailing remainder.
+
+    A section starts at a bold header line (``**Ingredients**``) and is only
+    complete once the next header has started, so the last section is always
+    returned as the remainder.
+
+    Returns:
+        tuple: (list of complete section strings, remainder string)
+    """
+    sections = []
+    current = []
+    lines = text.split('\n')
+    # The last line may still be growing; never treat it as a header yet
+    for line in lines[:-1]:
+        stripped = line.strip()
+        if stripped.startswith('**') and stripped.endswith('**') and len(stripped) > 4 and current:
+            section = '\n'.join(current).strip()
+            if section:
+                sections.append(section)
+            current = []
+        current.append(line)
+    current.append(lines[-1])
+    return sections, '\n'.join(current)
+
+
+class RecipeStreamInterrupted(Exception):
+    """The Gemini stream failed after part of the recipe was yielded"""
+
+
+def iter_recipe_sections(text):
+    """Yield every section of a complete recipe text, including the last one"""
+    sections, remainder = split_recipe_sections(text)
+    yield from sections
+    if remainder.strip():
+        yield remainder.strip()
+
+
 class GeminiService:
-    def __init__(self):
-        """Initialize Gemini API service"""
+    def __init__(self, client=None):
+        """Initialize Gemini API service
+
+        Args:
+            client: Optional pre-built client (anything exposing
+                ``models.generate_content`` / ``models.generate_content_stream``)
+        """
+        if client is not None:
+            self.client = client
+            return
         try:
             GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
             self.client = genai.Client(api_key=GEMINI_API_KEY)
@@ -38,49 +84,8 @@ class GeminiService:
             return self._fallback_recipe_generation(modified_ingredients)
         
         try:
-            # Create the prompt for Gemini
-            prompt = f"""
-            You are a professional nutritionist and chef specializing in creating healthy recipes for people with medical conditions.
-
-            Patient Information:
-            - Medical Condition: {condition.replace('_', ' ').title()}
-            - Recipe Name: {recipe_name if recipe_name else 'Custom Recipe with given ingredients'}
-            - Original Ingredients: {', '.join(original_ingredients)}
-            - Safe Ingredients: {', '.join(modified_ingredients)}
-            - Harmful Ingredients: {', '.join(harmful_ingredients)}
-
-            Please create a detailed, step-by-step recipe using the safe ingredients. The recipe should:
-
-            1. Be easy to follow for home cooking
-            2. Include specific cooking times and temperatures
-            3. Provide clear instructions for each step
-            4. Include helpful tips for the specific medical condition
-            5. Be written in a friendly, encouraging tone
-            6. Include serving suggestions and nutritional notes
-
-            Format the recipe with clear sections using markdown:
-
-            **Health Benefits**
-            Brief introduction explaining why this recipe is good for {condition.replace('_', ' ').title()}
-
-            **Ingredients**
-            - List each ingredient with quantities
-
-            **Instructions**
-            1. Step-by-step cooking instructions
-            2. Include cooking times and temperatures
-            3. Clear, easy-to-follow format
-
-            **Cooking Tips**
-            - Helpful tips for the specific medical condition
-            - Cooking suggestions and variations
-
-            **Serving Suggestions**
-            - How to serve and enjoy the dish
-            - Nutritional notes relevant to the condition
-
-            Keep the response concise but informative (around 200-300 words). Use proper markdown formatting with headers, lists, and clear structure.
-            """
+            prompt = self._build_recipe_prompt(original_ingredients, modified_ingredients, condition,
+                                               harmful_ingredients, recipe_name)
             
             # Generate response
             response = self.client.models.generate_content(
@@ -97,6 +102,105 @@ class GeminiService:
             logger.error(f"Error generating recipe with Gemini: {e}")
             return self._fallback_recipe_generation(modified_ingredients)
     
+    def _build_recipe_prompt(self, original_ingredients, modified_ingredients, condition, harmful_ingredients=None, recipe_name=None):
+        """Create the recipe generation prompt shared by the blocking and streaming calls"""
+        harmful_ingredients = harmful_ingredients or []
+        prompt = f"""
+        You are a professional nutritionist and chef specializing in creating healthy recipes for people with medical conditions.
+
+        Patient Information:
+        - Medical Condition: {condition.replace('_', ' ').title()}
+        - Recipe Name: {recipe_name if recipe_name else 'Custom Recipe with given ingredients'}
+        - Original Ingredients: {', '.join(original_ingredients)}
+        - Safe Ingredients: {', '.join(modified_ingredients)}
+        - Harmful Ingredients: {', '.join(harmful_ingredients)}
+
+        Please create a detailed, step-by-step recipe using the safe ingredients. The recipe should:
+
+        1. Be easy to follow for home cooking
+        2. Include specific cooking times and temperatures
+        3. Provide clear instructions for each step
+        4. Include helpful tips for the specific medical condition
+        5. Be written in a friendly, encouraging tone
+        6. Include serving suggestions and nutritional notes
+
+        Format the recipe with clear sections using markdown:
+
+        **Health Benefits**
+        Brief introduction explaining why this recipe is good for {condition.replace('_', ' ').title()}
+
+        **Ingredients**
+        - List each ingredient with quantities
+
+        **Instructions**
+        1. Step-by-step cooking instructions
+        2. Include cooking times and temperatures
+        3. Clear, easy-to-follow format
+
+        **Cooking Tips**
+        - Helpful tips for the specific medical condition
+        - Cooking suggestions and variations
+
+        **Serving Suggestions**
+        - How to serve and enjoy the dish
+        - Nutritional notes relevant to the condition
+
+        Keep the response concise but informative (around 200-300 words). Use proper markdown formatting with headers, lists, and clear structure.
+        """
+        return prompt
+    
+    def stream_recipe_instructions(self, original_ingredients, modified_ingredients, condition, harmful_ingredients=None, recipe_name=None):
+        """
+        Generate recipe instructions, yielding markdown sections as they arrive
+        
+        Args:
+            Same as generate_recipe_instructions
+        
+        Yields:
+            str: Complete recipe sections (a bold header and its content)
+        Raises:
+            RecipeStreamInterrupted: The stream failed after some sections
+                were yielded (the last one may be cut off); a failure before
+                the first section yields the fallback recipe instead
+        """
+        if not self.client:
+            yield from self._fallback_recipe_sections(modified_ingredients)
+            return
+        
+        yielded = False
+        buffer = ''
+        try:
+            prompt = self._build_recipe_prompt(original_ingredients, modified_ingredients, condition,
+                                               harmful_ingredients, recipe_name)
+            stream = self.client.models.generate_content_stream(
+                model="gemini-2.5-flash", contents=prompt
+            )
+            for chunk in stream:
+                text = getattr(chunk, 'text', None)
+                if not text:
+                    continue
+                buffer += text
+                sections, buffer = split_recipe_sections(buffer)
+                for section in sections:
+                    yielded = True
+                    yield section
+        except Exception as e:
+            logger.error(f"Error streaming recipe with Gemini: {e}")
+            if yielded:
+                if buffer.strip():
+                    yield buffer.strip()
+                raise RecipeStreamInterrupted(str(e)) from e
+        
+        if buffer.strip():
+            yielded = True
+            yield buffer.strip()
+        if not yielded:
+            yield from self._fallback_recipe_sections(modified_ingredients)
+    
+    def _fallback_recipe_sections(self, modified_ingredients):
+        """Fallback recipe split into the same sections the stream yields"""
+        yield from iter_recipe_sections(self._fallback_recipe_generation(modified_ingredients))
+    
     def _create_recipe_prompt(self, original_ingredients, modified_ingredients, condition, harmful_ingredients):
         """Create a detailed prompt for recipe generation"""
         
@@ -0,0 +1,40 @@
+"""
+Gunicorn Configuration
+
+    gunicorn app:app
+
+The app is imported once in the master (preload_app) and forked into the
+workers. MongoDB clients are not fork-safe, so the master never connects:
+each worker creates its own client, prefills the pool and loads its caches
+in post_fork, before it accepts requests. With SEED_ON_STARTUP the sample
+data is seeded once, from the master in on_starting, by
+``python migrations.py seed-database`` in a child process (so the master
+still never connects); workers never seed. Set SEED_ON_STARTUP=false when
+that runs as a deploy step instead.
+"""
+
+import os
+import subprocess
+import sys
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:' + os.environ.get('PORT', '5000'))
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+
+
+def on_starting(server):
+    """Seed once per server start, before any worker exists"""
+    from config import Config
+    if not Config.SEED_ON_STARTUP:
+        return
+    migrations = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations.py')
+    result = subprocess.run([sys.executable, migrations, 'seed-database'], check=False)
+    if result.returncode != 0:
+        server.log.warning("Seeding failed; run `python migrations.py seed-database` by hand")
+
+
+def post_fork(server, worker):
+    """Connect, prefill the pool and prime the caches in the new worker"""
+    import app
+    app.warm_up(seed=False)
@@ -0,0 +1,124 @@
+"""
+Compiled Ingredient Rule Index
+
+Turns the raw ``ingredient_rules`` documents into a lookup structure that is
+built once per rules version and shared by every request:
+
+- ingredient names are interned to integer ids
+- each condition maps to a frozenset of the ids that are harmful for it
+- plural/alias spellings are precomputed so a lookup is a single dict hit
+"""
+
+import logging
+import time
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Endings that take "es" rather than "s" in the plural (tomato -> tomatoes)
+_ES_PLURAL_ENDINGS = ('o', 's', 'x', 'z', 'ch', 'sh')
+
+
+class IngredientRuleIndex:
+    """Immutable, precompiled view over a set of ingredient rules"""
+
+    def __init__(self, rules, version=None):
+        """
+        Build the index.
+
+        Args:
+            rules: Mapping of lowercase ingredient name -> rule document
+            version: Opaque marker of the rules snapshot this index was built from
+        """
+        self.version = version
+        self.names = []          # id -> canonical ingredient name
+        self.alternatives = []   # id -> suggested alternative (or None)
+        self.lookup = {}         # any accepted spelling -> id
+        harmful_ids = {}
+
+        for name, rule in rules.items():
+            ingredient_id = len(self.names)
+            self.names.append(name)
+            self.alternatives.append(rule.get("alternative"))
+            for condition in rule.get("harmful_for", []) or []:
+                harmful_ids.setdefault(condition, []).append(ingredient_id)
+
+        self.harmful_by_condition = {
+            condition: frozenset(ids) for condition, ids in harmful_ids.items()
+        }
+        self._build_lookup()
+
+    def _build_lookup(self):
+        """Precompute every spelling that should resolve to a rule.
+
+        Precedence matches the previous per-request normalizer: a trailing
+        "s" that turns the input into a known ingredient always wins, then
+        the exact name, then the less common "es" plural.
+        """
+        lookup = self.lookup
+        for ingredient_id, name in enumerate(self.names):
+            if name.endswith(_ES_PLURAL_ENDINGS):
+                lookup[name + "es"] = ingredient_id
+        for ingredient_id, name in enumerate(self.names):
+            lookup[name] = ingredient_id
+        for ingredient_id, name in enumerate(self.names):
+            lookup[name + "s"] = ingredient_id
+
+    @property
+    def conditions(self):
+        """All conditions that at least one rule is harmful for"""
+        return set(self.harmful_by_condition)
+
+    def __len__(self):
+        return len(self.names)
+
+    def resolve(self, ingredient):
+        """Return the id of the rule matching an ingredient, or None"""
+        return self.lookup.get(ingredient.strip().lower())
+
+    def classify(self, ingredients, condition):
+        """
+        Split ingredients into harmful and safe lists for a condition.
+
+        Args:
+            ingredients: Raw ingredient strings as entered by the user
+            condition: Medical condition to check against
+
+        Returns:
+            tuple: (harmful, safe, replacements) keyed by the original strings
+        """
+        harmful_ingredients = []
+        safe_ingredients = []
+        replacements = {}
+
+        harmful_ids = self.harmful_by_condition.get(condition, frozenset())
+        lookup = self.lookup
+        seen = set()
+
+        for original in ingredients:
+            if not original or original in seen:
+                continue
+            normalized = original.strip().lower()
+            if not normalized:
+                continue
+            seen.add(original)
+
+            ingredient_id = lookup.get(normalized)
+            if ingredient_id is not None and ingredient_id in harmful_ids:
+                harmful_ingredients.append(original)
+                replacements[original] = self.alternatives[ingredient_id]
+            else:
+                safe_ingredients.append(original)
+
+        return harmful_ingredients, safe_ingredients, replacements
+
+
+def build_rule_index(rules, version=None):
+    """Compile rules into an IngredientRuleIndex, logging the build cost"""
+    start = time.perf_counter()
+    index = IngredientRuleIndex(rules, version=version)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logger.info(f"Compiled ingredient rule index: {len(index)} rules, "
+                f"{len(index.harmful_by_condition)} conditions in {elapsed_ms:.1f}ms")
+    return index
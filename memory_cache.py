@@ -0,0 +1,145 @@
+"""
+In-Process LRU Cache
+
+A small, thread-safe, memory-bounded cache shared by the services that need
+an L1 in front of a slower store (MongoDB, USDA API, difflib scoring):
+
+- LRU eviction bounded by entry count and, optionally, by approximate bytes
+- optional per-cache and per-entry TTL
+- str/bytes values above ``compress_threshold`` are stored zlib-compressed
+- hit/miss/eviction/expiration counters via ``stats()``
+"""
+
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class _Compressed:
+    """Marker for a zlib-compressed str/bytes value"""
+    __slots__ = ('data', 'is_text')
+
+    def __init__(self, value):
+        self.is_text = isinstance(value, str)
+        raw = value.encode('utf-8') if self.is_text else value
+        self.data = zlib.compress(raw, 6)
+
+    def restore(self):
+        raw = zlib.decompress(self.data)
+        return raw.decode('utf-8') if self.is_text else raw
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional TTL, byte budget and compression"""
+
+    def __init__(self, max_entries=1024, max_bytes=None, ttl=None, compress_threshold=None, name='cache'):
+        """
+        Args:
+            max_entries: Maximum number of entries kept
+            max_bytes: Optional approximate memory budget for stored values
+            ttl: Default time-to-live in seconds (None = never expires)
+            compress_threshold: Compress str/bytes values at least this long
+            name: Label reported in stats()
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.compress_threshold = compress_threshold
+        self._data = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Return the cached value (marking it recently used) or default"""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at, size = item
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key, size)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+        return value.restore() if isinstance(value, _Compressed) else value
+
+    def set(self, key, value, ttl=_MISSING):
+        """Store a value; ttl overrides the cache default (None = no expiry)"""
+        ttl = self.ttl if ttl is _MISSING else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+
+        stored = value
+        if (self.compress_threshold is not None and isinstance(value, (str, bytes))
+                and len(value) >= self.compress_threshold):
+            stored = _Compressed(value)
+        size = self._sizeof(stored)
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (stored, expires_at, size)
+            self._bytes += size
+            self._evict()
+
+    def delete(self, key):
+        """Remove a key if present"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                self._remove(key, item[2])
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    def _remove(self, key, size):
+        del self._data[key]
+        self._bytes -= size
+
+    def _evict(self):
+        while self._data and (len(self._data) > self.max_entries or
+                              (self.max_bytes is not None and self._bytes > self.max_bytes)):
+            _, (_, _, size) = self._data.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    @staticmethod
+    def _sizeof(value):
+        if isinstance(value, _Compressed):
+            return len(value.data)
+        if isinstance(value, (str, bytes)):
+            return len(value)
+        return sys.getsizeof(value)
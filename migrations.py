@@ -0,0 +1,189 @@
+"""
+Data Migrations
+
+One-off, idempotent data migrations. Run with:
+
+    python migrations.py backfill-name-keys [--batch-size 1000] [--dry-run]
+    python migrations.py rebuild-daily-stats [--batch-size 1000] [--dry-run]
+    python migrations.py rebuild-name-popularity [--batch-size 1000] [--dry-run]
+    python migrations.py seed-database
+    python migrations.py dedupe-recipes [--batch-size 1000] [--dry-run]
+    python migrations.py dedupe-favorites [--batch-size 1000] [--dry-run]
+
+Each migration only touches documents that still need it, so it can be
+re-run safely (e.g. after an interrupted run). With STORAGE_BACKEND=sqlite
+they run against the SQLite store instead of MongoDB.
+"""
+
+import argparse
+import sys
+
+from pymongo import MongoClient, UpdateMany, UpdateOne
+
+import daily_stats
+import name_popularity
+from config import Config
+from entry_pages import COOKBOOK_KEY
+from name_keys import name_fields
+from recipe_blobs import RecipeBlobStore, recipe_ref
+from sqlite_store import SQLiteDatabase
+
+
+def _backfill(collection, source_field, batch_size, dry_run, unique=False):
+    """Set name_key/name_tokens from source_field where they are missing"""
+    query = {"name_key": {"$exists": False}, source_field: {"$type": "string"}}
+    seen = set()
+    if unique:
+        # Keys already taken by documents that were migrated earlier
+        seen.update(doc["name_key"] for doc in collection.find(
+            {"name_key": {"$type": "string"}}, {"name_key": 1}))
+
+    updated = duplicates = 0
+    batch = []
+    for doc in collection.find(query, {source_field: 1}).batch_size(batch_size):
+        fields = name_fields(doc[source_field])
+        if unique:
+            if not fields["name_key"]:
+                continue
+            if fields["name_key"] in seen:
+                # Left without a key so the unique index can be built; resolve by hand
+                duplicates += 1
+                print(f"   ⚠️  duplicate name {doc[source_field]!r} ({doc['_id']}) left unkeyed")
+                continue
+            seen.add(fields["name_key"])
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        if len(batch) >= batch_size:
+            updated += _flush(collection, batch, dry_run)
+            batch = []
+    if batch:
+        updated += _flush(collection, batch, dry_run)
+    return updated, duplicates
+
+
+def _flush(collection, batch, dry_run):
+    if dry_run:
+        return len(batch)
+    result = collection.bulk_write(batch, ordered=False)
+    return result.modified_count
+
+
+def backfill_name_keys(db, batch_size=1000, dry_run=False):
+    """Add name_key/name_tokens to recipes (by name) and food_entries (by recipe_name)"""
+    print("🔑 Backfilling normalized recipe-name keys...")
+    updated, duplicates = _backfill(db['recipes'], 'name', batch_size, dry_run, unique=True)
+    print(f"   - recipes: {updated} updated, {duplicates} duplicates skipped")
+    updated, _ = _backfill(db['food_entries'], 'recipe_name', batch_size, dry_run)
+    print(f"   - food_entries: {updated} updated")
+
+
+def rebuild_daily_stats(db, batch_size=1000, dry_run=False):
+    """Recompute the user_daily_stats rollups from all food entries"""
+    print("📊 Rebuilding per-day statistics rollups...")
+    written = daily_stats.rebuild(db['food_entries'], db['user_daily_stats'],
+                                  batch_size=batch_size, dry_run=dry_run)
+    print(f"   - user_daily_stats: {written} rollups written")
+
+
+def rebuild_name_popularity(db, batch_size=1000, dry_run=False):
+    """Recompute the autocomplete name_popularity counters from all food entries"""
+    print("🔤 Rebuilding ingredient and recipe name popularity counters...")
+    written = name_popularity.rebuild(db['food_entries'], db['name_popularity'],
+                                      batch_size=batch_size, dry_run=dry_run)
+    print(f"   - name_popularity: {written} counters written")
+
+
+def seed_database(db, batch_size=1000, dry_run=False):
+    """Insert the app's sample data and core ingredients where missing"""
+    print("🌱 Seeding sample data and core ingredients...")
+    if dry_run:
+        print("   - skipped (dry run)")
+        return
+    import app  # Seeds through the app's own connection (Config.DATABASE_NAME)
+    app.seed_database()
+
+
+def dedupe_recipes(db, batch_size=1000, dry_run=False):
+    """Move inline recipe texts of food entries into recipe_blobs, leaving a recipe_ref"""
+    print("📦 Moving recipe texts into content-addressed blobs...")
+    blobs = RecipeBlobStore(lambda: db['recipe_blobs'], codec=Config.RECIPE_BLOB_CODEC,
+                            compress_threshold=Config.RECIPE_BLOB_COMPRESS_THRESHOLD)
+    entries = db['food_entries']
+    updated, refs = 0, set()
+    batch = []
+    for doc in entries.find({"recipe": {"$exists": True}}, {"recipe": 1}).batch_size(batch_size):
+        update = {"$unset": {"recipe": ""}}
+        if doc.get("recipe"):
+            ref = recipe_ref(doc["recipe"]) if dry_run else blobs.store(doc["recipe"])
+            refs.add(ref)
+            update["$set"] = {"recipe_ref": ref}
+        batch.append(UpdateOne({"_id": doc["_id"]}, update))
+        if len(batch) >= batch_size:
+            updated += _flush(entries, batch, dry_run)
+            batch = []
+    if batch:
+        updated += _flush(entries, batch, dry_run)
+    print(f"   - food_entries: {updated} updated, {len(refs)} distinct recipes")
+
+
+def dedupe_favorites(db, batch_size=1000, dry_run=False):
+    """Keep only the newest favorite of each recipe name per user, as the app now does on write"""
+    print("⭐ Removing duplicate favorites of the same recipe...")
+    entries = db['food_entries']
+    pipeline = [
+        {"$match": {"is_favorite": True}},
+        {"$sort": {"timestamp": -1, "_id": -1}},
+        {"$group": {"_id": {"patient_id": "$patient_id", "key": COOKBOOK_KEY}, "ids": {"$push": "$_id"}}},
+        {"$match": {"_id.key": {"$ne": ""}, "ids.1": {"$exists": True}}},
+    ]
+    stale, recipes = 0, 0
+    batch = []
+    for group in entries.aggregate(pipeline, allowDiskUse=True):
+        recipes += 1
+        stale += len(group["ids"]) - 1
+        batch.append(UpdateMany({"_id": {"$in": group["ids"][1:]}}, {"$set": {"is_favorite": False}}))
+        if len(batch) >= batch_size:
+            _flush(entries, batch, dry_run)
+            batch = []
+    if batch:
+        _flush(entries, batch, dry_run)
+    print(f"   - food_entries: {stale} un-favorited across {recipes} recipes")
+    if stale and not dry_run:
+        print("   - run rebuild-daily-stats to update the favorites counters")
+
+
+MIGRATIONS = {
+    'backfill-name-keys': backfill_name_keys,
+    'rebuild-daily-stats': rebuild_daily_stats,
+    'rebuild-name-popularity': rebuild_name_popularity,
+    'seed-database': seed_database,
+    'dedupe-recipes': dedupe_recipes,
+    'dedupe-favorites': dedupe_favorites,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a data migration")
+    parser.add_argument('migration', choices=sorted(MIGRATIONS))
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--dry-run', action='store_true', help='count changes without writing')
+    args = parser.parse_args(argv)
+
+    if Config.STORAGE_BACKEND == 'sqlite':
+        client = SQLiteDatabase(Config.SQLITE_PATH, name=Config.DATABASE_NAME)
+        db = client
+    else:
+        client = MongoClient(Config.MONGODB_URI)
+        db = client[Config.DATABASE_NAME]
+    try:
+        MIGRATIONS[args.migration](db, batch_size=args.batch_size, dry_run=args.dry_run)
+    except Exception as e:
+        print(f"❌ Migration {args.migration} failed: {e}")
+        return 1
+    finally:
+        client.close()
+    print("🎉 Migration completed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Normalized Recipe-Name Keys
+
+Recipe names are matched through fields derived once, on write, instead of
+case-insensitive ``$regex`` scans at read time:
+
+- ``name_key``    - the name casefolded with whitespace collapsed; exact,
+                    case-insensitive lookups are a single index seek
+- ``name_tokens`` - the distinct words of the name; partial lookups match
+                    whole words plus a prefix of the last word (multikey index)
+
+User input never reaches MongoDB as a pattern except as an escaped,
+anchored prefix, which the index can serve.
+"""
+
+import re
+import unicodedata
+
+from pymongo.collation import Collation
+
+# Collation of the name_key indexes; queries must pass the same one to use them
+NAME_KEY_COLLATION = Collation(locale='en', strength=2)
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def normalize_name(name):
+    """Canonical form of a name: NFKC, casefolded, single-spaced, trimmed"""
+    if not name:
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", name).casefold().split())
+
+
+def name_tokens(name):
+    """Distinct words of a normalized name, in order"""
+    return list(dict.fromkeys(_TOKEN_RE.findall(normalize_name(name))))
+
+
+def name_fields(name):
+    """Fields to store alongside a name so it can be looked up by index"""
+    return {"name_key": normalize_name(name), "name_tokens": name_tokens(name)}
+
+
+def exact_name_query(name):
+    """Filter matching a name exactly, ignoring case and spacing"""
+    return {"name_key": normalize_name(name)}
+
+
+def partial_name_query(text):
+    """
+    Filter matching names that contain every word of text, treating the last
+    word as a prefix (so "pan" finds "pancakes" while the user is typing).
+
+    Returns None when text has no words.
+    """
+    tokens = name_tokens(text)
+    if not tokens:
+        return None
+    clauses = [{"name_tokens": token} for token in tokens[:-1]]
+    clauses.append({"name_tokens": {"$regex": "^" + re.escape(tokens[-1])}})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
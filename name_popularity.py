@@ -0,0 +1,146 @@
+"""
+Ingredient and Recipe Name Popularity Counters
+
+The ``name_popularity`` collection holds one counter per (kind, lowercased
+name), incremented with ``$inc`` as food entries are written, so the
+autocomplete ranking reads the most-used names from an index instead of
+grouping every food entry:
+
+    {_id: "<kind>|<name>", kind, name, count, updated_at}
+
+``kind`` is "ingredient" (each of an entry's input_ingredients) or
+"recipe" (its recipe_name).
+
+Like daily_stats.py, updates are best-effort and ``rebuild`` recomputes
+everything from ``food_entries`` (``python migrations.py
+rebuild-name-popularity``); until it has run once, ``top_names`` returns
+None and callers fall back to aggregating the entries.
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime
+
+from pymongo import ReplaceOne, UpdateOne
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# _id of the document recording that a full rebuild has completed
+READY_ID = "__rebuilt__"
+
+# kind -> (food entry field, is it a list)
+KINDS = {
+    "ingredient": ("input_ingredients", True),
+    "recipe": ("recipe_name", False),
+}
+
+# Collections (by full name) already seen as rebuilt; the marker is never removed
+_ready_collections = set()
+
+
+def _names(entry, field, is_list):
+    values = entry.get(field)
+    if not is_list:
+        values = [values]
+    if not isinstance(values, list):
+        return []
+    return [value.strip().lower() for value in values if isinstance(value, str) and value.strip()]
+
+
+def record_entry(counters, entry):
+    """Count the names used by a newly inserted food entry, in one bulk write"""
+    now = datetime.now()
+    requests = [
+        UpdateOne(
+            {"_id": f"{kind}|{name}"},
+            {"$inc": {"count": uses}, "$set": {"kind": kind, "name": name, "updated_at": now}},
+            upsert=True
+        )
+        for kind, (field, is_list) in KINDS.items()
+        for name, uses in Counter(_names(entry, field, is_list)).items()
+    ]
+    if not requests:
+        return
+    try:
+        counters.bulk_write(requests, ordered=False)
+    except Exception as e:
+        logger.warning(f"Name popularity update failed for {entry.get('patient_id')}: {e}")
+
+
+def is_ready(counters):
+    """True once a full rebuild has populated the counters"""
+    name = getattr(counters, "full_name", None)
+    if name in _ready_collections:
+        return True
+    try:
+        ready = counters.find_one({"_id": READY_ID}) is not None
+    except Exception:
+        return False
+    if ready and name:
+        _ready_collections.add(name)
+    return ready
+
+
+def top_names(counters, kind, limit):
+    """
+    The limit most-used names of one kind.
+
+    Returns:
+        dict: lowercased name -> count; or None when the counters are not ready
+    """
+    if not is_ready(counters):
+        return None
+    cursor = counters.find({"kind": kind}, {"name": 1, "count": 1}).sort("count", -1).limit(limit)
+    return {doc["name"]: doc["count"] for doc in cursor if doc.get("name")}
+
+
+def rebuild(food_entries, counters, batch_size=1000, dry_run=False):
+    """
+    Recompute every counter from food_entries.
+
+    Counters of names no longer used are removed. Entries written while the
+    rebuild runs may be counted twice; re-run it when quiet.
+
+    Returns:
+        int: Number of counter documents written
+    """
+    started = datetime.now()
+    written = 0
+    batch = []
+    for kind, (field, is_list) in KINDS.items():
+        pipeline = [{"$match": {field: {"$exists": True, "$ne": None}}}]
+        if is_list:
+            pipeline.append({"$unwind": f"${field}"})
+        pipeline.append({"$group": {"_id": {"$toLower": {"$trim": {"input": f"${field}"}}},
+                                    "count": {"$sum": 1}}})
+        for row in food_entries.aggregate(pipeline, allowDiskUse=True):
+            name = row.get("_id")
+            if not name:
+                continue
+            doc_id = f"{kind}|{name}"
+            batch.append(ReplaceOne(
+                {"_id": doc_id},
+                {"_id": doc_id, "kind": kind, "name": name, "count": row["count"], "updated_at": datetime.now()},
+                upsert=True
+            ))
+            if len(batch) >= batch_size:
+                written += _flush(counters, batch, dry_run)
+                batch = []
+    written += _flush(counters, batch, dry_run)
+
+    if not dry_run:
+        counters.delete_many({"_id": {"$ne": READY_ID}, "updated_at": {"$lt": started}})
+        counters.replace_one({"_id": READY_ID}, {"_id": READY_ID, "rebuilt_at": datetime.now()},
+                             upsert=True)
+    return written
+
+
+def _flush(counters, batch, dry_run):
+    if not batch:
+        return 0
+    if dry_run:
+        return len(batch)
+    counters.bulk_write(batch, ordered=False)
+    return len(batch)
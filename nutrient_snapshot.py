@@ -0,0 +1,306 @@
+"""
+Offline Nutrient Snapshot
+
+A read-only, columnar copy of USDA FoodData Central so nutrition lookups do
+not need the live API:
+
+- ``nutrients.npy`` - float32 matrix, one row per food, one column per nutrient
+- ``foods.json``    - column order, food descriptions/FDC ids and a name index
+  (lowercase spelling -> row)
+
+The matrix is memory-mapped, so every worker shares the same pages and
+loading is instant. Build a snapshot from a bulk download
+(https://fdc.nal.usda.gov/download-datasets) with:
+
+    python nutrient_snapshot.py import FoodData_Central_csv_2024-04-18/ --out data/nutrients
+    python nutrient_snapshot.py import FoodData_Central_foundation_food_json.json --out data/nutrients
+
+NumPy is optional; without it snapshots are simply unavailable.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MATRIX_FILE = 'nutrients.npy'
+META_FILE = 'foods.json'
+FORMAT_VERSION = 1
+
+# Data types worth answering ingredient questions with, best first
+# (bulk CSV spelling, JSON spelling)
+_DATA_TYPE_RANK = {
+    'foundation_food': 0, 'Foundation': 0,
+    'sr_legacy_food': 1, 'SR Legacy': 1,
+    'survey_fndds_food': 2, 'Survey (FNDDS)': 2,
+}
+
+
+class NutrientSnapshot:
+    """Memory-mapped nutrient matrix with a precomputed name index"""
+
+    def __init__(self, matrix, columns, foods, index):
+        self.matrix = matrix      # rows: foods, columns: nutrient keys
+        self.columns = columns    # nutrient key per column
+        self.foods = foods        # row -> [fdc_id, description]
+        self.index = index        # lowercase spelling -> row
+
+    def __len__(self):
+        return len(self.foods)
+
+    def lookup(self, ingredient):
+        """Return the row for an ingredient name (plural/singular tolerant), or None"""
+        name = ingredient.strip().lower()
+        row = self.index.get(name)
+        if row is None:
+            row = self.index.get(name + 's')
+        if row is None and name.endswith('es'):
+            row = self.index.get(name[:-2])
+        if row is None and name.endswith('s'):
+            row = self.index.get(name[:-1])
+        return row
+
+    def nutrition(self, row, ingredient):
+        """Per-ingredient nutrition dict for one row (same shape as the API path)"""
+        values = self.matrix[row].tolist()
+        nutrition = {key: round(value, 2) for key, value in zip(self.columns, values)}
+        nutrition['ingredient'] = ingredient
+        nutrition['found'] = True
+        nutrition['description'] = self.foods[row][1]
+        return nutrition
+
+    def totals(self, rows, extra=()):
+        """
+        Sum nutrients over snapshot rows in one vectorized pass.
+
+        Args:
+            rows: Snapshot rows to add up
+            extra: Nutrition dicts from other sources (estimates, API) to include
+
+        Returns:
+            dict: nutrient key -> total
+        """
+        total = np.zeros(len(self.columns), dtype=np.float64)
+        if rows:
+            total += self.matrix[np.asarray(rows, dtype=np.intp)].sum(axis=0, dtype=np.float64)
+        if extra:
+            total += np.array([[d.get(key, 0) or 0 for key in self.columns] for d in extra],
+                              dtype=np.float64).sum(axis=0)
+        return {key: round(value, 2) for key, value in zip(self.columns, total.tolist())}
+
+
+def load_snapshot(directory, columns=None):
+    """
+    Memory-map a snapshot directory.
+
+    Args:
+        directory: Directory written by ``write_snapshot``
+        columns: Expected nutrient keys; a snapshot with other columns is rejected
+
+    Returns:
+        NutrientSnapshot, or None if it is missing, unreadable or NumPy is absent
+    """
+    if np is None:
+        logger.warning("NumPy not installed; offline nutrient snapshot disabled")
+        return None
+    try:
+        start = time.perf_counter()
+        with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        matrix = np.load(os.path.join(directory, MATRIX_FILE), mmap_mode='r')
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not load nutrient snapshot from {directory}: {e}")
+        return None
+
+    if meta.get('format') != FORMAT_VERSION or matrix.shape != (len(meta['foods']), len(meta['columns'])):
+        logger.error(f"Nutrient snapshot in {directory} is incompatible; re-run the importer")
+        return None
+    if columns is not None and list(columns) != meta['columns']:
+        logger.error(f"Nutrient snapshot in {directory} has different nutrient columns; re-run the importer")
+        return None
+
+    snapshot = NutrientSnapshot(matrix, meta['columns'], meta['foods'], meta['index'])
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logger.info(f"Loaded nutrient snapshot: {len(snapshot)} foods, {len(snapshot.index)} names "
+                f"({meta.get('source')}) in {elapsed_ms:.1f}ms")
+    return snapshot
+
+
+def _aliases(description):
+    """Spellings an ingredient might be typed as, best match first"""
+    desc = description.strip().lower()
+    parts = [p.strip() for p in desc.split(',') if p.strip()]
+    aliases = [(0, desc)]
+    if parts:
+        aliases.append((1, parts[0]))
+        if parts[0].endswith('s'):
+            aliases.append((1, parts[0][:-1]))
+    if len(parts) >= 2:
+        # "Oil, olive, salad or cooking" -> "olive oil", "Milk, whole, ..." -> "whole milk"
+        aliases.append((2, f"{parts[1]} {parts[0]}"))
+    return aliases
+
+
+def build_index(foods):
+    """
+    Map spellings to rows.
+
+    Args:
+        foods: List of (fdc_id, description, data_type) in row order
+
+    On collisions, full descriptions beat first-segment aliases, then better
+    data types win, then the shortest (least processed) description.
+    """
+    best = {}
+    for row, (_, description, data_type) in enumerate(foods):
+        type_rank = _DATA_TYPE_RANK.get(data_type, 3)
+        for kind, alias in _aliases(description):
+            rank = (kind, type_rank, len(description))
+            current = best.get(alias)
+            if current is None or rank < current[0]:
+                best[alias] = (rank, row)
+    return {alias: row for alias, (_, row) in best.items()}
+
+
+def write_snapshot(directory, columns, foods, matrix, source):
+    """Write a snapshot atomically (matrix first, metadata last)"""
+    os.makedirs(directory, exist_ok=True)
+    matrix_path = os.path.join(directory, MATRIX_FILE)
+    meta_path = os.path.join(directory, META_FILE)
+
+    with open(matrix_path + '.tmp', 'wb') as f:
+        np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+    meta = {
+        'format': FORMAT_VERSION,
+        'source': source,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'columns': list(columns),
+        'foods': [[fdc_id, description] for fdc_id, description, _ in foods],
+        'index': build_index(foods),
+    }
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, separators=(',', ':'))
+    os.replace(matrix_path + '.tmp', matrix_path)
+    os.replace(meta_path + '.tmp', meta_path)
+    return meta
+
+
+def _read_csv_dump(path, nutrient_ids):
+    """Read food.csv + food_nutrient.csv from a bulk CSV download directory"""
+    columns_by_id = {nid: col for col, nid in enumerate(nutrient_ids.values())}
+    foods = []
+    rows_by_fdc = {}
+    with open(os.path.join(path, 'food.csv'), 'r', encoding='utf-8', newline='') as f:
+        for record in csv.DictReader(f):
+            if record.get('data_type') not in _DATA_TYPE_RANK or not record.get('description'):
+                continue
+            fdc_id = int(record['fdc_id'])
+            rows_by_fdc[fdc_id] = len(foods)
+            foods.append((fdc_id, record['description'], record['data_type']))
+
+    matrix = np.zeros((len(foods), len(columns_by_id)), dtype=np.float32)
+    with open(os.path.join(path, 'food_nutrient.csv'), 'r', encoding='utf-8', newline='') as f:
+        for record in csv.DictReader(f):
+            try:
+                row = rows_by_fdc.get(int(record['fdc_id']))
+                col = columns_by_id.get(int(record['nutrient_id']))
+                if row is not None and col is not None:
+                    matrix[row, col] = float(record.get('amount') or 0)
+            except (KeyError, ValueError):
+                continue
+    return foods, matrix
+
+
+def _read_json_dump(path, nutrient_ids):
+    """Read a bulk JSON download (FoundationFoods / SRLegacyFoods / SurveyFoods)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    records = []
+    for key in ('FoundationFoods', 'SRLegacyFoods', 'SurveyFoods'):
+        records.extend(data.get(key, []))
+
+    columns_by_id = {nid: col for col, nid in enumerate(nutrient_ids.values())}
+    foods = []
+    matrix = np.zeros((len(records), len(columns_by_id)), dtype=np.float32)
+    for record in records:
+        if not record.get('description'):
+            continue
+        row = len(foods)
+        foods.append((record.get('fdcId'), record['description'], record.get('dataType')))
+        for nutrient in record.get('foodNutrients', []):
+            nutrient_id = nutrient.get('nutrientId') or (nutrient.get('nutrient') or {}).get('id')
+            col = columns_by_id.get(nutrient_id)
+            if col is not None:
+                matrix[row, col] = nutrient.get('amount', nutrient.get('value', 0)) or 0
+    return foods, matrix[:len(foods)]
+
+
+def import_dump(source, directory, nutrient_ids):
+    """
+    Convert a FoodData Central bulk download into a snapshot.
+
+    Args:
+        source: Bulk CSV directory or JSON file
+        directory: Output snapshot directory
+        nutrient_ids: Ordered mapping of nutrient key -> USDA nutrient id
+
+    Returns:
+        dict: The snapshot metadata written
+    """
+    if np is None:
+        raise RuntimeError("NumPy is required to build a nutrient snapshot (pip install numpy)")
+    start = time.perf_counter()
+    if os.path.isdir(source):
+        foods, matrix = _read_csv_dump(source, nutrient_ids)
+    else:
+        foods, matrix = _read_json_dump(source, nutrient_ids)
+    meta = write_snapshot(directory, nutrient_ids.keys(), foods, matrix, os.path.basename(source.rstrip('/')))
+    logger.info(f"Imported {len(foods)} foods ({len(meta['index'])} names) into {directory} "
+                f"in {time.perf_counter() - start:.1f}s")
+    return meta
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the offline USDA nutrient snapshot")
+    sub = parser.add_subparsers(dest='command', required=True)
+    importer = sub.add_parser('import', help='import a FoodData Central bulk CSV directory or JSON file')
+    importer.add_argument('source')
+    importer.add_argument('--out', default=os.getenv('NUTRITION_SNAPSHOT_DIR') or 'data/nutrients')
+    lookup = sub.add_parser('lookup', help='look ingredients up in an existing snapshot')
+    lookup.add_argument('ingredients', nargs='+')
+    lookup.add_argument('--dir', default=os.getenv('NUTRITION_SNAPSHOT_DIR') or 'data/nutrients')
+    args = parser.parse_args(argv)
+
+    from nutrition_service import NutritionService
+
+    if args.command == 'import':
+        import_dump(args.source, args.out, NutritionService.NUTRIENT_IDS)
+        return 0
+
+    snapshot = load_snapshot(args.dir, NutritionService.NUTRIENT_IDS.keys())
+    if snapshot is None:
+        return 1
+    for ingredient in args.ingredients:
+        row = snapshot.lookup(ingredient)
+        if row is None:
+            print(f"{ingredient}: not found")
+        else:
+            nutrition = snapshot.nutrition(row, ingredient)
+            print(f"{ingredient}: {nutrition['description']} - {nutrition['calories']} kcal/100g")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
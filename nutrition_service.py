@@ -7,9 +7,12 @@ Provides calorie, macro, vitamin, and mineral calculations.
 import os
 import requests
 import logging
-from functools import lru_cache
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from memory_cache import LRUCache
+from nutrient_snapshot import load_snapshot
 
 load_dotenv()
 
@@ -18,7 +21,19 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # USDA FoodData Central API configuration
-USDA_API_BASE_URL = "https://api.nal.usda.gov/fdc/v1"
+USDA_API_BASE_URL = os.getenv('USDA_API_BASE_URL', "https://api.nal.usda.gov/fdc/v1")
+USDA_BULK_MAX_IDS = 20  # POST /foods accepts at most 20 FDC ids per request
+
+# Shared nutrition cache (MongoDB nutrition_cache collection) lifetimes, in seconds
+NUTRITION_CACHE_TTL = int(os.getenv('NUTRITION_CACHE_TTL', 30 * 24 * 3600))  # Nutrient values: 30 days
+NUTRITION_NEGATIVE_CACHE_TTL = int(os.getenv('NUTRITION_NEGATIVE_CACHE_TTL', 24 * 3600))  # No USDA match: 1 day
+FDC_ID_CACHE_TTL = int(os.getenv('FDC_ID_CACHE_TTL', 365 * 24 * 3600))  # Name -> FDC id: ids are stable
+NUTRITION_ERROR_CACHE_TTL = 60  # USDA unreachable: retry soon, never persisted
+
+# Offline nutrient snapshot (see nutrient_snapshot.py); unset = always use the USDA API
+NUTRITION_SNAPSHOT_DIR = os.getenv('NUTRITION_SNAPSHOT_DIR')
+# With a snapshot loaded, estimate ingredients it does not know instead of calling USDA
+NUTRITION_OFFLINE = os.getenv('NUTRITION_OFFLINE', 'true').lower() == 'true'
 
 
 class NutritionService:
@@ -95,11 +110,65 @@ class NutritionService:
         """Initialize the Nutrition Service with USDA API key."""
         self.api_key = os.getenv("USDA_API_KEY")
         self.available = bool(self.api_key)
-        self._cache = {}  # Simple cache for ingredient nutrition
-        
-        if not self.available:
+        self._cache = LRUCache(max_entries=4096, name='nutrition')  # Bounded L1 for ingredient nutrition
+        self._store = None  # Shared L2: MongoDB nutrition_cache collection (see attach_store)
+        self._session = None  # Pooled HTTP session, created on first use
+        self._executor = None  # Shared USDA search pool, created on first use
+        self.usda_calls = 0
+        self.store_hits = 0
+        self.snapshot = None  # Offline nutrient matrix (see attach_snapshot)
+        
+        if NUTRITION_SNAPSHOT_DIR:
+            self.attach_snapshot(load_snapshot(NUTRITION_SNAPSHOT_DIR, self.NUTRIENT_IDS.keys()))
+        
+        if not self.available and self.snapshot is None:
             logger.warning("USDA_API_KEY not found. Nutrition features will use estimates.")
     
+    def attach_store(self, collection):
+        """
+        Use a MongoDB collection as the shared, persistent L2 cache.
+        
+        Two kinds of documents live there, both with an expires_at TTL:
+        - {_id: "name:<ingredient>", fdc_id: int or None} - resolved FDC id,
+          or a negative entry when USDA has no match
+        - {_id: "fdc:<id>", description, nutrients: {...}} - nutrient values
+        """
+        self._store = collection
+    
+    def attach_snapshot(self, snapshot):
+        """
+        Answer lookups from an offline NutrientSnapshot before any cache or API.
+        
+        With NUTRITION_OFFLINE (the default) ingredients missing from the
+        snapshot are estimated locally, so no request touches the network.
+        """
+        self.snapshot = snapshot
+    
+    def after_fork(self):
+        """
+        Drop the HTTP session, thread pool and L2 collection inherited from the
+        parent process; the store is attached again with the child's client.
+        """
+        self._session = None
+        self._executor = None
+        self._store = None
+
+    def _get_session(self) -> requests.Session:
+        """Pooled keep-alive session shared by every USDA request."""
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=16)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._session = session
+        return self._session
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Thread pool shared across requests for concurrent USDA searches."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='usda')
+        return self._executor
+    
     def search_food(self, query: str, limit: int = 5) -> list:
         """
         Search for foods in USDA database.
@@ -115,28 +184,93 @@ class NutritionService:
             return []
         
         try:
-            url = f"{USDA_API_BASE_URL}/foods/search"
-            params = {
-                'api_key': self.api_key,
-                'query': query,
-                'pageSize': limit,
-                'dataType': ['Foundation', 'SR Legacy', 'Survey (FNDDS)']
-            }
-            
-            response = requests.get(url, params=params, timeout=3)  # Reduced timeout for faster response
-            response.raise_for_status()
-            
-            data = response.json()
-            return data.get('foods', [])
-            
+            return self._search_food(query, limit)
         except requests.RequestException as e:
             logger.error(f"USDA API search error for '{query}': {e}")
             return []
     
+    def _search_food(self, query: str, limit: int) -> list:
+        """Search USDA, raising requests.RequestException on transport/HTTP errors."""
+        url = f"{USDA_API_BASE_URL}/foods/search"
+        params = {
+            'api_key': self.api_key,
+            'query': query,
+            'pageSize': limit,
+            'dataType': ['Foundation', 'SR Legacy', 'Survey (FNDDS)']
+        }
+        
+        self.usda_calls += 1
+        response = self._get_session().get(url, params=params, timeout=3)  # Reduced timeout for faster response
+        response.raise_for_status()
+        
+        data = response.json()
+        return data.get('foods', [])
+    
+    def _fetch_foods(self, fdc_ids: list) -> list:
+        """Fetch full nutrient records for many FDC ids with bulk POST /foods requests."""
+        foods = []
+        url = f"{USDA_API_BASE_URL}/foods"
+        for start in range(0, len(fdc_ids), USDA_BULK_MAX_IDS):
+            batch = fdc_ids[start:start + USDA_BULK_MAX_IDS]
+            self.usda_calls += 1
+            response = self._get_session().post(
+                url, params={'api_key': self.api_key}, json={'fdcIds': batch}, timeout=3
+            )
+            response.raise_for_status()
+            foods.extend(response.json() or [])
+        return foods
+    
+    def _food_record(self, food: dict) -> dict:
+        """Reduce a USDA food (search hit or /foods record) to the nutrients we track."""
+        nutrients = {}
+        for nutrient in food.get('foodNutrients', []):
+            # Search hits use nutrientId/value; /foods records nest {nutrient: {id}} with amount
+            nutrient_id = nutrient.get('nutrientId') or (nutrient.get('nutrient') or {}).get('id')
+            value = nutrient.get('value', nutrient.get('amount', 0)) or 0
+            
+            for key, nid in self.NUTRIENT_IDS.items():
+                if nutrient_id == nid:
+                    nutrients[key] = round(value, 2)
+                    break
+        return {'fdc_id': food.get('fdcId'), 'description': food.get('description'), 'nutrients': nutrients}
+    
+    def _nutrition_from_record(self, ingredient: str, record: dict) -> dict:
+        """Build the per-ingredient nutrition dict from a cached food record."""
+        nutrition = {key: 0 for key in self.NUTRIENT_IDS.keys()}
+        nutrition.update(record.get('nutrients', {}))
+        nutrition['ingredient'] = ingredient
+        nutrition['found'] = True
+        nutrition['description'] = record.get('description') or ingredient
+        return nutrition
+    
+    def _store_find(self, ids: list) -> dict:
+        """Batched read of unexpired shared-cache documents, keyed by _id."""
+        if self._store is None or not ids:
+            return {}
+        try:
+            # The TTL monitor runs about once a minute, so filter expired documents ourselves
+            cursor = self._store.find({"_id": {"$in": ids}, "expires_at": {"$gt": datetime.utcnow()}})
+            return {doc["_id"]: doc for doc in cursor}
+        except Exception as e:
+            logger.error(f"Nutrition cache read error: {e}")
+            return {}
+    
+    def _store_put(self, doc_id: str, fields: dict, ttl: int):
+        """Upsert one shared-cache document (best-effort)."""
+        if self._store is None:
+            return
+        try:
+            fields = dict(fields, expires_at=datetime.utcnow() + timedelta(seconds=ttl))
+            self._store.update_one({"_id": doc_id}, {"$set": fields}, upsert=True)
+        except Exception as e:
+            logger.error(f"Nutrition cache write error for '{doc_id}': {e}")
+    
     def get_ingredient_nutrition(self, ingredient: str) -> dict:
         """
         Get nutrition data for a single ingredient per 100g serving.
-        Uses caching to avoid repeated API calls.
+        Looks in the in-memory LRU, then the shared MongoDB cache, and only
+        then calls USDA. Ingredients USDA does not know are cached too
+        (negative caching) with a shorter lifetime.
         
         Args:
             ingredient: Name of the ingredient
@@ -144,51 +278,136 @@ class NutritionService:
         Returns:
             Dictionary with nutrition values
         """
-        # Check cache first
-        cache_key = ingredient.lower().strip()
-        if cache_key in self._cache:
-            return self._cache[cache_key].copy()
-        
-        # Initialize with zeros
-        nutrition = {key: 0 for key in self.NUTRIENT_IDS.keys()}
-        nutrition['ingredient'] = ingredient
-        nutrition['found'] = False
-        
-        if not self.available:
-            result = self._estimate_nutrition(ingredient)
-            self._cache[cache_key] = result
-            return result
-        
-        foods = self.search_food(ingredient, limit=1)
+        return self.get_nutrition_batch([ingredient])[0]
+    
+    def get_nutrition_batch(self, ingredients: list) -> list:
+        """
+        Get nutrition data for many ingredients with as few round-trips as possible.
         
-        if not foods:
-            logger.info(f"No USDA data found for '{ingredient}', using estimates")
-            result = self._estimate_nutrition(ingredient)
-            self._cache[cache_key] = result
-            return result
+        1. In-memory LRU by ingredient name
+        2. One batched shared-cache read for name -> FDC id
+        3. Concurrent USDA searches (shared pool, pooled session) for unknown names
+        4. One batched shared-cache read for nutrients of known ids, then bulk
+           POST /foods requests for ids whose nutrients expired
         
-        food = foods[0]
-        nutrition['found'] = True
-        nutrition['description'] = food.get('description', ingredient)
-        
-        # Extract nutrient values
-        for nutrient in food.get('foodNutrients', []):
-            nutrient_id = nutrient.get('nutrientId')
-            value = nutrient.get('value', 0)
+        Args:
+            ingredients: List of ingredient names
             
-            for key, nid in self.NUTRIENT_IDS.items():
-                if nutrient_id == nid:
-                    nutrition[key] = round(value, 2)
-                    break
+        Returns:
+            List of nutrition dictionaries in the same order as ingredients
+        """
+        results = {}
+        pending = {}  # cache key -> ingredient as first written
+        for ingredient in ingredients:
+            cache_key = ingredient.lower().strip()
+            if cache_key in results or cache_key in pending:
+                continue
+            if self.snapshot is not None:
+                row = self.snapshot.lookup(cache_key)
+                if row is not None:
+                    results[cache_key] = self.snapshot.nutrition(row, ingredient)
+                    continue
+                if NUTRITION_OFFLINE:
+                    results[cache_key] = self._estimate_nutrition(ingredient)
+                    continue
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                results[cache_key] = cached.copy()
+            elif not self.available:
+                # Estimates without an API key are cheap; keep them out of the shared cache
+                result = self._estimate_nutrition(ingredient)
+                self._cache.set(cache_key, result, ttl=NUTRITION_NEGATIVE_CACHE_TTL)
+                results[cache_key] = result
+            else:
+                pending[cache_key] = ingredient
         
-        # Cache the result
-        self._cache[cache_key] = nutrition
-        return nutrition
+        if pending:
+            results.update(self._resolve_uncached(pending))
+        
+        return [results[ingredient.lower().strip()] for ingredient in ingredients]
+    
+    def _resolve_uncached(self, names: dict) -> dict:
+        """Resolve ingredients (cache key -> name) that missed the in-memory cache."""
+        results = {}
+        fdc_ids = {}  # cache key -> FDC id
+        records = {}  # FDC id -> food record
+        
+        name_docs = self._store_find([f"name:{key}" for key in names])
+        to_search = []
+        for key in names:
+            doc = name_docs.get(f"name:{key}")
+            if doc is None:
+                to_search.append(key)
+            elif doc.get("fdc_id") is None:
+                # Negative entry: USDA had no match recently
+                self.store_hits += 1
+                result = self._estimate_nutrition(names[key])
+                self._cache.set(key, result, ttl=NUTRITION_NEGATIVE_CACHE_TTL)
+                results[key] = result
+            else:
+                self.store_hits += 1
+                fdc_ids[key] = doc["fdc_id"]
+        
+        # Unknown names: one search each, run concurrently on the shared pool
+        searches = {key: self._get_executor().submit(self._search_food, names[key], 1) for key in to_search}
+        for key, future in searches.items():
+            try:
+                foods = future.result()
+            except requests.RequestException as e:
+                logger.error(f"USDA API search error for '{names[key]}': {e}")
+                result = self._estimate_nutrition(names[key])
+                self._cache.set(key, result, ttl=NUTRITION_ERROR_CACHE_TTL)
+                results[key] = result
+                continue
+            if not foods:
+                logger.info(f"No USDA data found for '{names[key]}', using estimates")
+                self._store_put(f"name:{key}", {"fdc_id": None}, NUTRITION_NEGATIVE_CACHE_TTL)
+                result = self._estimate_nutrition(names[key])
+                self._cache.set(key, result, ttl=NUTRITION_NEGATIVE_CACHE_TTL)
+                results[key] = result
+                continue
+            # Search hits already carry nutrients; cache both the id and the record
+            record = self._food_record(foods[0])
+            if record['fdc_id'] is not None:
+                fdc_ids[key] = record['fdc_id']
+                records[record['fdc_id']] = record
+                self._store_put(f"name:{key}", {"fdc_id": record['fdc_id']}, FDC_ID_CACHE_TTL)
+                self._store_put(f"fdc:{record['fdc_id']}", record, NUTRITION_CACHE_TTL)
+            else:
+                nutrition = self._nutrition_from_record(names[key], record)
+                self._cache.set(key, nutrition, ttl=NUTRITION_CACHE_TTL)
+                results[key] = nutrition
+        
+        # Known ids: nutrients from the shared cache, the rest in bulk from USDA
+        missing_ids = [fdc_id for fdc_id in set(fdc_ids.values()) if fdc_id not in records]
+        for doc in self._store_find([f"fdc:{fdc_id}" for fdc_id in missing_ids]).values():
+            records[doc["fdc_id"]] = doc
+        missing_ids = [fdc_id for fdc_id in missing_ids if fdc_id not in records]
+        if missing_ids:
+            try:
+                for food in self._fetch_foods(missing_ids):
+                    record = self._food_record(food)
+                    records[record['fdc_id']] = record
+                    self._store_put(f"fdc:{record['fdc_id']}", record, NUTRITION_CACHE_TTL)
+            except requests.RequestException as e:
+                logger.error(f"USDA API bulk fetch error for {len(missing_ids)} foods: {e}")
+        
+        for key, fdc_id in fdc_ids.items():
+            record = records.get(fdc_id)
+            if record is None:
+                result = self._estimate_nutrition(names[key])
+                self._cache.set(key, result, ttl=NUTRITION_ERROR_CACHE_TTL)
+            else:
+                result = self._nutrition_from_record(names[key], record)
+                self._cache.set(key, result, ttl=NUTRITION_CACHE_TTL)
+            results[key] = result
+        return results
     
     def calculate_recipe_nutrition(self, ingredients: list, servings: int = 4) -> dict:
         """
         Calculate total nutrition for a list of ingredients.
-        Uses concurrent requests for faster processing.
+        Uses the offline snapshot when one is loaded (a vectorized sum over
+        matrix rows), otherwise batched cache reads and bulk USDA requests.
         
         Args:
             ingredients: List of ingredient names
@@ -203,33 +422,21 @@ class NutritionService:
         if not valid_ingredients:
             return self._empty_nutrition_result(servings)
         
-        # Initialize totals
-        totals = {key: 0 for key in self.NUTRIENT_IDS.keys()}
-        ingredient_details = []
-        found_count = 0
-        
-        # Use ThreadPoolExecutor for concurrent API calls (max 8 concurrent for faster processing)
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            # Submit all ingredient lookups concurrently
-            future_to_ingredient = {
-                executor.submit(self.get_ingredient_nutrition, ing): ing 
-                for ing in valid_ingredients
-            }
+        if self.snapshot is not None:
+            totals, ingredient_details = self._snapshot_totals(valid_ingredients)
+        else:
+            # Initialize totals
+            totals = {key: 0 for key in self.NUTRIENT_IDS.keys()}
+            
+            # Batched lookup: cached names, concurrent searches for new ones, bulk fetch for known ids
+            ingredient_details = self.get_nutrition_batch(valid_ingredients)
             
-            # Collect results as they complete
-            for future in as_completed(future_to_ingredient):
-                try:
-                    nutrition = future.result()
-                    ingredient_details.append(nutrition)
-                    
-                    if nutrition.get('found'):
-                        found_count += 1
-                    
-                    # Add to totals (assuming ~100g per ingredient as default)
-                    for key in self.NUTRIENT_IDS.keys():
-                        totals[key] += nutrition.get(key, 0)
-                except Exception as e:
-                    logger.error(f"Error fetching nutrition: {e}")
+            # Add to totals (assuming ~100g per ingredient as default)
+            for nutrition in ingredient_details:
+                for key in self.NUTRIENT_IDS.keys():
+                    totals[key] += nutrition.get(key, 0)
+        
+        found_count = sum(1 for nutrition in ingredient_details if nutrition.get('found'))
         
         # Calculate per-serving values
         per_serving = {}
@@ -256,6 +463,33 @@ class NutritionService:
             'accuracy': 'estimated' if found_count < len(valid_ingredients) / 2 else 'calculated'
         }
     
+    def _snapshot_totals(self, ingredients: list) -> tuple:
+        """
+        Totals for a recipe as one vectorized sum over snapshot rows.
+        
+        Ingredients the snapshot does not know are resolved by get_nutrition_batch
+        (estimates when offline) and added to the same sum.
+        
+        Returns:
+            tuple: (totals dict, per-ingredient details in input order)
+        """
+        rows = [self.snapshot.lookup(ingredient) for ingredient in ingredients]
+        misses = [ingredient for ingredient, row in zip(ingredients, rows) if row is None]
+        resolved = iter(self.get_nutrition_batch(misses) if misses else [])
+        
+        details = []
+        extra = []
+        for ingredient, row in zip(ingredients, rows):
+            if row is None:
+                nutrition = next(resolved)
+                extra.append(nutrition)
+            else:
+                nutrition = self.snapshot.nutrition(row, ingredient)
+            details.append(nutrition)
+        
+        totals = self.snapshot.totals([row for row in rows if row is not None], extra)
+        return totals, details
+    
     def _empty_nutrition_result(self, servings: int) -> dict:
         """Return empty nutrition result for invalid input."""
         empty = {key: 0 for key in self.NUTRIENT_IDS.keys()}
@@ -0,0 +1,104 @@
+"""
+Profile Dashboard Statistics
+
+Computes everything the /profile page shows about a user's food entries in
+one ``$facet`` aggregation, so the work happens in MongoDB and only the
+numbers and the handful of rows the page renders reach the app:
+
+- totals: entry count and the number of harmful / safe ingredients
+- recent: the 10 newest entries (only the fields the table displays)
+- today: calories logged since midnight
+
+When the per-day rollups (daily_stats.py) are ready, the totals and today's
+calories come from them instead and only the recent entries are queried.
+"""
+
+from datetime import datetime
+
+from daily_stats import ENTRY_CALORIES, day_key, user_totals
+
+RECENT_ENTRIES_LIMIT = 10
+
+# Fields the recent-entries table on profile.html renders
+RECENT_ENTRY_PROJECTION = {
+    "timestamp": 1,
+    "input_ingredients": 1,
+    "harmful": 1,
+    "safe": 1,
+    "is_favorite": 1,
+}
+
+
+def _array_size(field):
+    """Length of an array field; 0 when it is missing or not an array"""
+    return {"$cond": [{"$isArray": field}, {"$size": field}, 0]}
+
+
+def profile_stats_pipeline(patient_id, since):
+    """Aggregation pipeline producing a single {totals, recent, today} document"""
+    return [
+        {"$match": {"patient_id": patient_id}},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "entries": {"$sum": 1},
+                    "harmful": {"$sum": _array_size("$harmful")},
+                    "safe": {"$sum": _array_size("$safe")},
+                }},
+            ],
+            "recent": [
+                {"$sort": {"timestamp": -1}},
+                {"$limit": RECENT_ENTRIES_LIMIT},
+                {"$project": RECENT_ENTRY_PROJECTION},
+            ],
+            "today": [
+                {"$match": {"timestamp": {"$gte": since}}},
+                {"$group": {"_id": None, "calories": {"$sum": ENTRY_CALORIES}}},
+            ],
+        }},
+    ]
+
+
+def start_of_today():
+    """Local midnight, matching the naive local timestamps entries are stored with"""
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_profile_stats(food_entries, patient_id, since=None, rollups=None):
+    """
+    Compute the profile statistics for one user.
+
+    Args:
+        food_entries: The food_entries collection
+        patient_id: User whose entries are counted
+        since: Start of "today" (defaults to local midnight)
+        rollups: Optional user_daily_stats collection to read totals from
+
+    Returns:
+        dict: total_entries, total_harmful, total_safe, recent_entries, today_calories
+    """
+    since = since or start_of_today()
+    if rollups is not None:
+        totals = user_totals(rollups, patient_id, day_key(since))
+        if totals is not None:
+            recent = (food_entries.find({"patient_id": patient_id}, RECENT_ENTRY_PROJECTION)
+                      .sort("timestamp", -1).limit(RECENT_ENTRIES_LIMIT))
+            return {
+                "total_entries": totals["entries"],
+                "total_harmful": totals["harmful"],
+                "total_safe": totals["safe"],
+                "recent_entries": list(recent),
+                "today_calories": int(totals["today_calories"]),
+            }
+
+    result = next(iter(food_entries.aggregate(profile_stats_pipeline(patient_id, since))), None) or {}
+    totals = (result.get("totals") or [{}])[0]
+    today = (result.get("today") or [{}])[0]
+    return {
+        "total_entries": totals.get("entries", 0),
+        "total_harmful": totals.get("harmful", 0),
+        "total_safe": totals.get("safe", 0),
+        "recent_entries": result.get("recent", []),
+        "today_calories": int(today.get("calories", 0)),
+    }
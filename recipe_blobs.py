@@ -0,0 +1,150 @@
+"""
+Content-Addressed Recipe Storage
+
+Generated recipe text is stored once in the ``recipe_blobs`` collection,
+keyed by its SHA-256, and food entries keep only the key in ``recipe_ref``.
+Everyone who gets the same cached recipe for the same ingredients and
+condition shares one document instead of carrying a copy in every entry:
+
+    {_id: "<sha256 of the UTF-8 text>", codec: "zlib" | "zstd" | "none",
+     data: <bytes, or the text when codec is "none">, size: <text bytes>,
+     created_at}
+
+Texts of at least ``compress_threshold`` bytes are compressed with zlib, or
+zstd when ``zstandard`` is installed and asked for. Blobs are immutable, so
+resolved texts are kept in an in-process LRU and ``store`` skips the write
+for blobs this process has already seen.
+
+Entries written before this existed still carry the text in ``recipe``;
+readers go through ``resolve`` / ``recipe_text``, which handle both, and
+``python migrations.py dedupe-recipes`` moves old entries over. Blobs are
+never deleted (unreferenced ones only cost their own size).
+"""
+
+import hashlib
+import logging
+import zlib
+from datetime import datetime
+
+from pymongo.errors import DuplicateKeyError
+
+from memory_cache import LRUCache
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CODECS = ("zlib", "zstd", "none")
+
+
+def recipe_ref(text):
+    """Content hash a recipe text is stored under"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _compress(raw, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(raw)
+    return zlib.compress(raw, 6)
+
+
+def _decompress(data, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("recipe blob is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class RecipeBlobStore:
+    """Deduplicated, optionally compressed recipe texts in one collection"""
+
+    def __init__(self, get_collection, codec="zlib", compress_threshold=256, cache_entries=2000,
+                 cache_bytes=8 * 1024 * 1024):
+        """
+        Args:
+            get_collection: Callable returning the recipe_blobs collection
+            codec: 'zlib', 'zstd' (falls back to zlib without zstandard) or 'none'
+            compress_threshold: Store shorter texts uncompressed
+            cache_entries / cache_bytes: Bounds of the in-process text cache
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unknown recipe blob codec {codec!r}; expected one of {CODECS}")
+        if codec == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed; compressing recipe blobs with zlib")
+            codec = "zlib"
+        self._get_collection = get_collection
+        self.codec = codec
+        self.compress_threshold = compress_threshold
+        self._texts = LRUCache(max_entries=cache_entries, max_bytes=cache_bytes,
+                               compress_threshold=1024, name='recipe_blobs')
+
+    def store(self, text):
+        """
+        Store a recipe text (idempotent).
+
+        Returns:
+            str: Its recipe_ref, or None for an empty text
+        """
+        if not text:
+            return None
+        ref = recipe_ref(text)
+        if self._texts.get(ref) is not None:
+            return ref
+        raw = text.encode("utf-8")
+        codec = self.codec if len(raw) >= self.compress_threshold else "none"
+        data = text if codec == "none" else _compress(raw, codec)
+        try:
+            self._get_collection().update_one(
+                {"_id": ref},
+                {"$setOnInsert": {"codec": codec, "data": data, "size": len(raw),
+                                  "created_at": datetime.now()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # Inserted concurrently by another writer; same content
+        self._texts.set(ref, text)
+        return ref
+
+    def load(self, refs):
+        """Texts of several refs with one $in query for those not cached: {ref: text}"""
+        texts, missing = {}, []
+        for ref in dict.fromkeys(ref for ref in refs if ref):
+            text = self._texts.get(ref)
+            if text is None:
+                missing.append(ref)
+            else:
+                texts[ref] = text
+        if missing:
+            for doc in self._get_collection().find({"_id": {"$in": missing}}):
+                try:
+                    codec = doc.get("codec", "none")
+                    data = doc.get("data")
+                    text = data if codec == "none" else _decompress(data, codec).decode("utf-8")
+                except Exception as e:
+                    logger.error(f"Unreadable recipe blob {doc.get('_id')}: {e}")
+                    continue
+                self._texts.set(doc["_id"], text)
+                texts[doc["_id"]] = text
+        return texts
+
+    def resolve(self, entries):
+        """Fill in ``recipe`` on entries that only carry a recipe_ref (one batched read)"""
+        pending = [entry for entry in entries if not entry.get("recipe") and entry.get("recipe_ref")]
+        if pending:
+            texts = self.load(entry["recipe_ref"] for entry in pending)
+            for entry in pending:
+                entry["recipe"] = texts.get(entry["recipe_ref"], "")
+        return entries
+
+    def recipe_text(self, entry):
+        """Recipe text of one entry, inline or referenced"""
+        return self.resolve([entry])[0].get("recipe") or ""
+
+    def stats(self):
+        return self._texts.stats()
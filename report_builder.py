@@ -0,0 +1,244 @@
+"""
+Streaming PDF Report Builder
+
+Builds the patient health report from an iterator of food entries without
+holding the history in memory. Entries are pulled from the cursor as pages
+are laid out: ``StreamingTable`` fills each page with a table chunk of just
+the rows that fit (header repeated on every page), so memory stays bounded by
+a couple of pages of rows. ReportLab keeps the finished pages (compressed)
+until the file is saved, so the output PDF itself remains in memory.
+
+Splitting one big ``Table`` re-wraps every remaining row on each page break,
+so the old single-table layout was quadratic in the history length. Chunks
+are laid out once.
+"""
+
+import logging
+from datetime import datetime
+from itertools import chain, islice
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Flowable, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Entry fields the report reads (recipe / recipe_ref only for unnamed entries)
+REPORT_ENTRY_PROJECTION = {
+    "recipe_name": 1,
+    "recipe": 1,
+    "recipe_ref": 1,
+    "harmful": 1,
+    "safe": 1,
+    "nutrition.macros.calories": 1,
+    "nutrition.calories": 1,
+    "timestamp": 1,
+}
+
+# Section headers that are not a recipe title
+_SECTION_TITLES = {'ingredients', 'instructions', 'method', 'directions', 'nutritional info', 'nutrition'}
+
+# Columns: Sr No | Recipe Name | Harmful Ingredients | Safe Alternatives | Net Calories | Timestamp
+COL_WIDTHS = [0.5*inch, 1.4*inch, 1.5*inch, 1.5*inch, 1.0*inch, 1.1*inch]
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0,0), (-1,0), colors.Color(0.9, 0.9, 0.9)), # Header background
+    ('TEXTCOLOR', (0,0), (-1,0), colors.black),
+    ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+    ('VALIGN', (0,0), (-1,-1), 'TOP'),
+    ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
+    ('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
+    ('FONTSIZE', (0,0), (-1,-1), 9),
+    ('BOTTOMPADDING', (0,0), (-1,-1), 6),
+    ('TOPPADDING', (0,0), (-1,-1), 6),
+])
+
+
+def recipe_title(recipe_text):
+    """First bold **Title** line of a generated recipe that is not a section header"""
+    for line in (recipe_text or "").split('\n'):
+        line = line.strip()
+        if line.startswith('**') and line.endswith('**'):
+            cleaned = line.replace('**', '').strip()
+            if cleaned and cleaned.lower() not in _SECTION_TITLES:
+                return cleaned
+    return ""
+
+
+def calories_text(nutrition):
+    """Net calories cell: nested macros format, else the legacy flat format"""
+    if nutrition and isinstance(nutrition, dict):
+        if 'macros' in nutrition and isinstance(nutrition['macros'], dict):
+            cal_entry = nutrition['macros'].get('calories')
+            if isinstance(cal_entry, dict):
+                return f"{int(cal_entry.get('value', 0))} kcal"
+        elif 'calories' in nutrition:
+            return f"{int(nutrition.get('calories', 0))} kcal"
+    return "N/A"
+
+
+def entry_row(idx, entry, style):
+    """Table row of one food entry"""
+    # Explicit name, else the title in the generated recipe (old records), else a placeholder
+    recipe_name_text = entry.get("recipe_name", "") or recipe_title(entry.get("recipe")) or "Custom Recipe"
+    harmful_text = ", ".join(entry.get("harmful", [])).title() or "None"
+    # The full safe list (more useful than only the replacements)
+    safe_text = ", ".join(entry.get("safe", [])).title() or "None"
+    ts = entry.get("timestamp")
+    return [
+        str(idx),
+        Paragraph(recipe_name_text, style),
+        Paragraph(harmful_text, style),
+        Paragraph(safe_text, style),
+        calories_text(entry.get("nutrition")),
+        ts.strftime('%Y-%m-%d\n%H:%M') if ts else "N/A",
+    ]
+
+
+class StreamingTable(Flowable):
+    """
+    A table fed from an iterator of rows, laid out one page-sized chunk at a time.
+
+    Every split pulls just enough rows to overfill the available space,
+    emits a ``Table`` of the rows that fit (plus the header) and hands the
+    leftovers to a fresh continuation for the next page. Rows are measured
+    once, when they are pulled (with fixed column widths a row's height does
+    not depend on the other rows).
+    """
+
+    def __init__(self, header, rows, col_widths, style, pull_rows=20, buffer=None, heights=None,
+                 header_height=0):
+        super().__init__()
+        self.header = header
+        self.rows = rows
+        self.col_widths = col_widths
+        self.style = style
+        self.pull_rows = pull_rows
+        self._buffer = buffer if buffer is not None else []
+        self._heights = heights if heights is not None else []
+        self._header_height = header_height
+        self._exhausted = False
+
+    def _table(self, rows):
+        table = Table([self.header] + rows, colWidths=self.col_widths, repeatRows=1)
+        table.setStyle(self.style)
+        return table
+
+    def _pull(self, count, availWidth, availHeight):
+        pulled = list(islice(self.rows, count))
+        if len(pulled) < count:
+            self._exhausted = True
+        if pulled:
+            table = self._table(pulled)
+            table.wrap(availWidth, availHeight)
+            # _rowHeights: laid-out height of the header and of each row
+            self._header_height = table._rowHeights[0]
+            self._heights.extend(table._rowHeights[1:])
+            self._buffer.extend(pulled)
+
+    def wrap(self, availWidth, availHeight):
+        if not self._buffer and not self._exhausted:
+            self._pull(1, availWidth, availHeight)
+        if not self._buffer:
+            return 0, 0  # Nothing left to draw
+        # Never drawn whole: taller than any frame, so the frame asks for a split
+        return availWidth, availHeight + 1
+
+    def draw(self):
+        pass
+
+    def split(self, availWidth, availHeight):
+        while not self._exhausted and self._header_height + sum(self._heights) <= availHeight:
+            self._pull(self.pull_rows, availWidth, availHeight)
+        used, fits = self._header_height, 0
+        for height in self._heights:
+            if used + height > availHeight:
+                break
+            used += height
+            fits += 1
+        if fits == 0:
+            return []  # Not even one row: continue on the next page
+        rest = StreamingTable(self.header, self.rows, self.col_widths, self.style, pull_rows=self.pull_rows,
+                              buffer=self._buffer[fits:], heights=self._heights[fits:],
+                              header_height=self._header_height)
+        rest._exhausted = self._exhausted
+        return [self._table(self._buffer[:fits]), rest]
+
+
+def _resolved(entries, resolve_recipes, batch_size):
+    """Entries with recipe texts of unnamed ones resolved, one lookup per batch"""
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            return
+        if resolve_recipes is not None:
+            resolve_recipes([entry for entry in batch if not entry.get("recipe_name")])
+        yield from batch
+
+
+def build_report(filename, user_id, user, entries, resolve_recipes=None, batch_size=500):
+    """
+    Render the health report of user_id to filename.
+
+    Args:
+        entries: Iterable of food entries, newest first (e.g. a cursor)
+        resolve_recipes: Optional callable filling in ``recipe`` for a list of
+            entries that only carry a recipe_ref
+        batch_size: Entries per recipe lookup
+
+    Returns:
+        str: filename, or None if there are no entries (no file is written)
+    """
+    entries = _resolved(iter(entries), resolve_recipes, batch_size)
+    first = next(entries, None)
+    if first is None:
+        return None
+
+    doc = SimpleDocTemplate(filename, pagesize=letter, rightMargin=36, leftMargin=36, topMargin=36, bottomMargin=36)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Title
+    title_style = styles['Title']
+    title_style.fontSize = 24
+    elements.append(Paragraph("Patient Health Report", title_style))
+    elements.append(Spacer(1, 24))
+
+    # Patient Info Section (Top)
+    # Patient ID, Age/Gender, Health Condition, Diet Type, Allergies, Report Generated On, Report Version
+    u_age = getattr(user, 'age', 'N/A') or "N/A"
+    u_gender = getattr(user, 'gender', 'Not Specified')
+    u_condition = getattr(user, 'medical_condition', 'None') or "None"
+    u_diet = getattr(user, 'diet_type', 'Not Specified')
+    u_allergies = getattr(user, 'allergies', 'Not Specified')
+
+    user_info = [
+        [Paragraph(f"<b>Patient ID:</b> {user_id}", styles['Normal']), Paragraph(f"<b>Report Version:</b> v1.1", styles['Normal'])],
+        [Paragraph(f"<b>Age / Gender:</b> {u_age} / {u_gender}", styles['Normal']), Paragraph(f"<b>Report Generated On:</b> {datetime.now().strftime('%d-%m-%Y %H:%M')}", styles['Normal'])],
+        [Paragraph(f"<b>Health Condition(s):</b> {u_condition.title()}", styles['Normal']), ""],
+        [Paragraph(f"<b>Diet Type:</b> {u_diet}", styles['Normal']), ""],
+        [Paragraph(f"<b>Allergies:</b> {u_allergies}", styles['Normal']), ""]
+    ]
+
+    t_info = Table(user_info, colWidths=[4*inch, 3.5*inch])
+    t_info.setStyle(TableStyle([
+        ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+        ('VALIGN', (0,0), (-1,-1), 'TOP'),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 8),
+    ]))
+    elements.append(t_info)
+    elements.append(Spacer(1, 24))
+
+    # Table of Records (Bottom), streamed from the entries
+    headers = [Paragraph(f"<b>{title}</b>", styles['Normal']) for title in
+               ("Sr No", "Recipe Name", "Harmful Ingredients", "Safe Alternatives", "Net Calories", "Timestamp")]
+    rows = (entry_row(idx, entry, styles['Normal'])
+            for idx, entry in enumerate(chain([first], entries), 1))
+    elements.append(StreamingTable(headers, rows, COL_WIDTHS, TABLE_STYLE))
+
+    doc.build(elements)
+    return filename
@@ -0,0 +1,173 @@
+"""
+Fingerprinted PDF Report Cache
+
+Rendering a patient report reads every entry and rebuilds the whole ReportLab
+document, and one look at a report asks for it up to three times (viewer
+page, embedded PDF, download). Reports are therefore stored under a
+fingerprint of what they show:
+
+    patient id | entry count | newest entry (timestamp, calories) | profile version
+
+Computing it takes two indexed reads. While it is unchanged the stored PDF is
+served as is. When it changes, the report is rendered once (concurrent
+requests for the same fingerprint share the render) into a local scratch
+file, put into the report blob store under the SHA-256 of its bytes (see
+report_store.py) and recorded in the ``report_files`` collection:
+
+    {_id: <fingerprint>, patient_id, blob: <sha256>, size, created_at}
+
+The blob is written before its record, so a record only ever points at a
+complete report; with the GridFS store any app instance can serve it. Older
+reports of the patient (records and blobs) are removed after the new one is
+recorded. The blob key doubles as a strong ETag.
+
+The newest entry's calories are part of the fingerprint because nutrition is
+filled in right after an entry is created. Edits the report does not show
+(favorites, categories) keep the cached report.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime
+
+from daily_stats import entry_calories
+from report_store import blob_key
+from single_flight import SingleFlight
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# User fields printed in the report header; their values are the profile version
+PROFILE_FIELDS = ("age", "gender", "medical_condition", "diet_type", "allergies")
+
+
+def profile_version(user):
+    """Short digest of the profile fields a report shows"""
+    values = "|".join(str(getattr(user, field, None)) for field in PROFILE_FIELDS)
+    return hashlib.sha256(values.encode("utf-8")).hexdigest()[:12]
+
+
+class ReportCache:
+    """PDF reports in a blob store, indexed by patient and content fingerprint"""
+
+    def __init__(self, get_store, get_collection, get_directory, render):
+        """
+        Args:
+            get_store: Callable returning the report blob store (see report_store.py)
+            get_collection: Callable returning the report_files collection
+            get_directory: Callable returning a writable local directory for renders
+            render: render(patient_id, path) writes the report to path and
+                returns it, or returns None when there is nothing to report
+        """
+        self._get_store = get_store
+        self._get_collection = get_collection
+        self._get_directory = get_directory
+        self._render = render
+        self._flights = SingleFlight()
+        self.hits = 0
+        self.renders = 0
+
+    def fingerprint(self, food_entries, user):
+        """Fingerprint of the report user would get now"""
+        patient_id = user.user_id
+        count = food_entries.count_documents({"patient_id": patient_id})
+        newest = food_entries.find_one({"patient_id": patient_id}, {"timestamp": 1, "nutrition": 1},
+                                       sort=[("timestamp", -1)]) or {}
+        timestamp = newest.get("timestamp")
+        parts = [
+            str(patient_id),
+            str(count),
+            timestamp.isoformat() if timestamp else "",
+            str(entry_calories(newest.get("nutrition"))),
+            profile_version(user),
+        ]
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:32]
+
+    def find(self, fingerprint):
+        """Stored report record of fingerprint, or None if it is not (or no longer) stored"""
+        report = self._get_collection().find_one({"_id": fingerprint})
+        if report is None or not self._get_store().exists(report["blob"]):
+            return None
+        return report
+
+    def lookup(self, food_entries, user):
+        """
+        The patient's current fingerprint and its stored report.
+
+        Returns:
+            tuple: (fingerprint, report record or None)
+        """
+        fingerprint = self.fingerprint(food_entries, user)
+        return fingerprint, self.find(fingerprint)
+
+    def get(self, food_entries, user):
+        """
+        The patient's current report record, rendered only if it is not stored yet.
+
+        Returns:
+            dict: {_id: fingerprint, patient_id, blob, size, created_at}, or
+                None when there is nothing to report
+        """
+        fingerprint, report = self.lookup(food_entries, user)
+        if report is not None:
+            self.hits += 1
+            return report
+        return self._flights.do(fingerprint, lambda: self._build(user.user_id, fingerprint))
+
+    def open(self, report):
+        """Binary file object of a stored report (FileNotFoundError if it was removed)"""
+        return self._get_store().open(report["blob"])
+
+    def temp_path(self, fingerprint):
+        """Private local file to render a report into before ``store``"""
+        return os.path.join(self._get_directory(),
+                            f"{fingerprint}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+    def store(self, patient_id, fingerprint, temp_path):
+        """Put a rendered report into the blob store, record it and drop the patient's older ones"""
+        blob = blob_key(temp_path)
+        size = os.path.getsize(temp_path)
+        store = self._get_store()
+        store.put(blob, temp_path)
+        report = {"patient_id": patient_id, "blob": blob, "size": size, "created_at": datetime.utcnow()}
+        previous = self._get_collection().find_one_and_update({"_id": fingerprint}, {"$set": report},
+                                                              upsert=True)
+        if previous and previous.get("blob") != blob:
+            store.delete(previous["blob"])  # Re-rendered after its blob went missing
+        self.renders += 1
+        self._remove_stale(patient_id, keep=fingerprint)
+        return {"_id": fingerprint, **report}
+
+    def _build(self, patient_id, fingerprint):
+        report = self.find(fingerprint)
+        if report is not None:
+            return report  # Stored by the flight that just finished, or by another instance
+        temp_path = self.temp_path(fingerprint)
+        try:
+            if self._render(patient_id, temp_path) is None:
+                return None
+            return self.store(patient_id, fingerprint, temp_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _remove_stale(self, patient_id, keep):
+        """Delete the patient's reports for earlier fingerprints"""
+        reports = self._get_collection()
+        stale = list(reports.find({"patient_id": patient_id, "_id": {"$ne": keep}}, {"blob": 1}))
+        if not stale:
+            return
+        reports.delete_many({"_id": {"$in": [report["_id"] for report in stale]}})
+        store = self._get_store()
+        for report in stale:
+            try:
+                store.delete(report["blob"])
+            except Exception as e:
+                logger.warning(f"Could not delete stale report {report['blob']}: {e}")
+
+    def stats(self):
+        return {'name': 'pdf_reports', 'store': self._get_store().name, 'hits': self.hits,
+                'renders': self.renders}
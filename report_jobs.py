@@ -0,0 +1,226 @@
+"""
+Background PDF Report Jobs
+
+ReportLab rendering is CPU-bound and holds the GIL, so a long history would
+tie up a request thread (and slow every other thread of the worker) for
+seconds. Renders run in a bounded process pool instead; the request only
+enqueues a job and the report viewer polls ``/api/reports/<job_id>``.
+
+A job is identified by the report fingerprint (see report_cache.py), and
+its state lives in the ``report_jobs`` collection so any worker can answer
+a status poll:
+
+    {_id: <fingerprint>, patient_id, status: "pending" | "done" | "failed",
+     error, owner, updated_at, expires_at}
+
+Inserting the job document is the deduplication: a second request for the
+same report (same worker or another one) finds the pending job and waits
+for it. Pending jobs whose owner has not finished them within ``timeout``
+seconds (the process died) are taken over by the next request.
+
+Limits: ``max_workers`` renders run at once per app process, and at most
+``max_pending`` jobs wait per app process; beyond that ``submit`` raises
+``ReportQueueFull``. With ``max_workers=0`` reports render in the request,
+as on serverless platforms that cannot keep a process pool.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+# How long finished job documents are kept for status polls
+JOB_RETENTION = timedelta(days=1)
+
+
+class ReportQueueFull(Exception):
+    """Too many report renders are waiting in this process"""
+
+
+class ReportJobQueue:
+    """Deduplicated report renders on a bounded process pool"""
+
+    def __init__(self, reports, get_collection, render, max_workers=2, max_pending=16, timeout=300,
+                 start_method='spawn'):
+        """
+        Args:
+            reports: ReportCache the rendered reports are stored in
+            get_collection: Callable returning the report_jobs collection
+            render: Picklable render(patient_id, path) -> path or None
+            max_workers: Render processes (0 renders in the caller)
+            max_pending: Jobs allowed to wait or run per process
+            timeout: Seconds after which an unfinished job is considered lost
+            start_method: multiprocessing start method of the pool
+        """
+        self.reports = reports
+        self._get_collection = get_collection
+        self._render = render
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.start_method = start_method
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.owner = uuid.uuid4().hex
+        self.submitted = 0
+        self.deduplicated = 0
+        self.failed = 0
+
+    def submit(self, food_entries, user):
+        """
+        Make sure user's current report is rendered or being rendered.
+
+        Returns:
+            dict: Job status (see ``status``)
+        Raises:
+            ReportQueueFull: This process already has max_pending jobs
+        """
+        fingerprint, report = self.reports.lookup(food_entries, user)
+        patient_id = user.user_id
+        if report is not None:
+            self._record(fingerprint, patient_id, DONE)
+            return self._public(fingerprint, DONE)
+        if self.max_workers <= 0:
+            report = self.reports.get(food_entries, user)
+            status = DONE if report else FAILED
+            self._record(fingerprint, patient_id, status, None if report else "Report generation failed")
+            return self._public(fingerprint, status)
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ReportQueueFull(f"{self._pending} report jobs already pending")
+            self._pending += 1
+        try:
+            if not self._claim(fingerprint, patient_id):
+                self.deduplicated += 1
+                with self._lock:
+                    self._pending -= 1
+                return self.status(fingerprint, patient_id)
+            temp_path = self.reports.temp_path(fingerprint)
+            future = self._get_executor().submit(self._render, patient_id, temp_path)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        self.submitted += 1
+        future.add_done_callback(lambda f: self._finish(f, fingerprint, patient_id, temp_path))
+        return self._public(fingerprint, PENDING)
+
+    def status(self, job_id, patient_id):
+        """
+        Status of one of patient_id's jobs, or None if there is no such job.
+
+        Returns:
+            dict: job_id, status ("pending", "done" or "failed") and error
+        """
+        doc = self._get_collection().find_one({"_id": job_id, "patient_id": patient_id})
+        if doc is None:
+            return None
+        status, error = doc.get("status"), doc.get("error")
+        if status == PENDING and self._is_lost(doc):
+            status, error = FAILED, "Report job timed out"
+        elif status == DONE and self.reports.find(job_id) is None:
+            status, error = FAILED, "Report is no longer stored"
+        return self._public(job_id, status, error)
+
+    def _claim(self, job_id, patient_id):
+        """Create the job document, or take over a failed or lost one; False if another job owns it"""
+        now = datetime.utcnow()
+        fields = {"patient_id": patient_id, "status": PENDING, "error": None, "owner": self.owner,
+                  "updated_at": now, "expires_at": now + JOB_RETENTION}
+        jobs = self._get_collection()
+        try:
+            jobs.insert_one({"_id": job_id, **fields})
+            return True
+        except DuplicateKeyError:
+            pass
+        # DONE is only taken over when the report is no longer stored (superseded or removed)
+        result = jobs.update_one(
+            {"_id": job_id, "$or": [
+                {"status": {"$in": [FAILED, DONE]}},
+                {"status": PENDING, "updated_at": {"$lt": now - timedelta(seconds=self.timeout)}},
+            ]},
+            {"$set": fields}
+        )
+        return result.modified_count == 1
+
+    def _finish(self, future, job_id, patient_id, temp_path):
+        """Pool callback: store the rendered report and record the outcome"""
+        error = None
+        try:
+            if future.result() is None:
+                error = "Report generation failed"
+            else:
+                self.reports.store(patient_id, job_id, temp_path)
+        except Exception as e:
+            error = f"Report generation failed: {e}"
+        finally:
+            with self._lock:
+                self._pending -= 1
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        if error:
+            self.failed += 1
+            logger.error(f"Report job {job_id} for {patient_id}: {error}")
+        self._record(job_id, patient_id, FAILED if error else DONE, error)
+
+    def _record(self, job_id, patient_id, status, error=None):
+        now = datetime.utcnow()
+        try:
+            self._get_collection().update_one(
+                {"_id": job_id},
+                {"$set": {"patient_id": patient_id, "status": status, "error": error,
+                          "updated_at": now, "expires_at": now + JOB_RETENTION}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to record report job {job_id}: {e}")
+
+    def _is_lost(self, doc):
+        updated_at = doc.get("updated_at") or datetime.min
+        return updated_at < datetime.utcnow() - timedelta(seconds=self.timeout)
+
+    @staticmethod
+    def _public(job_id, status, error=None):
+        return {"job_id": job_id, "status": status, "error": error}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method)
+                )
+            return self._executor
+
+    def after_fork(self):
+        """A forked child gets its own pool (the parent's processes belong to the parent)"""
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def stats(self):
+        with self._lock:
+            pending = self._pending
+        return {
+            'name': 'report_jobs',
+            'workers': self.max_workers,
+            'pending': pending,
+            'submitted': self.submitted,
+            'deduplicated': self.deduplicated,
+            'failed': self.failed,
+        }
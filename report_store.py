@@ -0,0 +1,116 @@
+"""
+Report Blob Stores
+
+Rendered PDF reports are immutable blobs keyed by the SHA-256 of their
+bytes (see report_cache.py for how a patient's current report is found).
+Two stores share one small interface, ``put`` / ``exists`` / ``open`` /
+``delete``:
+
+- ``GridFSReportStore`` keeps them in a GridFS bucket of the app database,
+  so every app instance can serve every report without re-rendering it.
+  GridFS writes the chunks first and the files document last, so a blob is
+  only visible once it is complete; reads fetch one chunk at a time.
+- ``LocalReportStore`` keeps them in a local directory (single node, or the
+  embedded SQLite store). A blob is moved into place with ``os.replace``.
+
+Because the key is the content hash, storing the same bytes twice is a
+no-op and a blob never changes once written.
+"""
+
+import hashlib
+import logging
+import os
+
+from gridfs import GridFSBucket
+from gridfs.errors import FileExists, NoFile
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_READ_SIZE = 64 * 1024
+
+
+def blob_key(path):
+    """SHA-256 hex digest of the file at path, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class LocalReportStore:
+    """Report blobs as files in one local directory"""
+
+    name = 'local'
+
+    def __init__(self, get_directory):
+        """
+        Args:
+            get_directory: Callable returning the (writable) blob directory
+        """
+        self._get_directory = get_directory
+
+    def _path(self, blob):
+        return os.path.join(self._get_directory(), f"{blob}.pdf")
+
+    def put(self, blob, path):
+        """Store the file at path under blob (the file is moved into place)"""
+        os.replace(path, self._path(blob))
+
+    def exists(self, blob):
+        return os.path.exists(self._path(blob))
+
+    def open(self, blob):
+        """Binary file object of the blob; FileNotFoundError if it is gone"""
+        return open(self._path(blob), "rb")
+
+    def delete(self, blob):
+        try:
+            os.remove(self._path(blob))
+        except OSError:
+            pass
+
+
+class GridFSReportStore:
+    """Report blobs in a GridFS bucket, shared by every app instance"""
+
+    name = 'gridfs'
+
+    def __init__(self, db, bucket_name='reports', chunk_size=255 * 1024):
+        """
+        Args:
+            db: pymongo Database holding the bucket
+            bucket_name: Bucket (collections <bucket_name>.files / .chunks)
+            chunk_size: Bytes per GridFS chunk, also the read granularity
+        """
+        self._files = db[f"{bucket_name}.files"]
+        self._bucket = GridFSBucket(db, bucket_name=bucket_name, chunk_size_bytes=chunk_size)
+
+    def put(self, blob, path):
+        """Upload the file at path under blob unless that content is already stored"""
+        if self.exists(blob):
+            return
+        try:
+            with open(path, "rb") as source:
+                self._bucket.upload_from_stream_with_id(blob, f"{blob}.pdf", source,
+                                                        metadata={"contentType": "application/pdf"})
+        except FileExists:
+            pass  # Same bytes uploaded concurrently
+
+    def exists(self, blob):
+        return self._files.find_one({"_id": blob}, {"_id": 1}) is not None
+
+    def open(self, blob):
+        """Seekable file object reading the blob chunk by chunk; FileNotFoundError if it is gone"""
+        try:
+            return self._bucket.open_download_stream(blob)
+        except NoFile as e:
+            raise FileNotFoundError(str(e)) from e
+
+    def delete(self, blob):
+        try:
+            self._bucket.delete(blob)
+        except NoFile:
+            pass
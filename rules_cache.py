@@ -0,0 +1,319 @@
+"""
+Ingredient Rules Cache
+
+Keeps the ``ingredient_rules`` collection in memory until it is told that
+something changed, instead of re-reading the whole collection on a timer.
+
+Invalidation sources, in order of preference:
+- a MongoDB change stream on ``ingredient_rules`` (replica sets / Atlas)
+- a version counter document in ``cache_versions`` that writers bump via
+  ``mark_rules_changed``; polled at most every ``poll_interval`` seconds
+
+Either way only the documents that changed are fetched and applied. Any
+iterable of change-stream-shaped events can be fed to ``watch`` (or to
+``apply_changes``) to drive the cache without a replica set.
+"""
+
+import logging
+import threading
+import time
+import uuid
+
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# _id of the counter document in the cache_versions collection
+RULES_VERSION_ID = 'ingredient_rules'
+
+# Number of deletion tombstones (and pending writes) kept on the counter document for pollers
+_MAX_TOMBSTONES = 200
+
+# Seconds a write may stay pending before pollers stop waiting for its writer
+PENDING_TIMEOUT = 60
+
+_RULE_PROJECTION = {"ingredient": 1, "harmful_for": 1, "alternative": 1, "rules_version": 1}
+
+
+def mark_rules_changed(rules_collection, versions_collection, ingredients=(), deleted=()):
+    """
+    Record that rules were written so polling caches pick them up.
+
+    Bumps the counter document and stamps the changed rule documents with the
+    new version. Deleted ingredients are kept as tombstones on the counter.
+    The bump also lists the write as pending (in the same update) until the
+    stamps and tombstones are in place; pollers do not move to a version
+    while writes are pending, so they cannot skip a change whose stamps are
+    not written yet.
+
+    Returns:
+        int: The new rules version
+    """
+    token = uuid.uuid4().hex
+    counter = versions_collection.find_one_and_update(
+        {"_id": RULES_VERSION_ID},
+        {"$inc": {"version": 1},
+         "$push": {"pending": {"$each": [{"token": token, "at": time.time()}], "$slice": -_MAX_TOMBSTONES}}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    version = counter["version"] if counter else 0
+
+    try:
+        ingredients = [i for i in ingredients if i]
+        if ingredients:
+            rules_collection.update_many(
+                {"ingredient": {"$in": list(ingredients)}},
+                {"$set": {"rules_version": version}}
+            )
+        if deleted:
+            versions_collection.update_one(
+                {"_id": RULES_VERSION_ID},
+                {"$push": {"deleted": {
+                    "$each": [{"ingredient": name, "version": version} for name in deleted],
+                    "$slice": -_MAX_TOMBSTONES,
+                }}}
+            )
+    finally:
+        # Publish: pollers may move to this version
+        versions_collection.update_one({"_id": RULES_VERSION_ID}, {"$pull": {"pending": {"token": token}}})
+    return version
+
+
+def has_pending_writes(counter, now=None):
+    """True while a mark_rules_changed is between its bump and its last write
+    (writers that have been pending for PENDING_TIMEOUT seconds are assumed dead)"""
+    now = time.time() if now is None else now
+    return any(entry.get("at", 0) > now - PENDING_TIMEOUT for entry in counter.get("pending") or [])
+
+
+def mark_rules_reset(versions_collection):
+    """Record a bulk rewrite of the rules; every cache reloads from scratch"""
+    versions_collection.update_one(
+        {"_id": RULES_VERSION_ID},
+        {"$inc": {"version": 1}, "$set": {"epoch": time.time(), "deleted": []}},
+        upsert=True
+    )
+
+
+class IngredientRulesCache:
+    """In-memory ingredient rules, refreshed incrementally on change"""
+
+    def __init__(self, poll_interval=30, use_change_stream=True):
+        self.poll_interval = poll_interval
+        self.use_change_stream = use_change_stream
+        self.version = 0              # bumped every time the local snapshot changes
+        self._rules = None            # lowercase ingredient -> rule document
+        self._names_by_id = {}        # document _id -> lowercase ingredient
+        self._remote_version = 0      # last counter value applied
+        self._epoch = None
+        self._last_poll = 0
+        self._collection = None
+        self._versions = None
+        self._watcher = None
+        self._watching = False
+        self._lock = threading.RLock()
+
+    def after_fork(self):
+        """Reset thread state in a forked child (the watcher thread does not survive fork)"""
+        self._lock = threading.RLock()
+        self._watcher = None
+        self._watching = False
+
+    def attach(self, rules_collection, versions_collection):
+        """Bind the cache to its collections and drop any previous snapshot"""
+        with self._lock:
+            self._collection = rules_collection
+            self._versions = versions_collection
+            self._rules = None
+            self._watching = False
+
+    @property
+    def watching(self):
+        """True while a change stream is delivering updates"""
+        return self._watching
+
+    def get(self):
+        """Return the current rules mapping, loading or refreshing as needed"""
+        if self._rules is None:
+            self._full_reload()
+        elif not self._watching and time.time() - self._last_poll >= self.poll_interval:
+            self._poll()
+        return self._rules if self._rules is not None else {}
+
+    def invalidate(self):
+        """Force a full reload on the next read"""
+        with self._lock:
+            self._rules = None
+
+    def _full_reload(self):
+        with self._lock:
+            if self._collection is None:
+                return
+            try:
+                counter = self._read_counter()
+                docs = list(self._collection.find({}, _RULE_PROJECTION))
+                rules = {}
+                names_by_id = {}
+                for doc in docs:
+                    name = (doc.get("ingredient") or "").lower()
+                    if name:
+                        rules[name] = doc
+                        names_by_id[doc.get("_id")] = name
+                self._names_by_id = names_by_id
+                self._rules = rules
+                # Rule contents are written before the bump, so the documents just read
+                # include every change up to this version (stamped or not)
+                self._remote_version = counter.get("version", 0)
+                self._epoch = counter.get("epoch")
+                self._last_poll = time.time()
+                self.version += 1
+                logger.info(f"Loaded {len(rules)} ingredient rules (version {self._remote_version})")
+            except Exception as e:
+                logger.error(f"Error loading ingredient rules: {e}")
+                if self._rules is None:
+                    self._rules = {}
+                self._last_poll = time.time()
+
+    def _read_counter(self):
+        if self._versions is None:
+            return {}
+        return self._versions.find_one({"_id": RULES_VERSION_ID}) or {}
+
+    def _poll(self):
+        """Check the version counter and fetch only the rules written since"""
+        with self._lock:
+            self._last_poll = time.time()
+            try:
+                counter = self._read_counter()
+            except Exception as e:
+                logger.error(f"Error polling ingredient rules version: {e}")
+                return
+
+            remote_version = counter.get("version", 0)
+            if counter.get("epoch") != self._epoch:
+                self._full_reload()
+                return
+            if remote_version <= self._remote_version:
+                return
+            if has_pending_writes(counter):
+                # Stamps of the newest change may be missing; look again shortly
+                self._last_poll = time.time() - self.poll_interval + min(self.poll_interval, 1)
+                return
+
+            try:
+                changed = list(self._collection.find(
+                    {"rules_version": {"$gt": self._remote_version}}, _RULE_PROJECTION
+                ))
+            except Exception as e:
+                logger.error(f"Error fetching changed ingredient rules: {e}")
+                return
+
+            events = [{"operationType": "replace", "fullDocument": doc} for doc in changed]
+            for tombstone in counter.get("deleted", []):
+                if tombstone.get("version", 0) > self._remote_version:
+                    events.append({"operationType": "delete", "ingredient": tombstone.get("ingredient")})
+            self.apply_changes(events)
+            self._remote_version = remote_version
+
+    def apply_changes(self, events):
+        """
+        Apply change-stream-shaped events to the snapshot.
+
+        Supported operationType values: insert, update, replace (with a
+        fullDocument), delete (documentKey or ingredient) and
+        drop/invalidate (forces a full reload).
+        """
+        with self._lock:
+            if self._rules is None:
+                return
+            rules = dict(self._rules)
+            names_by_id = dict(self._names_by_id)
+            changed = False
+
+            for event in events:
+                op = event.get("operationType")
+                if op in ("insert", "update", "replace"):
+                    doc = event.get("fullDocument")
+                    if not doc:
+                        continue
+                    name = (doc.get("ingredient") or "").lower()
+                    old_name = names_by_id.get(doc.get("_id"))
+                    if old_name and old_name != name:
+                        rules.pop(old_name, None)
+                    if name:
+                        rules[name] = doc
+                        names_by_id[doc.get("_id")] = name
+                    changed = True
+                elif op == "delete":
+                    doc_id = (event.get("documentKey") or {}).get("_id")
+                    if doc_id is not None:
+                        name = names_by_id.pop(doc_id, None)
+                    else:
+                        name = (event.get("ingredient") or "").lower()
+                        doc_id = (rules.get(name) or {}).get("_id")
+                        names_by_id.pop(doc_id, None)
+                    if name and rules.pop(name, None) is not None:
+                        changed = True
+                elif op in ("drop", "dropDatabase", "rename", "invalidate"):
+                    self._rules = None
+                    return
+
+            if changed:
+                self._rules = rules
+                self._names_by_id = names_by_id
+                self.version += 1
+
+    def watch(self, change_feed=None):
+        """
+        Start a background thread applying changes as they happen.
+
+        Args:
+            change_feed: Optional iterable of change events. Defaults to a
+                MongoDB change stream on the rules collection; if the server
+                does not support change streams the cache keeps polling.
+        """
+        if not self.use_change_stream and change_feed is None:
+            return
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._watcher = threading.Thread(
+            target=self._watch_loop, args=(change_feed,), name='rules-cache-watcher', daemon=True
+        )
+        self._watcher.start()
+
+    def _watch_loop(self, change_feed):
+        resume_token = None
+        retries = 0
+        while True:
+            try:
+                if change_feed is not None:
+                    stream = change_feed
+                else:
+                    stream = self._collection.watch(full_document='updateLookup', resume_after=resume_token)
+                self._watching = True
+                if resume_token is None:
+                    # Anything written before the stream opened must come from a reload
+                    self.invalidate()
+                for event in stream:
+                    self.apply_changes([event])
+                    resume_token = event.get("_id")
+                    retries = 0
+                if change_feed is not None:
+                    break
+            except (OperationFailure, NotImplementedError) as e:
+                # Standalone servers reject $changeStream; polling covers them
+                logger.warning(f"Ingredient rules change stream unavailable, polling instead: {e}")
+                break
+            except Exception as e:
+                retries += 1
+                if retries > 5:
+                    logger.error(f"Ingredient rules change stream failed, polling instead: {e}")
+                    break
+                logger.warning(f"Ingredient rules change stream interrupted, resuming: {e}")
+                time.sleep(min(2 ** retries, 30))
+            finally:
+                self._watching = False
@@ -0,0 +1,170 @@
+"""
+Single-Flight Coordination
+
+Makes sure an expensive computation for a given key runs once even when many
+callers ask for it at the same moment:
+
+- ``SingleFlight`` deduplicates callers inside one process with a table of
+  futures; the first caller (the leader) computes, the rest wait on it.
+- ``MongoLease`` extends this across workers/instances with a lease document
+  that expires on its own (TTL index on ``expires_at``) if the holder dies.
+  A holder working for longer than the TTL keeps it alive with
+  ``keep_alive``, so waiters never mistake slow work for a dead holder.
+"""
+
+import hashlib
+import logging
+import threading
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """In-process deduplication of concurrent calls by key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def claim(self, key):
+        """
+        Join the flight for a key.
+
+        Returns:
+            tuple: (future, is_leader). The leader must call ``complete`` for
+            the key exactly once; everyone else waits on the future.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            return future, True
+
+    def complete(self, key, result=None, error=None):
+        """Publish the leader's outcome and close the flight"""
+        with self._lock:
+            future = self._calls.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, timeout=None):
+        """Call fn() once per concurrent key and share its result with all callers"""
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result(timeout=timeout)
+        try:
+            result = fn()
+        except BaseException as e:
+            self.complete(key, error=e)
+            raise
+        self.complete(key, result=result)
+        return result
+
+    def in_flight(self):
+        """Number of keys currently being computed"""
+        with self._lock:
+            return len(self._calls)
+
+
+class MongoLease:
+    """Cross-worker mutual exclusion backed by lease documents with a TTL"""
+
+    def __init__(self, collection, ttl_seconds=60):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.owner = uuid.uuid4().hex
+
+    @staticmethod
+    def lease_id(*parts):
+        """Stable, bounded-length lease _id for an arbitrary key"""
+        raw = '\x1f'.join(str(p) for p in parts)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def acquire(self, lease_id):
+        """Try to take the lease; returns True if this process now holds it"""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl_seconds)
+        try:
+            self.collection.insert_one({"_id": lease_id, "owner": self.owner, "expires_at": expires_at})
+            return True
+        except DuplicateKeyError:
+            pass
+        except Exception as e:
+            # Without a working lease store fall back to uncoordinated work
+            logger.warning(f"Lease store unavailable, proceeding without lease: {e}")
+            return True
+
+        # The TTL monitor only runs about once a minute; take over stale leases ourselves
+        try:
+            result = self.collection.update_one(
+                {"_id": lease_id, "expires_at": {"$lt": now}},
+                {"$set": {"owner": self.owner, "expires_at": expires_at}}
+            )
+            return result.modified_count == 1
+        except Exception:
+            return False
+
+    def is_held(self, lease_id):
+        """True while some live holder owns the lease"""
+        try:
+            doc = self.collection.find_one({"_id": lease_id}, {"expires_at": 1})
+        except Exception:
+            return False
+        return doc is not None and doc.get("expires_at", datetime.min) > datetime.utcnow()
+
+    def renew(self, lease_id):
+        """Push the expiry of a lease this process holds another TTL out; False if it lost it"""
+        try:
+            result = self.collection.update_one(
+                {"_id": lease_id, "owner": self.owner},
+                {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=self.ttl_seconds)}}
+            )
+            return result.matched_count == 1
+        except Exception as e:
+            logger.warning(f"Failed to renew lease {lease_id}: {e}")
+            return False
+
+    @contextmanager
+    def keep_alive(self, lease_id, max_seconds=None):
+        """
+        Renew a held lease every third of its TTL until the block exits.
+
+        Renewal stops after max_seconds (default: 10 TTLs), so a holder stuck
+        for good still lets the lease expire and someone else take over.
+        """
+        stop = threading.Event()
+        interval = max(self.ttl_seconds / 3, 0.01)
+        deadline = datetime.utcnow() + timedelta(seconds=max_seconds or self.ttl_seconds * 10)
+
+        def heartbeat():
+            while not stop.wait(interval) and datetime.utcnow() < deadline:
+                if not self.renew(lease_id):
+                    return
+
+        thread = threading.Thread(target=heartbeat, name='lease-keep-alive', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+
+    def release(self, lease_id):
+        """Drop the lease if this process still owns it"""
+        try:
+            self.collection.delete_one({"_id": lease_id, "owner": self.owner})
+        except Exception as e:
+            logger.warning(f"Failed to release lease {lease_id}: {e}")
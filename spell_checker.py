@@ -3,11 +3,15 @@ Spell Checker Service for Recipe Names
 
 Uses Python's built-in difflib for fuzzy matching - NO external dependencies!
 Optimized for Vercel serverless deployment (lightweight).
+An n-gram index (fuzzy_index.py) shortlists candidates so difflib only
+scores a few dozen names per query, however many recipes are loaded.
 """
 
 import os
 import logging
-from difflib import SequenceMatcher, get_close_matches
+from difflib import SequenceMatcher
+from fuzzy_index import build_ngram_index
+from memory_cache import LRUCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,8 +24,10 @@ class SpellChecker:
     def __init__(self):
         self.recipes = []
         self.recipes_lower = []
+        self._index = None  # NGramIndex over recipes_lower
         self._loaded = False
         self._load_attempted = False
+        self._results = LRUCache(max_entries=4096, name='spell_checker')  # Recent check_spelling results
     
     def _ensure_loaded(self):
         """Lazy load recipes on first use"""
@@ -48,6 +54,7 @@ class SpellChecker:
             # Skip header, get recipe names
             self.recipes = [line.strip() for line in lines[1:] if line.strip()]
             self.recipes_lower = [r.lower() for r in self.recipes]
+            self._index = build_ngram_index(self.recipes_lower)
             
             logger.info(f"Loaded {len(self.recipes)} recipe names")
             self._loaded = True
@@ -74,14 +81,19 @@ class SpellChecker:
         text_lower = text.strip().lower()
         
         # Exact match check
-        if text_lower in self.recipes_lower:
+        if text_lower in self._index:
             return {"is_correct": True, "suggestions": []}
         
+        # Keystroke-driven callers repeat the same prefixes; reuse earlier answers
+        cache_key = (text_lower, threshold, top_n)
+        cached = self._results.get(cache_key)
+        if cached is not None:
+            return {"is_correct": cached["is_correct"], "suggestions": list(cached["suggestions"])}
+        
         try:
-            # Use difflib's get_close_matches for fuzzy matching
-            matches = get_close_matches(
+            # Fuzzy matching with difflib scores over an n-gram shortlist
+            matches = self._index.get_close_matches(
                 text_lower, 
-                self.recipes_lower, 
                 n=top_n, 
                 cutoff=threshold
             )
@@ -89,7 +101,7 @@ class SpellChecker:
             # Map back to original case
             suggestions = []
             for match in matches:
-                idx = self.recipes_lower.index(match)
+                idx = self._index.index_of(match)
                 suggestions.append(self.recipes[idx])
             
             # Check if top match is very close (>90% similar)
@@ -98,10 +110,12 @@ class SpellChecker:
                 ratio = SequenceMatcher(None, text_lower, matches[0]).ratio()
                 is_correct = ratio > 0.9
             
-            return {
+            result = {
                 "is_correct": bool(is_correct),
                 "suggestions": suggestions
             }
+            self._results.set(cache_key, result)
+            return {"is_correct": result["is_correct"], "suggestions": list(suggestions)}
             
         except Exception as e:
             logger.error(f"Spell check error: {e}")
@@ -0,0 +1,1406 @@
+"""
+Embedded SQLite Storage Backend
+
+A stand-in for a pymongo ``Database`` backed by a single SQLite file in WAL
+mode, for single-node and edge deployments that opt in with
+``STORAGE_BACKEND=sqlite``. Local reads need no network hop.
+
+The storage interface is the subset of the pymongo collection API the app
+uses:
+
+    find / find_one (filter, projection, sort, skip, limit, collation)
+    insert_one / insert_many, update_one / update_many, replace_one,
+    find_one_and_update, delete_one / delete_many, bulk_write,
+    count_documents, distinct, aggregate, create_index / create_indexes
+
+with the same result and error types (``UpdateResult``, ``DuplicateKeyError``,
+``BulkWriteError``, ...). Change streams are not supported; ``watch`` raises
+NotImplementedError and the rules cache keeps polling.
+
+Each collection is a table of (id, doc) rows, the document stored as JSON
+(ObjectIds and datetimes tagged like extended JSON). Registered indexes
+(db_indexes.py) become SQLite expression indexes on ``json_extract``. Query
+conditions on top-level fields that SQL can evaluate (equality, ``$in``,
+ranges, ``$exists``/``$type``) are pushed down to use them. A Python matcher
+then applies the full filter to the candidate rows. Sorts on indexed fields
+are pushed down too, which assumes the field holds one type across the
+collection, as all of the app's sorted fields do. Fields that have ever held
+an array are recorded and never pushed down, because MongoDB matches
+equality against array elements. Aggregation pipelines run in Python over
+the rows their leading ``$match`` selects.
+
+A ``find()`` cursor whose sort is pushed down (or that has no sort) reads
+its rows as they are consumed, in a read transaction on a connection of
+its own, so large results are never held in memory and the thread can keep
+writing meanwhile. Sorts that run in Python materialize the matching rows.
+"""
+
+import base64
+import copy
+import itertools
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import DeleteMany, DeleteOne, IndexModel, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import (BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult,
+                             UpdateResult)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds between TTL sweeps of a collection (MongoDB's TTL monitor runs every 60s)
+TTL_SWEEP_INTERVAL = 60
+
+# Idle snapshot connections kept per database for streaming cursors
+_IDLE_READERS = 4
+
+_MISSING = object()
+
+
+# --- Document encoding ------------------------------------------------------
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, bytes):
+        return {"$binary": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Cannot store value of type {type(value).__name__}")
+
+
+def _object_hook(obj):
+    if len(obj) == 1:
+        if "$oid" in obj:
+            return ObjectId(obj["$oid"])
+        if "$date" in obj:
+            return datetime.fromisoformat(obj["$date"])
+        if "$binary" in obj:
+            return base64.b64decode(obj["$binary"])
+    return obj
+
+
+def _dumps(value):
+    return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False)
+
+
+def _loads(text):
+    return json.loads(text, object_hook=_object_hook)
+
+
+def _id_key(value):
+    """Primary-key text of an _id (order of ObjectIds matches MongoDB's)"""
+    return json.dumps(value, default=_default, separators=(",", ":"), sort_keys=True)
+
+
+# --- Values, comparison and paths ------------------------------------------
+
+def _type_name(value):
+    """BSON type alias of a Python value, as $type reports it"""
+    if value is _MISSING:
+        return "missing"
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int" if -2 ** 31 <= value < 2 ** 31 else "long"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, (list, tuple)):
+        return "array"
+    if isinstance(value, ObjectId):
+        return "objectId"
+    if isinstance(value, datetime):
+        return "date"
+    if isinstance(value, re.Pattern):
+        return "regex"
+    return type(value).__name__
+
+
+_NUMBER_TYPES = ("int", "long", "double")
+
+# MongoDB's cross-type sort order
+_TYPE_RANK = {"missing": 1, "null": 1, "int": 2, "long": 2, "double": 2, "string": 3,
+              "object": 4, "array": 5, "objectId": 7, "bool": 8, "date": 9, "regex": 11}
+
+
+def _sort_key(value, fold=None):
+    name = _type_name(value)
+    rank = _TYPE_RANK.get(name, 12)
+    if rank == 1:
+        return (rank, 0)
+    if name == "string":
+        return (rank, fold(value) if fold else value)
+    if name in ("object", "array"):
+        return (rank, _dumps(value))
+    if name == "objectId":
+        return (rank, value.binary)
+    if name == "date" and value.tzinfo is not None:
+        return (rank, value.replace(tzinfo=None) - value.utcoffset())
+    return (rank, value)
+
+
+def _compare(a, b, fold=None):
+    """-1/0/1 in MongoDB's cross-type order"""
+    ka, kb = _sort_key(a, fold), _sort_key(b, fold)
+    return (ka > kb) - (ka < kb)
+
+
+def _fold_for(collation):
+    """Case-folding function for a collation with strength 1 or 2, else None"""
+    if collation is None:
+        return None
+    document = getattr(collation, "document", collation)
+    return str.casefold if document.get("strength", 3) <= 2 else None
+
+
+def _split(path):
+    return path.split(".")
+
+
+def _get(doc, path):
+    """Value at a dotted path, _MISSING if absent; arrays of subdocuments fan out"""
+    value = doc
+    for part in _split(path):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list):
+            if part.isdigit():
+                index = int(part)
+                value = value[index] if index < len(value) else _MISSING
+            else:
+                found = [item.get(part, _MISSING) for item in value if isinstance(item, dict)]
+                found = [item for item in found if item is not _MISSING]
+                value = found if found else _MISSING
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _set(doc, path, value):
+    parts = _split(path)
+    target = doc
+    for part in parts[:-1]:
+        if isinstance(target, list) and part.isdigit():
+            target = target[int(part)]
+            continue
+        if not isinstance(target.get(part), (dict, list)):
+            target[part] = {}
+        target = target[part]
+    if isinstance(target, list) and parts[-1].isdigit():
+        target[int(parts[-1])] = value
+    else:
+        target[parts[-1]] = value
+
+
+def _with(doc, path, value):
+    """Copy of doc with path set; stages never modify their input documents"""
+    result = copy.copy(doc)
+    head = _split(path)[0]
+    if head != path and head in result:
+        result[head] = copy.deepcopy(result[head])
+    _set(result, path, value)
+    return result
+
+
+def _unset(doc, path):
+    parts = _split(path)
+    target = doc
+    for part in parts[:-1]:
+        target = target.get(part) if isinstance(target, dict) else None
+        if target is None:
+            return
+    if isinstance(target, dict):
+        target.pop(parts[-1], None)
+
+
+# --- Query matching ----------------------------------------------------------
+
+def _values_equal(a, b, fold):
+    if isinstance(a, bool) != isinstance(b, bool):
+        return False
+    if fold and isinstance(a, str) and isinstance(b, str):
+        return fold(a) == fold(b)
+    return a == b
+
+
+def _equals(value, target, fold):
+    """Equality as a query sees it: missing equals null, arrays match an element"""
+    if value is _MISSING:
+        return target is None
+    if isinstance(target, re.Pattern):
+        return _regex(value, target)
+    if _values_equal(value, target, fold):
+        return True
+    return isinstance(value, list) and any(_values_equal(item, target, fold) for item in value)
+
+
+def _regex(value, pattern, options=""):
+    if not isinstance(pattern, re.Pattern):
+        flags = 0
+        for option, flag in (("i", re.I), ("m", re.M), ("s", re.S), ("x", re.X)):
+            if option in (options or ""):
+                flags |= flag
+        pattern = re.compile(pattern, flags)
+    if isinstance(value, list):
+        return any(isinstance(item, str) and pattern.search(item) for item in value)
+    return isinstance(value, str) and pattern.search(value) is not None
+
+
+def _range(value, op, target, fold):
+    """$gt/$gte/$lt/$lte within one type bracket (numbers with numbers, ...)"""
+    candidates = value if isinstance(value, list) else [value]
+    for item in candidates:
+        if item is _MISSING:
+            continue
+        a, b = _sort_key(item, fold), _sort_key(target, fold)
+        if a[0] != b[0]:
+            continue
+        if ((op == "$gt" and a > b) or (op == "$gte" and a >= b) or
+                (op == "$lt" and a < b) or (op == "$lte" and a <= b)):
+            return True
+    return False
+
+
+def _type_matches(value, wanted):
+    wanted = wanted if isinstance(wanted, list) else [wanted]
+    candidates = [value] + (value if isinstance(value, list) else [])
+    for item in candidates:
+        name = _type_name(item)
+        for alias in wanted:
+            if alias == name or (alias == "number" and name in _NUMBER_TYPES):
+                return True
+    return False
+
+
+def _match_condition(value, condition, fold):
+    if not (isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition)):
+        return _equals(value, condition, fold)
+    for op, target in condition.items():
+        if op == "$eq":
+            ok = _equals(value, target, fold)
+        elif op == "$ne":
+            ok = not _equals(value, target, fold)
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            ok = _range(value, op, target, fold)
+        elif op == "$in":
+            ok = any(_equals(value, item, fold) for item in target)
+        elif op == "$nin":
+            ok = not any(_equals(value, item, fold) for item in target)
+        elif op == "$exists":
+            ok = (value is not _MISSING) == bool(target)
+        elif op == "$type":
+            ok = value is not _MISSING and _type_matches(value, target)
+        elif op == "$regex":
+            ok = _regex(value, target, condition.get("$options", ""))
+        elif op == "$options":
+            ok = True
+        elif op == "$size":
+            ok = isinstance(value, list) and len(value) == target
+        elif op == "$all":
+            ok = all(_equals(value, item, fold) for item in target)
+        elif op == "$elemMatch":
+            ok = isinstance(value, list) and any(
+                _matches(item, target, fold) if isinstance(item, dict) else _match_condition(item, target, fold)
+                for item in value)
+        elif op == "$not":
+            ok = not _match_condition(value, target, fold)
+        else:
+            raise OperationFailure(f"unknown operator: {op}")
+        if not ok:
+            return False
+    return True
+
+
+def _matches(doc, query, fold=None):
+    """True if doc satisfies a MongoDB query filter"""
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            ok = all(_matches(doc, part, fold) for part in condition)
+        elif key == "$or":
+            ok = any(_matches(doc, part, fold) for part in condition)
+        elif key == "$nor":
+            ok = not any(_matches(doc, part, fold) for part in condition)
+        elif key == "$expr":
+            ok = bool(_evaluate(condition, doc))
+        elif key == "$comment":
+            ok = True
+        elif key.startswith("$"):
+            raise OperationFailure(f"unknown top level operator: {key}")
+        else:
+            ok = _match_condition(_get(doc, key), condition, fold)
+        if not ok:
+            return False
+    return True
+
+
+# --- Updates and projections -------------------------------------------------
+
+def _is_operator_update(update):
+    return any(key.startswith("$") for key in update)
+
+
+def _apply_update(doc, update, inserting=False):
+    """Apply update operators (or a replacement document) to doc in place"""
+    if not _is_operator_update(update):
+        doc_id = doc.get("_id", _MISSING)
+        doc.clear()
+        doc.update(copy.deepcopy(update))
+        if doc_id is not _MISSING:
+            doc["_id"] = doc_id
+        return
+    for op, fields in update.items():
+        for path, value in fields.items():
+            if op == "$set":
+                _set(doc, path, copy.deepcopy(value))
+            elif op == "$setOnInsert":
+                if inserting:
+                    _set(doc, path, copy.deepcopy(value))
+            elif op == "$unset":
+                _unset(doc, path)
+            elif op == "$inc":
+                current = _get(doc, path)
+                _set(doc, path, (0 if current in (_MISSING, None) else current) + value)
+            elif op in ("$min", "$max"):
+                current = _get(doc, path)
+                better = _compare(value, current) < 0 if op == "$min" else _compare(value, current) > 0
+                if current is _MISSING or better:
+                    _set(doc, path, copy.deepcopy(value))
+            elif op in ("$push", "$addToSet"):
+                current = _get(doc, path)
+                items = list(current) if isinstance(current, list) else []
+                spec = value if isinstance(value, dict) and "$each" in value else {"$each": [value]}
+                for item in spec["$each"]:
+                    if op == "$push" or item not in items:
+                        items.append(copy.deepcopy(item))
+                if "$slice" in spec:
+                    limit = spec["$slice"]
+                    items = items[limit:] if limit < 0 else items[:limit]
+                _set(doc, path, items)
+            elif op == "$pull":
+                current = _get(doc, path)
+                if isinstance(current, list):
+                    _set(doc, path, [item for item in current if not (
+                        _matches(item, value) if isinstance(value, dict) and isinstance(item, dict)
+                        else _match_condition(item, value, None))])
+            elif op == "$currentDate":
+                _set(doc, path, datetime.utcnow())
+            else:
+                raise OperationFailure(f"Unknown modifier: {op}")
+
+
+def _upsert_document(query, update):
+    """The document an upsert inserts: the filter's equality fields plus the update"""
+    doc = {}
+
+    def seed(part):
+        for key, condition in part.items():
+            if key == "$and":
+                for sub in condition:
+                    seed(sub)
+            elif key.startswith("$"):
+                continue
+            elif isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+                if "$eq" in condition:
+                    _set(doc, key, copy.deepcopy(condition["$eq"]))
+            else:
+                _set(doc, key, copy.deepcopy(condition))
+
+    if _is_operator_update(update):
+        seed(query)
+        _apply_update(doc, update, inserting=True)
+    else:
+        doc = copy.deepcopy(update)
+        if "_id" not in doc and "_id" in query and not isinstance(query["_id"], dict):
+            doc["_id"] = query["_id"]
+    doc.setdefault("_id", ObjectId())
+    return doc
+
+
+def _project(doc, projection):
+    """Apply a find() projection (inclusion or exclusion)"""
+    if not projection:
+        return doc
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include = {k for k, v in projection.items() if k != "_id" and v}
+    if include:
+        result = {}
+        for path in include:
+            value = _get(doc, path)
+            if value is not _MISSING:
+                _set(result, path, value)
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    result = copy.copy(doc)
+    for path, value in projection.items():
+        if not value:
+            head = _split(path)[0]
+            if head != path and head in result:
+                result[head] = copy.deepcopy(result[head])
+            _unset(result, path)
+    return result
+
+
+def _sort_docs(docs, sort, fold=None):
+    for field, direction in reversed(sort):
+        docs.sort(key=lambda doc, f=field: _sort_key(_get(doc, f), fold), reverse=direction < 0)
+    return docs
+
+
+def _sort_spec(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return [(item, 1) if isinstance(item, str) else tuple(item) for item in key_or_list]
+
+
+# --- Aggregation expressions -------------------------------------------------
+
+def _evaluate(expr, doc, root=None):
+    """Value of an aggregation expression for doc"""
+    root = doc if root is None else root
+    if isinstance(expr, str) and expr.startswith("$"):
+        if expr.startswith("$$"):
+            name, _, path = expr[2:].partition(".")
+            if name not in ("ROOT", "CURRENT"):
+                raise OperationFailure(f"Use of undefined variable: {name}")
+            base = root if name == "ROOT" else doc
+            return _get(base, path) if path else base
+        return _get(doc, expr[1:])
+    if isinstance(expr, list):
+        return [_value(_evaluate(item, doc, root)) for item in expr]
+    if isinstance(expr, dict):
+        if len(expr) == 1:
+            op, args = next(iter(expr.items()))
+            if op.startswith("$"):
+                return _operator(op, args, doc, root)
+        return {key: _value(_evaluate(value, doc, root)) for key, value in expr.items()}
+    return expr
+
+
+def _value(value):
+    return None if value is _MISSING else value
+
+
+def _args(args, doc, root):
+    return [_evaluate(arg, doc, root) for arg in (args if isinstance(args, list) else [args])]
+
+
+def _convert(value, to, on_error, on_null):
+    if value in (_MISSING, None):
+        return on_null
+    try:
+        if to in ("int", "long"):
+            if isinstance(value, str):
+                return int(value.strip())
+            if isinstance(value, datetime):
+                return int(value.timestamp() * 1000)
+            return int(value)
+        if to in ("double", "decimal"):
+            return float(value)
+        if to == "string":
+            return value.isoformat() if isinstance(value, datetime) else str(value)
+        if to == "bool":
+            return bool(value)
+        if to == "objectId":
+            return value if isinstance(value, ObjectId) else ObjectId(value)
+        if to == "date":
+            return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    except (TypeError, ValueError, OverflowError):
+        if on_error is not _MISSING:
+            return on_error
+        raise OperationFailure(f"Failed to convert {value!r} to {to}")
+    raise OperationFailure(f"Unsupported $convert target: {to}")
+
+
+def _date_to_string(fmt, value):
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None) - value.utcoffset()
+    return value.strftime(fmt.replace("%L", f"{value.microsecond // 1000:03d}"))
+
+
+def _operator(op, args, doc, root):
+    if op == "$literal":
+        return args
+    if op == "$cond":
+        if isinstance(args, dict):
+            args = [args["if"], args["then"], args["else"]]
+        return _evaluate(args[1] if _truthy(_evaluate(args[0], doc, root)) else args[2], doc, root)
+    if op == "$ifNull":
+        values = _args(args, doc, root)
+        for value in values[:-1]:
+            if value not in (_MISSING, None):
+                return value
+        return _value(values[-1])
+    if op == "$convert":
+        return _convert(_evaluate(args["input"], doc, root), args["to"],
+                        _value(_evaluate(args["onError"], doc, root)) if "onError" in args else _MISSING,
+                        _value(_evaluate(args["onNull"], doc, root)) if "onNull" in args else None)
+    if op in ("$toInt", "$toLong", "$toDouble", "$toString", "$toBool", "$toDate", "$toObjectId"):
+        to = {"$toInt": "int", "$toLong": "long", "$toDouble": "double", "$toString": "string",
+              "$toBool": "bool", "$toDate": "date", "$toObjectId": "objectId"}[op]
+        return _convert(_args(args, doc, root)[0], to, _MISSING, None)
+    if op == "$dateToString":
+        return _date_to_string(args.get("format", "%Y-%m-%dT%H:%M:%S.%LZ"), _evaluate(args["date"], doc, root))
+    if op == "$trim":
+        value = _evaluate(args["input"], doc, root)
+        chars = _evaluate(args["chars"], doc, root) if "chars" in args else None
+        return value.strip(chars) if isinstance(value, str) else None
+
+    values = _args(args, doc, root)
+    if op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$cmp"):
+        result = _compare(_value(values[0]), _value(values[1]))
+        return {"$eq": result == 0, "$ne": result != 0, "$gt": result > 0, "$gte": result >= 0,
+                "$lt": result < 0, "$lte": result <= 0, "$cmp": result}[op]
+    if op == "$and":
+        return all(_truthy(value) for value in values)
+    if op == "$or":
+        return any(_truthy(value) for value in values)
+    if op == "$not":
+        return not _truthy(values[0])
+    if op == "$type":
+        return _type_name(values[0])
+    if op == "$isArray":
+        return isinstance(values[0], list)
+    if op == "$size":
+        if not isinstance(values[0], list):
+            raise OperationFailure("The argument to $size must be an array")
+        return len(values[0])
+    if op in ("$toLower", "$toUpper"):
+        value = _value(values[0])
+        text = "" if value is None else str(value)
+        return text.lower() if op == "$toLower" else text.upper()
+    if op == "$concat":
+        if any(value in (_MISSING, None) for value in values):
+            return None
+        return "".join(values)
+    if op in ("$add", "$sum"):
+        if op == "$sum" and len(values) == 1 and isinstance(values[0], list):
+            values = values[0]
+        return sum(value for value in values if _is_number(value))
+    if op == "$subtract":
+        return _value(values[0]) - _value(values[1])
+    if op == "$multiply":
+        result = 1
+        for value in values:
+            result *= value
+        return result
+    if op == "$divide":
+        return values[0] / values[1]
+    if op == "$arrayElemAt":
+        array, index = values
+        return array[index] if isinstance(array, list) and -len(array) <= index < len(array) else _MISSING
+    if op in ("$min", "$max"):
+        candidates = [value for value in (values[0] if len(values) == 1 and isinstance(values[0], list)
+                                          else values) if value not in (_MISSING, None)]
+        if not candidates:
+            return None
+        pick = min if op == "$min" else max
+        return pick(candidates, key=_sort_key)
+    raise OperationFailure(f"Unrecognized expression '{op}'")
+
+
+def _truthy(value):
+    """Aggregation truthiness: only false, null, missing and zero are false"""
+    if value is _MISSING or value is None or value is False:
+        return False
+    return not (_is_number(value) and value == 0)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+# --- Aggregation stages ------------------------------------------------------
+
+def _group(docs, spec):
+    groups = {}
+    for doc in docs:
+        key = _value(_evaluate(spec["_id"], doc))
+        slot = groups.setdefault(_id_key(key), {"_id": key, "_docs": []})
+        slot["_docs"].append(doc)
+    results = []
+    for slot in groups.values():
+        row = {"_id": slot["_id"]}
+        members = slot["_docs"]
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (op, expr), = accumulator.items()
+            values = [_evaluate(expr, doc) for doc in members]
+            if op == "$sum":
+                row[field] = sum(value for value in values if _is_number(value))
+            elif op == "$avg":
+                numbers = [value for value in values if _is_number(value)]
+                row[field] = sum(numbers) / len(numbers) if numbers else None
+            elif op == "$first":
+                row[field] = _value(values[0]) if values else None
+            elif op == "$last":
+                row[field] = _value(values[-1]) if values else None
+            elif op in ("$min", "$max"):
+                present = [value for value in values if value not in (_MISSING, None)]
+                pick = min if op == "$min" else max
+                row[field] = pick(present, key=_sort_key) if present else None
+            elif op == "$push":
+                row[field] = [_value(value) for value in values if value is not _MISSING]
+            elif op == "$addToSet":
+                unique = {}
+                for value in values:
+                    if value is not _MISSING:
+                        unique.setdefault(_id_key(value), value)
+                row[field] = list(unique.values())
+            elif op == "$count":
+                row[field] = len(members)
+            else:
+                raise OperationFailure(f"unknown group operator '{op}'")
+        results.append(row)
+    return results
+
+
+def _project_stage(docs, spec):
+    flags = {k: bool(v) for k, v in spec.items() if isinstance(v, (bool, int, float))}
+    include = {k for k, v in flags.items() if v and k != "_id"}
+    computed = {k: v for k, v in spec.items() if k not in flags}
+    exclusion = not include and not computed
+    results = []
+    for doc in docs:
+        if exclusion:
+            results.append(_project(doc, spec))
+            continue
+        row = {}
+        if spec.get("_id", 1) not in (0, False) and "_id" in doc and "_id" not in computed:
+            row["_id"] = doc["_id"]
+        for path in include:
+            value = _get(doc, path)
+            if value is not _MISSING:
+                _set(row, path, value)
+        for path, expr in computed.items():
+            value = _evaluate(expr, doc)
+            if value is not _MISSING:
+                _set(row, path, value)
+        results.append(row)
+    return results
+
+
+def _unwind(docs, spec):
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"][1:]
+    preserve = spec.get("preserveNullAndEmptyArrays", False)
+    results = []
+    for doc in docs:
+        value = _get(doc, path)
+        if isinstance(value, list) and value:
+            results.extend(_with(doc, path, item) for item in value)
+        elif isinstance(value, list) or value in (_MISSING, None):
+            if preserve:
+                results.append(doc)
+        else:
+            results.append(doc)
+    return results
+
+
+def run_pipeline(docs, pipeline, fold=None):
+    """Run aggregation stages over an iterable of documents"""
+    docs = list(docs)
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            docs = [doc for doc in docs if _matches(doc, spec, fold)]
+        elif name == "$project":
+            docs = _project_stage(docs, spec)
+        elif name in ("$addFields", "$set"):
+            new_docs = []
+            for doc in docs:
+                for path, expr in spec.items():
+                    doc = _with(doc, path, _value(_evaluate(expr, doc)))
+                new_docs.append(doc)
+            docs = new_docs
+        elif name == "$unset":
+            paths = [spec] if isinstance(spec, str) else spec
+            docs = [_project(doc, {path: 0 for path in paths}) for doc in docs]
+        elif name == "$group":
+            docs = _group(docs, spec)
+        elif name == "$sort":
+            docs = _sort_docs(list(docs), list(spec.items()), fold)
+        elif name == "$skip":
+            docs = docs[spec:]
+        elif name == "$limit":
+            docs = docs[:spec]
+        elif name == "$unwind":
+            docs = _unwind(docs, spec)
+        elif name in ("$replaceRoot", "$replaceWith"):
+            expr = spec["newRoot"] if name == "$replaceRoot" else spec
+            new_docs = []
+            for doc in docs:
+                root = _evaluate(expr, doc)
+                if not isinstance(root, dict):
+                    raise OperationFailure(f"'newRoot' expression must evaluate to an object, got {root!r}")
+                new_docs.append(root)
+            docs = new_docs
+        elif name == "$count":
+            docs = [{spec: len(docs)}] if docs else []
+        elif name == "$facet":
+            docs = [{field: run_pipeline(docs, sub, fold) for field, sub in spec.items()}]
+        else:
+            raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'")
+    return docs
+
+
+# --- SQL pushdown ------------------------------------------------------------
+
+_SAFE_FIELD = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _column(field):
+    """SQL expression for a top-level field, identical in indexes and queries"""
+    if field == "_id":
+        return "id"
+    return f"json_extract(doc, '$.{field}')"
+
+
+def _sql_param(value, fold):
+    """(SQL parameter, use NOCASE) for a value SQL compares like MongoDB, or None"""
+    if isinstance(value, bool):
+        return None  # JSON true/false come back as 1/0 and would also match numbers
+    if isinstance(value, (int, float)):
+        return value, False
+    if isinstance(value, str):
+        if fold is None:
+            return value, False
+        # NOCASE folds ASCII only; anything else is left to the Python matcher
+        return (value, True) if value.isascii() else None
+    if isinstance(value, datetime) and value.tzinfo is None:
+        # Naive ISO timestamps order correctly as text, inside the same JSON wrapper
+        return _dumps(value), False
+    return None
+
+
+_SQL_OPS = {"$eq": "=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+_SQL_TYPES = {"string": ("text",), "object": ("object",), "array": ("array",), "null": ("null",),
+              "bool": ("true", "false"), "double": ("real",), "int": ("integer",), "long": ("integer",),
+              "number": ("integer", "real")}
+
+
+def _field_sql(field, condition, fold, multikey):
+    """SQL clauses (a superset of the matches) for one field condition"""
+    if not _SAFE_FIELD.match(field) or field in multikey:
+        return []
+    operators = condition if (isinstance(condition, dict) and condition and
+                              all(k.startswith("$") for k in condition)) else {"$eq": condition}
+    clauses = []
+    if field == "_id":
+        for op, value in operators.items():
+            values = value if op == "$in" and isinstance(value, list) else [value]
+            if op not in ("$eq", "$in") and not (op in _SQL_OPS and isinstance(value, ObjectId)):
+                continue
+            if not values or any(isinstance(v, (dict, list)) or (fold and isinstance(v, str)) for v in values):
+                continue
+            if op in _SQL_OPS and op != "$eq":
+                # ObjectId keys order like the ObjectIds; other key types fall through to Python
+                clauses.append((f"id {_SQL_OPS[op]} ?", [_id_key(value)]))
+            else:
+                clauses.append((f"id IN ({', '.join('?' * len(values))})", [_id_key(v) for v in values]))
+        return clauses
+
+    column = _column(field)
+    for op, value in operators.items():
+        if op in _SQL_OPS:
+            param = _sql_param(value, fold)
+            if param is None or (param[1] and op != "$eq"):
+                continue
+            if op != "$eq" and isinstance(value, datetime):
+                # Restrict to dates so text values do not sort in between
+                clauses.append((f"json_type(doc, '$.{field}') = 'object'", []))
+            collate = " COLLATE NOCASE" if param[1] else ""
+            clauses.append((f"{column} {_SQL_OPS[op]} ?{collate}", [param[0]]))
+        elif op == "$in" and isinstance(value, list) and value:
+            params = [_sql_param(item, fold) for item in value]
+            if any(param is None or param[1] for param in params):
+                continue
+            clauses.append((f"{column} IN ({', '.join('?' * len(params))})", [p[0] for p in params]))
+        elif op == "$exists":
+            clauses.append((f"json_type(doc, '$.{field}') IS {'NOT ' if value else ''}NULL", []))
+        elif op == "$type" and isinstance(value, str) and value in _SQL_TYPES:
+            types = ", ".join(f"'{name}'" for name in _SQL_TYPES[value])
+            clauses.append((f"json_type(doc, '$.{field}') IN ({types})", []))
+    return clauses
+
+
+def _filter_sql(query, fold, multikey):
+    """(WHERE clause, params) narrowing the rows a filter can match"""
+    clauses = []
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            for part in condition:
+                sql, params = _filter_sql(part, fold, multikey)
+                if sql:
+                    clauses.append((sql, params))
+        elif key == "$or":
+            branches = [_filter_sql(part, fold, multikey) for part in condition]
+            # Only a full translation of every branch narrows an $or
+            if branches and all(sql for sql, _ in branches):
+                clauses.append(("(" + " OR ".join(f"({sql})" for sql, _ in branches) + ")",
+                                [p for _, params in branches for p in params]))
+        elif not key.startswith("$"):
+            clauses.extend(_field_sql(key, condition, fold, multikey))
+    if not clauses:
+        return "", []
+    return " AND ".join(sql for sql, _ in clauses), [p for _, params in clauses for p in params]
+
+
+# --- Database and collections ------------------------------------------------
+
+class SQLiteDatabase:
+    """A pymongo-like Database stored in one SQLite file (WAL mode)"""
+
+    def __init__(self, path, name=None, busy_timeout=5.0):
+        """
+        Args:
+            path: Database file (its directory is created), or ':memory:'
+            name: Database name reported in collection full names
+            busy_timeout: Seconds to wait for another process's write lock
+        """
+        self.path = path
+        self.name = name or os.path.splitext(os.path.basename(path))[0] or "memory"
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._collections = {}
+        self._collections_lock = threading.Lock()
+        self._memory = path == ":memory:"
+        # A shared in-memory database lives on one connection, so access is serialized
+        self._memory_conn = None
+        self._memory_lock = threading.RLock() if self._memory else None
+        self._readers = []  # Idle snapshot connections: (pid, connection)
+        self._readers_lock = threading.Lock()
+        if not self._memory and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.transaction(write=True) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS _store_fields "
+                         "(collection TEXT, field TEXT, kind TEXT, PRIMARY KEY (collection, field, kind))")
+            conn.execute("CREATE TABLE IF NOT EXISTS _store_ttl "
+                         "(collection TEXT PRIMARY KEY, field TEXT, expire_after REAL)")
+
+    def _connect(self, shared=False):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                               check_same_thread=not (self._memory or shared))
+        if not self._memory:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def connection(self):
+        """This thread's connection (a new one after fork)"""
+        if self._memory:
+            if self._memory_conn is None:
+                self._memory_conn = self._connect()
+            return self._memory_conn
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self, write=False):
+        """
+        Run statements in one transaction. Writers take the write lock up
+        front (BEGIN IMMEDIATE) so read-modify-write updates are atomic across
+        threads and processes. Nested use joins the outer transaction.
+        """
+        with self._memory_lock or nullcontext():
+            conn = self.connection()
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    @contextmanager
+    def snapshot(self):
+        """
+        A read transaction on a connection of its own (file databases only),
+        which may stay open across other work on this thread's connection.
+        WAL lets writers go on meanwhile; the snapshot just doesn't see them.
+        """
+        pid, conn = os.getpid(), None
+        with self._readers_lock:
+            while self._readers and conn is None:
+                owner, idle = self._readers.pop()
+                if owner == pid:
+                    conn = idle  # Connections inherited over fork are dropped, not closed
+        if conn is None:
+            conn = self._connect(shared=True)  # The generator using it may move between threads
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            with self._readers_lock:
+                if len(self._readers) < _IDLE_READERS:
+                    self._readers.append((pid, conn))
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def __getitem__(self, name):
+        return self.get_collection(name)
+
+    def get_collection(self, name):
+        with self._collections_lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = self._collections[name] = SQLiteCollection(self, name)
+            return collection
+
+    def list_collection_names(self):
+        with self.transaction() as conn:
+            rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                "AND name NOT LIKE '\\_store\\_%' ESCAPE '\\' "
+                                "AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\'").fetchall()
+        return sorted(row[0] for row in rows)
+
+    def drop_collection(self, name):
+        self.get_collection(name).drop()
+
+    def command(self, command, *args, **kwargs):
+        """Only ``ping`` is supported"""
+        if command == "ping" or command == {"ping": 1}:
+            self.connection().execute("SELECT 1")
+            return {"ok": 1.0}
+        raise OperationFailure(f"Command {command!r} is not supported by the SQLite backend")
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+        if self._memory_conn is not None:
+            self._memory_conn.close()
+            self._memory_conn = None
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for pid, reader in readers:
+            if pid == os.getpid():
+                reader.close()
+
+
+class SQLiteCursor:
+    """Lazy result of find(); sort/skip/limit chain like a pymongo Cursor"""
+
+    def __init__(self, collection, query, projection, sort=None, skip=0, limit=0, collation=None):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = _sort_spec(sort) if sort else None
+        self._skip = skip or 0
+        self._limit = limit or 0
+        self._collation = collation
+        self._iterator = None
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _sort_spec(key_or_list, direction)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def collation(self, collation):
+        self._collation = collation
+        return self
+
+    def __iter__(self):
+        if self._iterator is None:
+            self._iterator = self._collection._stream(self._query, self._projection, self._sort, self._skip,
+                                                      self._limit, self._collation)
+        return self._iterator
+
+    def __next__(self):
+        return next(iter(self))
+
+    def close(self):
+        """Stop reading (releases the snapshot connection)"""
+        if self._iterator is None:
+            self._iterator = iter(())
+        else:
+            self._iterator.close()
+
+
+class SQLiteCollection:
+    """A pymongo-like Collection stored as a SQLite table of JSON documents"""
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self._table = '"' + name.replace('"', '""') + '"'
+        self._last_sweep = 0.0
+        with database.transaction(write=True) as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self._table} "
+                         "(id TEXT PRIMARY KEY, doc TEXT NOT NULL) WITHOUT ROWID")
+
+    # -- metadata --
+
+    def _fields(self, conn):
+        """(multikey fields, indexed fields) as recorded in this transaction's snapshot"""
+        multikey, indexed = set(), set()
+        for field, kind in conn.execute("SELECT field, kind FROM _store_fields WHERE collection = ?",
+                                        (self.name,)):
+            (multikey if kind == "multikey" else indexed).add(field)
+        return multikey, indexed
+
+    def _record_multikey(self, conn, docs, multikey):
+        new = {key for doc in docs for key, value in doc.items()
+               if isinstance(value, list) and key not in multikey}
+        if new:
+            conn.executemany("INSERT OR IGNORE INTO _store_fields VALUES (?, ?, 'multikey')",
+                             [(self.name, field) for field in new])
+            multikey.update(new)
+
+    # -- reads --
+
+    def _rows(self, conn, query, fold, multikey, order=None):
+        where, params = _filter_sql(query, fold, multikey)
+        sql = f"SELECT doc FROM {self._table}"
+        if where:
+            sql += f" WHERE {where}"
+        if order:
+            sql += " ORDER BY " + ", ".join(f"{_column(field)} {'DESC' if direction < 0 else 'ASC'}"
+                                            for field, direction in order)
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(256)
+            if not rows:
+                return
+            for (text,) in rows:
+                doc = _loads(text)
+                if _matches(doc, query, fold):
+                    yield doc
+
+    def _ordered(self, conn, query, sort, fold):
+        """Matching documents in sort order; lazy unless the sort has to run in Python"""
+        multikey, indexed = self._fields(conn)
+        pushdown = bool(sort) and fold is None and all(
+            field == "_id" or (field in indexed and field not in multikey) for field, _ in sort)
+        docs = self._rows(conn, query, fold, multikey, order=sort if pushdown else None)
+        if sort and not pushdown:
+            docs = _sort_docs(list(docs), sort, fold)
+        return docs
+
+    def _select(self, query, sort=None, skip=0, limit=0, collation=None, conn=None):
+        fold = _fold_for(collation)
+        with self.database.transaction() if conn is None else nullcontext(conn) as conn:
+            end = skip + limit if limit else None
+            return list(itertools.islice(self._ordered(conn, query, sort, fold), skip, end))
+
+    def _stream(self, query, projection, sort=None, skip=0, limit=0, collation=None):
+        """Projected documents of a find(), read from a snapshot as they are consumed"""
+        if self.database._memory:
+            # One shared connection: its transaction cannot stay open between rows
+            for doc in self._select(query, sort, skip, limit, collation):
+                yield _project(doc, projection)
+            return
+        fold = _fold_for(collation)
+        end = skip + limit if limit else None
+        with self.database.snapshot() as conn:
+            for doc in itertools.islice(self._ordered(conn, query, sort, fold), skip, end):
+                yield _project(doc, projection)
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0, collation=None, **kwargs):
+        return SQLiteCursor(self, filter, projection, sort=sort, skip=skip, limit=limit, collation=collation)
+
+    def find_one(self, filter=None, projection=None, *args, sort=None, collation=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        docs = self._select(filter or {}, _sort_spec(sort) if sort else None, 0, 1, collation)
+        return _project(docs[0], projection) if docs else None
+
+    def count_documents(self, filter, collation=None, skip=0, limit=0, **kwargs):
+        if not filter and not skip and not limit:
+            return self.estimated_document_count()
+        return len(self._select(filter, None, skip, limit, collation))
+
+    def estimated_document_count(self, **kwargs):
+        with self.database.transaction() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+
+    def distinct(self, key, filter=None, collation=None, **kwargs):
+        values = {}
+        for doc in self._select(filter or {}, None, 0, 0, collation):
+            value = _get(doc, key)
+            for item in (value if isinstance(value, list) else [value]):
+                if item is not _MISSING:
+                    values.setdefault(_id_key(item), item)
+        return list(values.values())
+
+    def aggregate(self, pipeline, collation=None, **kwargs):
+        fold = _fold_for(collation)
+        pipeline = list(pipeline)
+        query = pipeline.pop(0)["$match"] if pipeline and "$match" in pipeline[0] else {}
+        return iter(run_pipeline(self._select(query, None, 0, 0, collation), pipeline, fold))
+
+    def watch(self, *args, **kwargs):
+        raise NotImplementedError("Change streams require MongoDB")
+
+    # -- writes --
+
+    def _put(self, conn, doc, replace=False):
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        try:
+            conn.execute(f"{verb} INTO {self._table} (id, doc) VALUES (?, ?)", (_id_key(doc["_id"]), _dumps(doc)))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.full_name} ({e})",
+                                    11000) from e
+
+    def _update_row(self, conn, old_id, doc):
+        if _id_key(doc["_id"]) != old_id:
+            raise OperationFailure("Performing an update on the path '_id' would modify the immutable field '_id'")
+        try:
+            conn.execute(f"UPDATE {self._table} SET doc = ? WHERE id = ?", (_dumps(doc), old_id))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.full_name} ({e})",
+                                    11000) from e
+
+    def _sweep_expired(self, conn):
+        """Delete documents past their TTL, at most every TTL_SWEEP_INTERVAL seconds"""
+        now = time.monotonic()
+        if now - self._last_sweep < TTL_SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        row = conn.execute("SELECT field, expire_after FROM _store_ttl WHERE collection = ?",
+                           (self.name,)).fetchone()
+        if row:
+            field, expire_after = row
+            cutoff = datetime.utcfromtimestamp(time.time() - expire_after)
+            conn.execute(f"DELETE FROM {self._table} WHERE json_type(doc, '$.{field}') = 'object' "
+                         f"AND json_extract(doc, '$.{field}') < ?", (_dumps(cutoff),))
+
+    def insert_one(self, document, **kwargs):
+        document.setdefault("_id", ObjectId())
+        with self.database.transaction(write=True) as conn:
+            multikey, _ = self._fields(conn)
+            self._put(conn, document)
+            self._record_multikey(conn, [document], multikey)
+            self._sweep_expired(conn)
+        return InsertOneResult(document["_id"], True)
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        documents = list(documents)
+        errors, inserted = [], []
+        with self.database.transaction(write=True) as conn:
+            multikey, _ = self._fields(conn)
+            for index, document in enumerate(documents):
+                document.setdefault("_id", ObjectId())
+                try:
+                    self._put(conn, document)
+                    inserted.append(document)
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": document})
+                    if ordered:
+                        break
+            self._record_multikey(conn, inserted, multikey)
+            self._sweep_expired(conn)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": [], "nInserted": len(inserted),
+                                  "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []})
+        return InsertManyResult([document["_id"] for document in documents], True)
+
+    def _update(self, conn, filter, update, upsert, many, collation, multikey):
+        """(matched, modified, upserted _id or None, document before, document after)"""
+        docs = self._select(filter, None, 0, 0 if many else 1, collation, conn=conn)
+        modified, before, after = 0, None, None
+        for doc in docs:
+            old_text, old_id = _dumps(doc), _id_key(doc["_id"])
+            before = _loads(old_text)
+            _apply_update(doc, update)
+            after = doc
+            if _dumps(doc) != old_text:
+                self._update_row(conn, old_id, doc)
+                modified += 1
+        written = docs
+        upserted = None
+        if not docs and upsert:
+            after = _upsert_document(filter, update)
+            self._put(conn, after)
+            written, upserted = [after], after["_id"]
+        self._record_multikey(conn, written, multikey)
+        return len(docs), modified, upserted, before, after
+
+    def _update_result(self, matched, modified, upserted):
+        raw = {"n": matched + (1 if upserted is not None else 0), "nModified": modified,
+               "updatedExisting": matched > 0, "ok": 1.0}
+        if upserted is not None:
+            raw["upserted"] = upserted
+        return UpdateResult(raw, True)
+
+    def update_one(self, filter, update, upsert=False, collation=None, **kwargs):
+        with self.database.transaction(write=True) as conn:
+            multikey, _ = self._fields(conn)
+            matched, modified, upserted, _, _ = self._update(conn, filter, update, upsert, False,
+                                                              collation, multikey)
+        return self._update_result(matched, modified, upserted)
+
+    def update_many(self, filter, update, upsert=False, collation=None, **kwargs):
+        with self.database.transaction(write=True) as conn:
+            multikey, _ = self._fields(conn)
+            matched, modified, upserted, _, _ = self._update(conn, filter, update, upsert, True,
+                                                              collation, multikey)
+        return self._update_result(matched, modified, upserted)
+
+    def replace_one(self, filter, replacement, upsert=False, collation=None, **kwargs):
+        if _is_operator_update(replacement):
+            raise ValueError("replacement can not include $ operators")
+        return self.update_one(filter, replacement, upsert=upsert, collation=collation)
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=False, collation=None, **kwargs):
+        with self.database.transaction(write=True) as conn:
+            multikey, _ = self._fields(conn)
+            if sort:
+                target = self._select(filter, _sort_spec(sort), 0, 1, collation, conn=conn)
+                if target:
+                    filter = {"_id": target[0]["_id"]}
+            matched, _, upserted, before, after = self._update(conn, filter, update, upsert, False,
+                                                                collation, multikey)
+        # ReturnDocument.BEFORE is False, ReturnDocument.AFTER is True
+        result = after if return_document else before
+        return _project(result, projection) if result is not None else None
+
+    def delete_one(self, filter, collation=None, **kwargs):
+        return self._delete(filter, False, collation)
+
+    def delete_many(self, filter, collation=None, **kwargs):
+        return self._delete(filter, True, collation)
+
+    def _delete(self, filter, many, collation, conn=None):
+        with self.database.transaction(write=True) if conn is None else nullcontext(conn) as conn:
+            docs = self._select(filter, None, 0, 0 if many else 1, collation, conn=conn)
+            conn.executemany(f"DELETE FROM {self._table} WHERE id = ?", [(_id_key(doc["_id"]),) for doc in docs])
+        return DeleteResult({"n": len(docs), "ok": 1.0}, True)
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        """UpdateOne/UpdateMany/ReplaceOne/InsertOne/DeleteOne/DeleteMany in one transaction"""
+        totals = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0,
+                  "upserted": [], "writeErrors": [], "writeConcernErrors": []}
+        with self.database.transaction(write=True) as conn:
+            multikey, _ = self._fields(conn)
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        document = request._doc
+                        document.setdefault("_id", ObjectId())
+                        self._put(conn, document)
+                        self._record_multikey(conn, [document], multikey)
+                        totals["nInserted"] += 1
+                    elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                        matched, modified, upserted, _, _ = self._update(
+                            conn, request._filter, request._doc, bool(request._upsert),
+                            isinstance(request, UpdateMany), request._collation, multikey)
+                        totals["nMatched"] += matched
+                        totals["nModified"] += modified
+                        if upserted is not None:
+                            totals["nUpserted"] += 1
+                            totals["upserted"].append({"index": index, "_id": upserted})
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        result = self._delete(request._filter, isinstance(request, DeleteMany),
+                                              request._collation, conn=conn)
+                        totals["nRemoved"] += result.deleted_count
+                    else:
+                        raise TypeError(f"{request!r} is not a valid request")
+                except (DuplicateKeyError, OperationFailure) as e:
+                    totals["writeErrors"].append({"index": index, "code": getattr(e, "code", None) or 2,
+                                                  "errmsg": str(e), "op": request})
+                    if ordered:
+                        break
+            self._sweep_expired(conn)
+        if totals["writeErrors"]:
+            raise BulkWriteError(totals)
+        return BulkWriteResult(totals, True)
+
+    # -- indexes --
+
+    def create_index(self, keys, **kwargs):
+        model = IndexModel(_sort_spec(keys) if not isinstance(keys, str) else [(keys, 1)], **kwargs)
+        return self.create_indexes([model])[0]
+
+    def create_indexes(self, indexes, **kwargs):
+        """
+        Create SQLite expression indexes for IndexModels. Collations with
+        strength 1-2 become COLLATE NOCASE, partialFilterExpression a partial
+        index, expireAfterSeconds a TTL swept on writes.
+        """
+        names = []
+        with self.database.transaction(write=True) as conn:
+            for model in indexes:
+                spec = model.document
+                fields = list(spec["key"].items())
+                if any(not _SAFE_FIELD.match(field) for field, _ in fields):
+                    raise OperationFailure(f"Unsupported index key for SQLite: {spec['key']}")
+                collate = " COLLATE NOCASE" if _fold_for(spec.get("collation")) else ""
+                columns = ", ".join(f"{_column(field)}{collate}{' DESC' if direction == -1 else ''}"
+                                    for field, direction in fields)
+                sql = (f"CREATE {'UNIQUE ' if spec.get('unique') else ''}INDEX IF NOT EXISTS "
+                       f"\"{self.name}.{spec['name']}\" ON {self._table} ({columns})")
+                if spec.get("partialFilterExpression"):
+                    where, params = _filter_sql(spec["partialFilterExpression"], None, set())
+                    if not where or params:
+                        raise OperationFailure("Unsupported partialFilterExpression for SQLite: "
+                                               f"{spec['partialFilterExpression']}")
+                    sql += f" WHERE {where}"
+                try:
+                    conn.execute(sql)
+                except sqlite3.IntegrityError as e:
+                    raise DuplicateKeyError(f"E11000 duplicate key error building index {spec['name']} "
+                                            f"on {self.full_name} ({e})", 11000) from e
+                conn.executemany("INSERT OR IGNORE INTO _store_fields VALUES (?, ?, 'indexed')",
+                                 [(self.name, field) for field, _ in fields])
+                if "expireAfterSeconds" in spec:
+                    conn.execute("INSERT OR REPLACE INTO _store_ttl VALUES (?, ?, ?)",
+                                 (self.name, fields[0][0], spec["expireAfterSeconds"]))
+                names.append(spec["name"])
+        return names
+
+    def drop(self):
+        with self.database.transaction(write=True) as conn:
+            conn.execute(f"DROP TABLE IF EXISTS {self._table}")
+            conn.execute("DELETE FROM _store_fields WHERE collection = ?", (self.name,))
+            conn.execute("DELETE FROM _store_ttl WHERE collection = ?", (self.name,))
+        with self.database._collections_lock:
+            self.database._collections.pop(self.name, None)
@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+# Tests import the app's top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Config is read at import: keep the app on a throwaway embedded store, render reports inline
+_DATA_DIR = tempfile.mkdtemp(prefix='recipe-modifier-tests-')
+os.environ['STORAGE_BACKEND'] = 'sqlite'
+os.environ['SQLITE_PATH'] = os.path.join(_DATA_DIR, 'test.sqlite3')
+os.environ['REPORT_JOB_WORKERS'] = '0'
+os.environ['SEED_ON_STARTUP'] = 'false'
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app as app_module
+    app_module.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return app_module
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def login(app_module, client):
+    """Register and log in a fresh user on client; returns its user_id"""
+    def login(condition='diabetes'):
+        username = f"user{uuid.uuid4().hex[:8]}"
+        enabled = app_module.limiter.enabled
+        app_module.limiter.enabled = False
+        try:
+            client.post('/register', data=dict(username=username, email=f'{username}@gmail.com',
+                                               password='Passw0rd!', confirm_password='Passw0rd!',
+                                               medical_condition=condition))
+            client.post('/login', data=dict(username=username, password='Passw0rd!'))
+        finally:
+            app_module.limiter.enabled = enabled
+        user = app_module.get_user_manager().get_user_by_username(username)
+        assert user is not None, "registration failed"
+        return user.user_id
+    return login
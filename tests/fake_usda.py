@@ -0,0 +1,112 @@
+"""
+Local fake of the USDA FoodData Central API (``GET /foods/search`` and bulk
+``POST /foods``), shared by the nutrition tests and
+benchmarks/bench_usda_batching.py.
+
+Every name is known except those starting with "mystery"; FDC ids are
+handed out in order of first search. Requests are recorded per kind.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+VOCABULARY = ['sugar', 'salt', 'flour', 'butter', 'milk', 'eggs', 'peanuts', 'soy', 'wheat',
+              'corn', 'banana', 'rice', 'chicken', 'onion', 'garlic', 'tomato', 'olive oil',
+              'stevia', 'almond flour', 'almond milk', 'paneer', 'ghee', 'jaggery', 'lentils',
+              'spinach', 'potato', 'yogurt', 'cheese', 'pasta', 'oats', 'honey', 'ginger']
+
+_FIRST_ID = 100000
+
+
+class FakeUSDA(BaseHTTPRequestHandler):
+    """Minimal FoodData Central stand-in; counts requests and connections"""
+    latency = 0.0
+    requests_served = 0
+    connections = 0
+    searches = []        # query of every search
+    bulk_requests = []   # fdcIds of every POST /foods
+    missing_ids = set()  # ids POST /foods leaves out (records USDA no longer has)
+    names = {}           # name -> FDC id
+    lock = threading.Lock()
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # keep-alive replies would otherwise stall on delayed ACKs
+
+    @classmethod
+    def reset(cls, latency=0.0):
+        with cls.lock:
+            cls.latency = latency
+            cls.requests_served = 0
+            cls.connections = 0
+            cls.searches = []
+            cls.bulk_requests = []
+            cls.missing_ids = set()
+            cls.names = {}
+
+    @classmethod
+    def fdc_id_for(cls, name):
+        """FDC id of a name, or None for a name USDA does not know"""
+        name = name.lower().strip()
+        if name.startswith('mystery'):
+            return None
+        with cls.lock:
+            return cls.names.setdefault(name, _FIRST_ID + len(cls.names))
+
+    def setup(self):
+        super().setup()
+        with FakeUSDA.lock:
+            FakeUSDA.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload):
+        with FakeUSDA.lock:
+            FakeUSDA.requests_served += 1
+        time.sleep(self.latency)
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def calories(name):
+        return 50 + len(name)
+
+    @classmethod
+    def _food(cls, fdc_id, search_format):
+        name = next(name for name, known_id in cls.names.items() if known_id == fdc_id)
+        values = {1008: cls.calories(name), 1003: 3.5, 1005: 10.0, 1004: 2.0}
+        if search_format:
+            nutrients = [{'nutrientId': k, 'value': v} for k, v in values.items()]
+        else:
+            nutrients = [{'nutrient': {'id': k}, 'amount': v} for k, v in values.items()]
+        return {'fdcId': fdc_id, 'description': name.title(), 'foodNutrients': nutrients}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = (parse_qs(url.query).get('query') or [''])[0].lower()
+        with FakeUSDA.lock:
+            FakeUSDA.searches.append(query)
+        fdc_id = FakeUSDA.fdc_id_for(query)
+        self._reply({'foods': [self._food(fdc_id, True)] if fdc_id else []})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        ids = json.loads(self.rfile.read(length) or b'{}').get('fdcIds', [])
+        with FakeUSDA.lock:
+            FakeUSDA.bulk_requests.append(ids)
+        known = set(FakeUSDA.names.values()) - FakeUSDA.missing_ids
+        self._reply([self._food(i, False) for i in ids if i in known])
+
+
+def start_fake_usda(latency=0.0):
+    """Serve FakeUSDA on a free local port; returns (server, base_url)"""
+    FakeUSDA.reset(latency)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeUSDA)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
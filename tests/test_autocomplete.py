@@ -0,0 +1,67 @@
+import threading
+import time
+
+import name_popularity
+from sqlite_store import SQLiteDatabase
+
+
+def test_autocomplete_is_not_held_to_the_hourly_default(client):
+    for burst in range(3):  # 60 requests: more than the 50-per-hour default
+        if burst:
+            time.sleep(1.1)
+        for _ in range(20):
+            assert client.get('/api/autocomplete?q=r').status_code == 200
+
+
+def test_name_counters_match_a_rebuild():
+    db = SQLiteDatabase(':memory:', name='test')
+    entries, counters = db['food_entries'], db['name_popularity']
+    docs = [
+        {"recipe_name": "Dal Makhani", "input_ingredients": ["Rice", "salt", "rice"]},
+        {"recipe_name": "dal makhani ", "input_ingredients": ["sugar"]},
+        {"recipe_name": None, "input_ingredients": []},
+    ]
+    assert name_popularity.top_names(counters, "ingredient", 10) is None  # Not rebuilt yet
+    name_popularity.rebuild(entries, counters)
+    for doc in docs:
+        entries.insert_one(dict(doc))
+        name_popularity.record_entry(counters, doc)
+    incremental = {kind: name_popularity.top_names(counters, kind, 10) for kind in name_popularity.KINDS}
+
+    name_popularity.rebuild(entries, counters)
+    rebuilt = {kind: name_popularity.top_names(counters, kind, 10) for kind in name_popularity.KINDS}
+    assert incremental == rebuilt == {
+        "ingredient": {"rice": 2, "salt": 1, "sugar": 1},
+        "recipe": {"dal makhani": 2},
+    }
+    assert list(name_popularity.top_names(counters, "ingredient", 1)) == ["rice"]
+    db.close()
+
+
+def test_stale_index_is_rebuilt_once_in_the_background(app_module, monkeypatch):
+    current = app_module.get_autocomplete_index()
+    builds = []
+    release = threading.Event()
+
+    def slow_build():
+        builds.append(1)
+        release.wait(5)
+
+    monkeypatch.setattr(app_module, "_build_autocomplete_index", slow_build)
+    monkeypatch.setattr(app_module, "_autocomplete_built", (None, 0))  # Stale
+    started = time.monotonic()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(app_module.get_autocomplete_index()))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert time.monotonic() - started < 1  # Nobody waited for the build
+    assert all(index is current for index in results)
+    release.set()
+    deadline = time.monotonic() + 5
+    while app_module._autocomplete_lock.locked() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert builds == [1]
@@ -0,0 +1,59 @@
+import db_indexes
+from sqlite_store import SQLiteDatabase
+
+
+class _FakeCursor:
+    def __init__(self, plan):
+        self._plan = plan
+
+    def sort(self, sort):
+        return self
+
+    def explain(self):
+        return {"queryPlanner": {"winningPlan": self._plan}}
+
+
+class _FakeDatabase:
+    """Explains every find as an index scan and aggregates as the given plan"""
+
+    def __init__(self, aggregate_plans):
+        self.aggregate_plans = aggregate_plans
+        self.aggregated = []
+
+    def __getitem__(self, name):
+        return self
+
+    def find(self, query, **options):
+        return _FakeCursor({"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}})
+
+    def command(self, command, name, pipeline, explain):
+        self.aggregated.append((name, pipeline))
+        return self.aggregate_plans.get(name, {"stages": []})
+
+
+def test_verify_explains_aggregations_and_flags_their_scans():
+    scan = {"stages": [
+        {"$cursor": {"queryPlanner": {
+            "winningPlan": {"stage": "PROJECTION_SIMPLE", "inputStage": {"stage": "COLLSCAN"}},
+            "rejectedPlans": [],
+        }}},
+        {"$group": {}},
+    ]}
+    db = _FakeDatabase({"user_daily_stats": scan})
+    problems = db_indexes.verify_query_plans(db)
+
+    assert problems == [("daily stats totals of a user", "COLLSCAN on user_daily_stats")]
+    assert [name for name, _ in db.aggregated] == [name for _, name, _ in db_indexes.AGGREGATE_SHAPES]
+
+
+def test_rejected_plans_are_ignored():
+    explained = {"queryPlanner": {"winningPlan": {"stage": "IXSCAN"},
+                                  "rejectedPlans": [{"stage": "COLLSCAN"}]}}
+    assert set(db_indexes._winning_stages(explained)) == {"IXSCAN"}
+
+
+def test_aggregate_shapes_are_runnable_pipelines():
+    db = SQLiteDatabase(':memory:', name='test')
+    for _, name, pipeline in db_indexes.AGGREGATE_SHAPES:
+        assert list(db[name].aggregate(pipeline)) in ([], [{"totals": [], "recent": [], "today": []}])
+    db.close()
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from name_keys import name_fields
+
+
+@pytest.fixture
+def entries(app_module, login, monkeypatch):
+    """Three entries of one recipe (the oldest a favorite) and one of another; returns their ids"""
+    monkeypatch.setattr(app_module.limiter, "enabled", False)
+    user_id = login()
+    now = datetime.now()
+    docs = [
+        {"recipe_name": "Dal Makhani", "is_favorite": True, "timestamp": now - timedelta(days=3)},
+        {"recipe_name": "dal  makhani", "is_favorite": False, "timestamp": now - timedelta(days=2)},
+        {"recipe_name": "DAL MAKHANI", "is_favorite": False, "timestamp": now - timedelta(days=1)},
+        {"recipe_name": "Lemon Rice", "is_favorite": False, "timestamp": now},
+    ]
+    for doc in docs:
+        doc.update(patient_id=user_id, category="General", **name_fields(doc["recipe_name"]))
+    result = app_module.get_food_entries().insert_many(docs)
+    return user_id, [str(entry_id) for entry_id in result.inserted_ids]
+
+
+def _favorites(app_module, user_id):
+    return {str(doc["_id"]) for doc in app_module.get_food_entries().find(
+        {"patient_id": user_id, "is_favorite": True}, {"_id": 1})}
+
+
+def test_bulk_favorite_keeps_one_favorite_per_recipe(app_module, client, entries):
+    user_id, ids = entries
+    response = client.post('/api/favorites/bulk', json={"entry_ids": ids[1:], "action": "favorite"})
+    assert response.status_code == 200
+    assert response.get_json()["replaced"] == 1
+    # The newest selected Dal Makhani wins over the older selection and the existing favorite
+    assert _favorites(app_module, user_id) == {ids[2], ids[3]}
+
+
+def test_categorize_replaces_the_recipes_other_favorite(app_module, client, entries):
+    user_id, ids = entries
+    response = client.post(f'/api/categorize/{ids[1]}', json={"category": "Dinner"})
+    assert response.status_code == 200
+    assert _favorites(app_module, user_id) == {ids[1]}
+    assert app_module.get_food_entries().find_one({"_id": app_module.ObjectId(ids[1])})["category"] == "Dinner"
+
+
+def test_cookbook_pages_are_keyset_scans_over_deduplicated_favorites(app_module, client, entries):
+    user_id, ids = entries
+    client.post('/api/favorites/bulk', json={"entry_ids": ids, "action": "favorite"})
+    first = client.get('/api/cookbook?limit=1').get_json()
+    second = client.get(f'/api/cookbook?limit=1&cursor={first["next_cursor"]}').get_json()
+    assert [e["id"] for e in first["entries"] + second["entries"]] == [ids[3], ids[2]]
+    assert second["next_cursor"] is None
+
+
+def test_dedupe_favorites_migration_keeps_the_newest(app_module, entries, capsys):
+    import migrations
+
+    user_id, ids = entries
+    app_module.get_food_entries().update_many({"patient_id": user_id}, {"$set": {"is_favorite": True}})
+    migrations.dedupe_favorites(app_module.get_db())
+    assert _favorites(app_module, user_id) == {ids[2], ids[3]}
+    assert "2 un-favorited across 1 recipes" in capsys.readouterr().out
@@ -0,0 +1,78 @@
+import os
+import random
+from difflib import SequenceMatcher, get_close_matches
+
+import pytest
+
+from fuzzy_index import NGramIndex
+
+RECIPES_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models', 'recipes.csv')
+
+
+def _score(query, name):
+    """difflib's score of name for query (ratio is not symmetric)"""
+    return SequenceMatcher(None, name, query).ratio()
+
+
+def _typo(name, rng):
+    """One or two random edits: drop, swap, replace or insert a character"""
+    chars = list(name)
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(chars) - 1)
+        op = rng.random()
+        if op < 0.25:
+            del chars[i]
+        elif op < 0.5:
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+        elif op < 0.75:
+            chars[i] = rng.choice('abcdefghijklmnopqrstuvwxyz')
+        else:
+            chars.insert(i, rng.choice('abcdefghijklmnopqrstuvwxyz'))
+    return ''.join(chars)
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    """The real recipe names plus 2000 made-up names from their words (posting lists get long)"""
+    with open(RECIPES_CSV, encoding='utf-8') as f:
+        recipes = [line.strip().lower() for line in f.readlines()[1:] if line.strip()]
+    words = sorted({word for name in recipes for word in name.split()})
+    rng = random.Random(5)
+    names = set(recipes)
+    while len(names) < len(recipes) + 2000:
+        names.add(' '.join(rng.choice(words) for _ in range(rng.randint(2, 5))))
+    names = sorted(names)
+    return names, NGramIndex(names)
+
+
+@pytest.fixture(scope='module')
+def cases(corpus):
+    """(query, difflib's suggestions) for typos and short prefixes of corpus names"""
+    names, _ = corpus
+    rng = random.Random(1)
+    queries = [_typo(rng.choice(names), rng) for _ in range(100)]
+    queries += [rng.choice(names)[:rng.randint(3, 8)] for _ in range(100)]
+    return [(query, get_close_matches(query, names, 3, 0.6)) for query in queries]
+
+
+def test_suggests_something_whenever_difflib_does(corpus, cases):
+    _, index = corpus
+    for query, expected in cases:
+        got = index.get_close_matches(query, 3, 0.6)
+        assert bool(got) == bool(expected), query
+        assert all(_score(query, name) >= 0.6 for name in got)
+
+
+def test_best_suggestion_scores_like_difflibs(corpus, cases):
+    _, index = corpus
+    found = [(query, expected) for query, expected in cases if expected]
+    same = sum(1 for query, expected in found
+               if _score(query, index.get_close_matches(query, 1, 0.6)[0]) == _score(query, expected[0]))
+    assert same / len(found) >= 0.98
+
+
+def test_exact_and_tiny_vocabularies_match_difflib():
+    names = ["dal makhani", "dal tadka", "masala dosa", "paneer butter masala", "lemon rice"]
+    index = NGramIndex(names)
+    for query in ("dal makhani", "dal", "masla dosa", "panner", "lemn rise", "xyz", "ma"):
+        assert index.get_close_matches(query, 3, 0.6) == get_close_matches(query, names, 3, 0.6)
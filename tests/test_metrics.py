@@ -0,0 +1,16 @@
+def test_metrics_are_hidden_without_a_configured_token(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.Config, "METRICS_TOKEN", None)
+    assert client.get('/api/metrics').status_code == 404
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer '}).status_code == 404
+
+
+def test_metrics_require_the_bearer_token(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.Config, "METRICS_TOKEN", "s3cret")
+    assert client.get('/api/metrics').status_code == 401
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/api/metrics', headers={'Authorization': 'Basic s3cret'}).status_code == 401
+
+    for _ in range(60):  # Scraping is not held to the hourly default
+        response = client.get('/api/metrics', headers={'Authorization': 'Bearer s3cret'})
+        assert response.status_code == 200
+    assert set(response.get_json()) == {'write_behind', 'caches', 'report_jobs'}
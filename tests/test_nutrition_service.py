@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import nutrition_service as ns
+from sqlite_store import SQLiteDatabase
+from tests.fake_usda import FakeUSDA, start_fake_usda
+
+
+@pytest.fixture(scope='module')
+def usda_url():
+    server, base_url = start_fake_usda()
+    yield base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def store():
+    db = SQLiteDatabase(':memory:', name='test')
+    yield db['nutrition_cache']
+    db.close()
+
+
+@pytest.fixture
+def make_service(usda_url, store, monkeypatch):
+    """A fresh worker's NutritionService (empty in-memory cache) on the shared store"""
+    FakeUSDA.reset()
+    monkeypatch.setenv('USDA_API_KEY', 'test')
+    monkeypatch.setattr(ns, 'USDA_API_BASE_URL', usda_url)
+
+    def make_service():
+        service = ns.NutritionService()
+        service.attach_store(store)
+        return service
+    return make_service
+
+
+def _expire_records(store):
+    store.update_many({"_id": {"$regex": "^fdc:"}},
+                      {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+
+def test_names_resolve_to_ids_and_nutrients(make_service, store):
+    service = make_service()
+
+    sugar, salt = service.get_nutrition_batch(["Sugar", "salt"])
+
+    assert sorted(FakeUSDA.searches) == ["salt", "sugar"]
+    assert sugar["found"] and sugar["description"] == "Sugar"
+    assert sugar["ingredient"] == "Sugar"
+    assert sugar["calories"] == FakeUSDA.calories("sugar")
+    name_doc = store.find_one({"_id": "name:sugar"})
+    assert name_doc["fdc_id"] == FakeUSDA.names["sugar"]
+    assert store.find_one({"_id": f"fdc:{name_doc['fdc_id']}"})["nutrients"]["calories"] == sugar["calories"]
+
+
+def test_cached_ids_and_records_skip_usda(make_service):
+    make_service().get_nutrition_batch(["rice", "ghee"])
+    FakeUSDA.searches.clear()
+
+    rice, ghee = make_service().get_nutrition_batch(["rice", "ghee"])
+
+    assert rice["found"] and ghee["found"]
+    assert FakeUSDA.searches == [] and FakeUSDA.bulk_requests == []
+
+
+def test_expired_records_are_fetched_in_bulk_chunks_of_20(make_service, store):
+    names = [f"food {i}" for i in range(45)]
+    make_service().get_nutrition_batch(names)
+    _expire_records(store)
+    FakeUSDA.searches.clear()
+
+    results = make_service().get_nutrition_batch(names)
+
+    assert FakeUSDA.searches == []  # Ids come from the store
+    assert sorted(len(ids) for ids in FakeUSDA.bulk_requests) == [5, 20, 20]
+    assert sorted(i for ids in FakeUSDA.bulk_requests for i in ids) == sorted(FakeUSDA.names.values())
+    assert all(result["found"] for result in results)
+
+
+def test_unknown_names_fall_back_to_estimates_and_are_cached(make_service, store):
+    result, = make_service().get_nutrition_batch(["mystery spice"])
+
+    assert not result["found"] and result["estimated"]
+    assert store.find_one({"_id": "name:mystery spice"})["fdc_id"] is None
+
+    FakeUSDA.searches.clear()
+    result, = make_service().get_nutrition_batch(["mystery spice"])
+    assert not result["found"] and FakeUSDA.searches == []  # Negative entry from the store
+
+
+def test_records_missing_from_usda_fall_back_to_estimates(make_service, store):
+    make_service().get_nutrition_batch(["paneer", "spinach"])
+    _expire_records(store)
+    FakeUSDA.missing_ids.add(FakeUSDA.names["paneer"])
+
+    paneer, spinach = make_service().get_nutrition_batch(["paneer", "spinach"])
+
+    assert not paneer["found"] and paneer["category"] == "dairy"
+    assert spinach["found"]
@@ -0,0 +1,164 @@
+import json
+import re
+import time
+
+import pytest
+
+from gemini_service import GeminiService, RecipeStreamInterrupted
+
+RECIPE_CHUNKS = [
+    "**Lemon Rice**\nA light rice dish.\n\n**Ingre",
+    "dients**\n- 1 cup rice\n- 1 tsp salt\n",
+    "- 1 tsp stevia\n\n**Instructions**\n1. Cook the rice.\n",
+    "2. Season and serve.\n\n**Nutritional Info**\nAbout 300 kcal.",
+]
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiClient:
+    """Stands in for genai.Client: generate_content_stream emits chunks on a timer"""
+
+    def __init__(self, chunks=RECIPE_CHUNKS, delay=0.05):
+        self.chunks = chunks
+        self.delay = delay
+        self.calls = 0
+        self.models = self
+
+    def generate_content_stream(self, model, contents):
+        self.calls += 1
+        for text in self.chunks:
+            time.sleep(self.delay)
+            yield _Chunk(text)
+
+    def generate_content(self, model, contents):
+        self.calls += 1
+        return _Chunk("".join(self.chunks))
+
+
+def _timed(iterator):
+    start = time.perf_counter()
+    return [(item, time.perf_counter() - start) for item in iterator]
+
+
+def test_sections_are_yielded_as_chunks_arrive():
+    service = GeminiService(client=FakeGeminiClient(delay=0.1))
+
+    timed = _timed(service.stream_recipe_instructions(["rice", "salt", "sugar"], ["rice", "salt", "stevia"],
+                                                      "diabetes", ["sugar"], "Lemon Rice"))
+
+    sections = [section for section, _ in timed]
+    assert [section.split("\n")[0] for section in sections] == [
+        "**Lemon Rice**", "**Ingredients**", "**Instructions**", "**Nutritional Info**"]
+    assert sections[1] == "**Ingredients**\n- 1 cup rice\n- 1 tsp salt\n- 1 tsp stevia"
+    # The title is complete once the second chunk starts a new header, long before the stream ends
+    assert timed[0][1] < 0.3
+    assert timed[-1][1] >= 0.4
+
+
+def test_stream_failure_falls_back_to_the_basic_recipe():
+    class Failing(FakeGeminiClient):
+        def generate_content_stream(self, model, contents):
+            raise RuntimeError("quota exceeded")
+            yield  # pragma: no cover
+
+    service = GeminiService(client=Failing())
+    sections = list(service.stream_recipe_instructions(["rice"], ["rice"], "diabetes"))
+    assert sections and "rice" in "\n".join(sections).lower()
+
+
+class BreaksOff(FakeGeminiClient):
+    """Streams the first two chunks, then fails"""
+
+    def generate_content_stream(self, model, contents):
+        self.calls += 1
+        for text in self.chunks[:2]:
+            time.sleep(self.delay)
+            yield _Chunk(text)
+        raise RuntimeError("connection reset")
+
+
+def test_stream_failure_midway_is_reported_after_the_partial_sections():
+    service = GeminiService(client=BreaksOff(delay=0))
+    sections = []
+    with pytest.raises(RecipeStreamInterrupted):
+        for section in service.stream_recipe_instructions(["rice"], ["rice"], "diabetes"):
+            sections.append(section)
+    assert [section.split("\n")[0] for section in sections] == ["**Lemon Rice**", "**Ingredients**"]
+
+
+def _events(response):
+    """(event, data) of a server-sent event stream, with arrival times"""
+    start = time.perf_counter()
+    buffer = ""
+    for chunk in response.response:
+        buffer += chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        while "\n\n" in buffer:
+            raw, buffer = buffer.split("\n\n", 1)
+            fields = dict(line.split(": ", 1) for line in raw.split("\n"))
+            yield fields.get("event", "message"), json.loads(fields["data"]), time.perf_counter() - start
+
+
+@pytest.fixture
+def fake_gemini(app_module, monkeypatch):
+    fake = FakeGeminiClient(delay=0.1)
+    monkeypatch.setattr(app_module.gemini_service, "client", fake)
+    monkeypatch.setattr(app_module.Config, "GEMINI_STREAMING", True)
+    return fake
+
+
+def test_stream_endpoint_sends_sections_and_writes_back(app_module, client, login, fake_gemini):
+    user_id = login()
+    ingredients = "rice, salt, sugar, lemon"
+    page = client.post('/check_ingredients', data=dict(ingredients=ingredients, condition='diabetes',
+                                                       recipe_name='Lemon Rice'))
+    url = re.search(r'data-stream-url="([^"]+)"', page.get_data(as_text=True)).group(1)
+
+    response = client.get(url, buffered=False)
+    assert response.mimetype == "text/event-stream"
+    events = list(_events(response))
+
+    messages = [data["html"] for event, data, _ in events if event == "message"]
+    assert len(messages) == 4 and "Lemon Rice" in messages[0]
+    assert events[-1][0] == "done"
+    assert events[0][2] < events[-1][2] - 0.2  # First section long before the last chunk
+    assert fake_gemini.calls == 1
+
+    # Written back: the generated_recipes cache and the food entry created for the page
+    entry = app_module.get_food_entries().find_one({"patient_id": user_id, "recipe_name": "Lemon Rice"})
+    recipe = app_module.recipe_blobs.recipe_text(entry)
+    assert recipe.startswith("**Lemon Rice**") and "2. Season and serve." in recipe
+    cached = app_module.get_generated_recipes().find_one({"condition": "diabetes", "recipe": recipe})
+    assert cached is not None
+
+    # The same request is now served from the cache, without a stream or a Gemini call
+    page = client.post('/check_ingredients', data=dict(ingredients=ingredients, condition='diabetes',
+                                                       recipe_name='Lemon Rice'))
+    assert 'data-stream-url' not in page.get_data(as_text=True)
+    assert "Season and serve" in page.get_data(as_text=True)
+    assert fake_gemini.calls == 1
+
+
+def test_interrupted_stream_is_flagged_and_not_written_back(app_module, client, login, fake_gemini):
+    fake_gemini.generate_content_stream = BreaksOff(delay=0).generate_content_stream
+    user_id = login()
+    ingredients = "rice, salt, sugar, lime"
+    page = client.post('/check_ingredients', data=dict(ingredients=ingredients, condition='diabetes',
+                                                       recipe_name='Lime Rice'))
+    url = re.search(r'data-stream-url="([^"]+)"', page.get_data(as_text=True)).group(1)
+
+    events = [event for event, _, _ in _events(client.get(url, buffered=False))]
+    assert events == ["message", "message", "incomplete"]
+
+    entry = app_module.get_food_entries().find_one({"patient_id": user_id, "recipe_name": "Lime Rice"})
+    assert not entry.get("recipe_ref")
+    page = client.post('/check_ingredients', data=dict(ingredients=ingredients, condition='diabetes',
+                                                       recipe_name='Lime Rice'))
+    assert 'data-stream-url' in page.get_data(as_text=True)  # Nothing cached: generated again
+
+
+def test_stream_endpoint_rejects_bad_tokens(client):
+    assert client.get('/api/recipe/stream/not-a-token').status_code == 404
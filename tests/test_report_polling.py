@@ -0,0 +1,6 @@
+def test_report_status_polling_is_not_held_to_the_hourly_default(client, login):
+    login()
+    for _ in range(60):  # More than the 50-per-hour default
+        response = client.get('/api/reports/' + '0' * 32)
+        assert response.status_code == 404
+        assert response.get_json() == {"error": "Report job not found"}
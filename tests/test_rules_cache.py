@@ -0,0 +1,128 @@
+import queue
+import time
+
+import pytest
+
+from rules_cache import IngredientRulesCache, mark_rules_changed
+from sqlite_store import SQLiteDatabase
+
+
+@pytest.fixture
+def db():
+    db = SQLiteDatabase(':memory:', name='test')
+    db['ingredient_rules'].insert_many([
+        {"ingredient": "sugar", "harmful_for": ["diabetes"], "alternative": "stevia"},
+        {"ingredient": "salt", "harmful_for": ["hypertension"], "alternative": "low-sodium salt"},
+    ])
+    yield db
+    db.close()
+
+
+def _cache(db, **kwargs):
+    cache = IngredientRulesCache(poll_interval=0, use_change_stream=False, **kwargs)
+    cache.attach(db['ingredient_rules'], db['cache_versions'])
+    cache.get()
+    return cache
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class _PollingBefore:
+    """Collection proxy that runs the cache's poll right before one kind of write"""
+
+    def __init__(self, collection, cache, method, when=lambda update: True):
+        self._collection = collection
+        self._cache = cache
+        self._method = method
+        self._when = when
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name != self._method:
+            return attr
+
+        def write(filter, update, *args, **kwargs):
+            if self._when(update):
+                self._cache._last_poll = 0
+                self._cache._poll()
+            return attr(filter, update, *args, **kwargs)
+        return write
+
+
+def test_poll_between_bump_and_stamp_does_not_lose_the_edit(db):
+    cache = _cache(db)
+    rules = db['ingredient_rules']
+    rules.update_one({"ingredient": "sugar"}, {"$set": {"alternative": "monk fruit"}})
+
+    mark_rules_changed(_PollingBefore(rules, cache, "update_many"), db['cache_versions'], ["sugar"])
+
+    cache._last_poll = 0
+    assert cache.get()["sugar"]["alternative"] == "monk fruit"
+
+
+def test_poll_between_bump_and_tombstone_does_not_lose_the_delete(db):
+    cache = _cache(db)
+    db['ingredient_rules'].delete_one({"ingredient": "salt"})
+    versions = _PollingBefore(db['cache_versions'], cache, "update_one",
+                              when=lambda update: "deleted" in update.get("$push", {}))
+
+    mark_rules_changed(db['ingredient_rules'], versions, deleted=["salt"])
+
+    cache._last_poll = 0
+    assert "salt" not in cache.get()
+
+
+def test_poll_applies_only_stamped_changes(db):
+    cache = _cache(db)
+    version = cache.version
+    db['ingredient_rules'].insert_one({"ingredient": "butter", "harmful_for": ["obesity"],
+                                       "alternative": "olive oil"})
+    mark_rules_changed(db['ingredient_rules'], db['cache_versions'], ["butter"])
+
+    cache._last_poll = 0
+    rules = cache.get()
+    assert rules["butter"]["alternative"] == "olive oil"
+    assert rules["sugar"]["alternative"] == "stevia"
+    assert cache.version == version + 1
+
+
+def test_change_feed_drives_the_cache(db):
+    events = queue.Queue()
+
+    def feed():
+        while True:
+            event = events.get()
+            if event is None:
+                return
+            yield event
+
+    cache = _cache(db)
+    cache.watch(change_feed=feed())
+    _wait_for(lambda: cache.watching)
+    assert "sugar" in cache.get()  # Reloaded once the feed opened
+
+    butter_id = db['ingredient_rules'].insert_one(
+        {"ingredient": "butter", "harmful_for": ["obesity"], "alternative": "olive oil"}).inserted_id
+    events.put({"_id": "1", "operationType": "insert",
+                "fullDocument": {"_id": butter_id, "ingredient": "Butter", "alternative": "olive oil"}})
+    _wait_for(lambda: "butter" in cache.get())
+
+    events.put({"_id": "2", "operationType": "update",
+                "fullDocument": {"_id": butter_id, "ingredient": "ghee", "alternative": "olive oil"}})
+    _wait_for(lambda: "ghee" in cache.get())
+    assert "butter" not in cache.get()  # Renamed
+
+    events.put({"_id": "3", "operationType": "delete", "documentKey": {"_id": butter_id}})
+    _wait_for(lambda: "ghee" not in cache.get())
+
+    events.put({"_id": "4", "operationType": "invalidate"})
+    _wait_for(lambda: cache._rules is None or "ghee" in cache._rules)
+    assert set(cache.get()) == {"sugar", "salt", "butter"}  # Full reload from the collection
+
+    events.put(None)
+    _wait_for(lambda: not cache.watching)
@@ -0,0 +1,82 @@
+import threading
+import time
+
+from single_flight import MongoLease
+from sqlite_store import SQLiteDatabase
+
+
+def test_keep_alive_holds_the_lease_past_its_ttl():
+    db = SQLiteDatabase(':memory:', name='test')
+    holder = MongoLease(db['recipe_leases'], ttl_seconds=0.3)
+    other = MongoLease(db['recipe_leases'], ttl_seconds=0.3)
+
+    assert holder.acquire("key")
+    with holder.keep_alive("key"):
+        time.sleep(1.0)
+        assert other.is_held("key")
+        assert not other.acquire("key")
+    time.sleep(0.4)
+    assert not other.is_held("key")
+    assert other.acquire("key")  # Expired once renewal stopped
+    db.close()
+
+
+def test_slow_generation_is_not_duplicated_by_waiters(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.Config, "RECIPE_LEASE_TTL", 0.3)
+    monkeypatch.setattr(app_module.get_recipe_leases(), "ttl_seconds", 0.3)
+    calls = []
+
+    def produce():
+        calls.append(1)
+        for section in ("**Slow Soup**", "**Ingredients**\n- water", "**Instructions**\n1. Wait."):
+            time.sleep(0.4)  # Longer than the lease TTL between sections
+            yield section
+
+    key = ("diabetes", f"water-{time.time()}", "Slow Soup")
+    results = []
+
+    def request():
+        results.append(list(app_module.generate_recipe_sections_once(*key, produce)))
+
+    threads = [threading.Thread(target=request) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert len(calls) == 1
+    assert len(results) == 3
+    assert all(result == results[0] for result in results) and len(results[0]) == 3
+
+
+def test_failed_generation_is_not_cached_or_shared(app_module):
+    calls = []
+
+    def produce():
+        calls.append(1)
+        if len(calls) == 1:
+            yield "**Half Soup**"
+            time.sleep(0.3)  # Waiters join meanwhile
+            raise RuntimeError("stream broke off")
+        yield "**Whole Soup**"
+
+    key = ("diabetes", f"broth-{time.time()}", "Soup")
+    results, errors = [], []
+
+    def request():
+        try:
+            results.append(list(app_module.generate_recipe_sections_once(*key, produce)))
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=request) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert len(errors) == 1  # The leader sees its own failure
+    assert results == [["**Whole Soup**"], ["**Whole Soup**"]]  # Waiters generated their own
+    assert app_module._find_generated_recipe(key[0], key[1]) is None  # The half recipe was not cached
@@ -0,0 +1,49 @@
+import itertools
+
+import sqlite_store
+from sqlite_store import SQLiteDatabase
+
+
+def _collection(tmp_path, count):
+    db = SQLiteDatabase(str(tmp_path / 'store.sqlite3'), name='test')
+    items = db['items']
+    items.create_index([('rank', 1)])
+    items.insert_many([{"_id": i, "rank": i, "score": -i} for i in range(count)])
+    return db, items
+
+
+def test_pushed_down_sort_is_read_as_consumed(tmp_path, monkeypatch):
+    db, items = _collection(tmp_path, 2000)
+    loads = []
+    real_loads = sqlite_store._loads
+    monkeypatch.setattr(sqlite_store, "_loads", lambda text: loads.append(1) or real_loads(text))
+
+    cursor = items.find({}, {"rank": 1}).sort("rank", -1)
+    assert [doc["rank"] for doc in itertools.islice(cursor, 10)] == list(range(1999, 1989, -1))
+    assert len(loads) <= 256  # One fetch, not the whole table
+    cursor.close()
+    assert list(cursor) == []
+    db.close()
+
+
+def test_writes_commit_while_a_cursor_is_open(tmp_path):
+    db, items = _collection(tmp_path, 600)
+    cursor = items.find({}).sort("rank", 1)
+    first = next(cursor)
+    items.update_one({"_id": 599}, {"$set": {"seen": True}})
+    items.insert_one({"_id": 600, "rank": 600})
+
+    # The cursor keeps its snapshot; everyone else sees the writes at once
+    rest = list(cursor)
+    assert [first["rank"]] + [doc["rank"] for doc in rest] == list(range(600))
+    assert "seen" not in rest[-1]
+    assert items.find_one({"_id": 599})["seen"] is True
+    assert items.count_documents({"rank": {"$gte": 0}}) == 601
+    db.close()
+
+
+def test_python_side_sort_with_skip_and_limit(tmp_path):
+    db, items = _collection(tmp_path, 50)
+    docs = list(items.find({"rank": {"$lt": 20}}, {"_id": 0, "score": 1}).sort("score", 1).skip(5).limit(3))
+    assert docs == [{"score": -14}, {"score": -13}, {"score": -12}]
+    db.close()
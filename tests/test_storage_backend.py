@@ -0,0 +1,16 @@
+import pytest
+
+
+def test_unreachable_mongodb_fails_instead_of_switching_to_sqlite(app_module, monkeypatch):
+    def refuse(*args, **kwargs):
+        raise RuntimeError("connection refused")
+
+    monkeypatch.setattr(app_module, "_db", None)
+    monkeypatch.setattr(app_module, "_client", None)
+    monkeypatch.setattr(app_module.Config, "STORAGE_BACKEND", "mongodb")
+    monkeypatch.setattr(app_module, "MongoClient", refuse)
+    monkeypatch.setattr(app_module, "_open_local_store", lambda: pytest.fail("fell back to SQLite"))
+
+    with pytest.raises(RuntimeError, match="connection refused"):
+        app_module.get_db()
+    assert app_module._db is None  # Tried again on the next call
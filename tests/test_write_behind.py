@@ -0,0 +1,18 @@
+from write_behind import WriteBehindBuffer
+
+
+def test_buffered_entry_can_be_opened_before_it_is_written(app_module, client, login, monkeypatch):
+    user_id = login()
+    writes = WriteBehindBuffer(app_module.get_food_entries, max_batch=100, flush_interval=60)
+    monkeypatch.setattr(app_module, "food_entry_writes", writes)
+    entry_id = writes.insert({"patient_id": user_id, "recipe_name": "Lemon Rice", "recipe": "Cook the rice."})
+    assert app_module.get_food_entries().find_one({"_id": entry_id}) is None  # Still buffered
+
+    response = client.get(f'/api/entries/{entry_id}')
+    assert response.status_code == 200
+    assert response.get_json()["recipe"] == "Cook the rice."
+    assert writes.get_pending(entry_id, "someone else") is None
+
+    writes.flush()
+    assert writes.get_pending(entry_id, user_id) is None
+    assert client.get(f'/api/entries/{entry_id}').get_json()["recipe_name"] == "Lemon Rice"
@@ -0,0 +1,247 @@
+"""
+Write-Behind Buffer for Food Entries
+
+Takes ``food_entries`` inserts off the request path: entries get their
+``_id`` up front, wait in memory and are written by a background thread
+with one ``insert_many`` per flush. A flush happens when ``max_batch``
+entries are waiting (size trigger) or ``flush_interval`` seconds after the
+oldest one arrived (time trigger), and on shutdown.
+
+Patches to an entry that is still waiting (the nutrition data and streamed
+recipe the result page sends right after the insert) are merged into the
+buffered document, so the entry is written once, complete. Patches to
+entries that were already flushed are the caller's to apply.
+
+Trade-offs: a buffered entry is not visible to queries until it is flushed
+(``get_pending`` finds it by _id in the process that buffered it), and
+entries still buffered when the process is killed hard are lost.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Thread-safe insert buffer flushed in batches by a background thread"""
+
+    def __init__(self, get_collection, max_batch=200, flush_interval=1.0, max_backlog=10000):
+        """
+        Args:
+            get_collection: Callable returning the collection to write to
+            max_batch: Flush as soon as this many entries are waiting
+            flush_interval: Flush entries that have waited this many seconds
+            max_backlog: Entries kept after failed flushes before the oldest
+                are dropped
+        """
+        self._get_collection = get_collection
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_backlog = max_backlog
+        self._pending = {}  # _id -> document, in arrival order
+        self._oldest = None  # monotonic arrival time of the oldest pending entry
+        self._inflight = set()  # _ids of the batch being written
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+        self._atexit_registered = False
+        self.flushes = 0
+        self.written = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.dropped = 0
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        """Start the flusher thread (idempotent) and flush on interpreter exit"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.close)
+                self._atexit_registered = True
+
+    @property
+    def started(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def after_fork(self):
+        """
+        Reset a forked child's copy: the parent flushes the entries it
+        buffered, and the flusher thread does not survive fork.
+        """
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = {}
+        self._inflight = set()
+        self._oldest = None
+        self._thread = None
+        self._closed = False
+
+    def insert(self, document):
+        """
+        Queue a document for insertion.
+
+        Returns:
+            ObjectId: The document's _id (assigned now if it has none)
+        """
+        document.setdefault("_id", ObjectId())
+        with self._lock:
+            self._pending[document["_id"]] = document
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._pending) >= self.max_batch
+        if full or self._closed:
+            self._wakeup.set()
+        return document["_id"]
+
+    def update_pending(self, entry_id, patient_id, fields):
+        """
+        Merge fields into a still-buffered document of patient_id.
+
+        Returns:
+            dict: Copy of the document as it was before the merge, or None if
+            the entry is not buffered (already flushed, or unknown). When the
+            entry is being flushed right now this waits for the write, so the
+            caller's own update finds it.
+        """
+        with self._lock:
+            document = self._pending.get(entry_id)
+            if document is not None and document.get("patient_id") == patient_id:
+                previous = dict(document)
+                document.update(fields)
+                self.coalesced += 1
+                return previous
+            inflight = entry_id in self._inflight
+        if inflight:
+            with self._flush_lock:
+                pass
+        return None
+
+    def get_pending(self, entry_id, patient_id):
+        """
+        Copy of a still-buffered document of patient_id.
+
+        Returns:
+            dict: The document, or None if the entry is not buffered (already
+            flushed, or unknown). When the entry is being flushed right now
+            this waits for the write, so a query after it finds the entry.
+        """
+        with self._lock:
+            document = self._pending.get(entry_id)
+            if document is not None and document.get("patient_id") == patient_id:
+                return dict(document)
+            inflight = entry_id in self._inflight
+        if inflight:
+            with self._flush_lock:
+                pass
+        return None
+
+    def flush(self):
+        """Write everything buffered now; returns the number of entries written"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = list(self._pending.values())
+                self._pending = {}
+                self._oldest = None
+                self._inflight = {doc["_id"] for doc in batch}
+
+            start = time.perf_counter()
+            try:
+                self._get_collection().insert_many(batch, ordered=False)
+                written, retry = len(batch), []
+            except BulkWriteError as e:
+                # Duplicates were written by an earlier, partially failed flush
+                written = e.details.get('nInserted', 0)
+                retry = [batch[err['index']] for err in e.details.get('writeErrors', [])
+                         if err.get('code') != 11000]
+                logger.error(f"Write-behind flush: {len(retry)} of {len(batch)} entries failed: {e}")
+            except Exception as e:
+                written, retry = 0, batch
+                logger.error(f"Write-behind flush of {len(batch)} entries failed: {e}")
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+            self.flushes += 1
+            self.written += written
+            if retry:
+                self.failures += 1
+                self._requeue(retry)
+            with self._lock:
+                self._inflight = set()
+            return written
+
+    def _requeue(self, retry):
+        """Put failed entries back in front of newer ones, within max_backlog"""
+        with self._lock:
+            merged = {doc['_id']: doc for doc in retry}
+            merged.update(self._pending)
+            overflow = len(merged) - self.max_backlog
+            if overflow > 0:
+                for entry_id in list(merged)[:overflow]:
+                    del merged[entry_id]
+                self.dropped += overflow
+                logger.error(f"Write-behind backlog full, dropped {overflow} entries")
+            self._pending = merged
+            if merged and self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                oldest = self._oldest
+            timeout = (self.flush_interval if oldest is None
+                       else max(0.0, oldest + self.flush_interval - time.monotonic()))
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            with self._lock:
+                due = self._pending and (
+                    self._closed or len(self._pending) >= self.max_batch or
+                    time.monotonic() - self._oldest >= self.flush_interval)
+            if due:
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Write-behind flusher error: {e}")
+            if self._closed:
+                return
+
+    def close(self, timeout=10):
+        """Stop the flusher and write out whatever is still buffered"""
+        self._closed = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        """Backlog and flush counters"""
+        with self._lock:
+            backlog = len(self._pending)
+            oldest_age = time.monotonic() - self._oldest if self._oldest is not None else 0.0
+        return {
+            'name': 'food_entries_write_behind',
+            'backlog': backlog,
+            'oldest_age_seconds': round(oldest_age, 3),
+            'flushes': self.flushes,
+            'written': self.written,
+            'coalesced_updates': self.coalesced,
+            'failed_flushes': self.failures,
+            'dropped': self.dropped,
+            'last_flush_ms': round(self.last_flush_ms, 2),
+        }